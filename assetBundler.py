@@ -0,0 +1,367 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import re
+import codecs
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+PLUGIN_DIR = os.path.dirname(__file__)
+# ioctl cloning a file into another on copy-on-write filesystems (Linux)
+FICLONE = 0x40049409
+
+
+def pluginVersion():
+    with open(os.path.join(PLUGIN_DIR, "metadata.txt")) as f:
+        match = re.search(r"^version=(.*)$", f.read(), re.MULTILINE)
+    return match.group(1).strip() if match else "unknown"
+
+
+def vendorCache():
+    """
+    Returns the folder holding the library files of this plugin version,
+    which exports link to rather than copy when the filesystem allows it.
+    """
+    from qgis.core import QgsApplication
+    return os.path.join(QgsApplication.qgisSettingsDirPath(), "qgis2web",
+                        "vendor", pluginVersion())
+
+
+class AssetManifest(object):
+    """
+    The library files an export needs, written to the export folder in a
+    single stage once the writer knows which features its layers use.
+    """
+
+    def __init__(self, sourceDir):
+        self.sourceDir = sourceDir
+        self.assets = OrderedDict()
+
+    def add(self, source, destination):
+        """
+        Adds a file of the plugin folder, relative to sourceDir, written to
+        destination relative to the export folder.
+        """
+        self.assets[destination] = os.path.normpath(
+            os.path.join(self.sourceDir, source))
+
+    def addTree(self, source, destination):
+        root = os.path.join(PLUGIN_DIR, self.sourceDir, source)
+        for folder, _, files in os.walk(root):
+            relative = os.path.relpath(folder, root)
+            for name in files:
+                self.add(os.path.normpath(os.path.join(source, relative,
+                                                       name)),
+                         os.path.normpath(os.path.join(destination,
+                                                       relative, name)))
+
+    def write(self, folder, written=None):
+        """
+        Writes the files to folder, except those already written by the
+        manifest written.
+        """
+        cache = vendorCache()
+        for destination, source in self.assets.items():
+            if written is not None and destination in written.assets:
+                continue
+            target = os.path.join(folder, destination)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            linkAsset(os.path.join(PLUGIN_DIR, source),
+                      os.path.join(cache, source), target)
+
+
+def linkAsset(source, cached, target):
+    """
+    Writes a library file to target as a reflink or hard link of its copy
+    in the vendor cache, falling back to a copy of the plugin file.
+    """
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        updateCache(source, cached)
+    except (IOError, OSError):
+        shutil.copyfile(source, target)
+        return
+    if reflink(cached, target):
+        return
+    try:
+        os.link(cached, target)
+    except (AttributeError, IOError, OSError):
+        shutil.copyfile(source, target)
+
+
+def updateCache(source, cached):
+    # a file edited through a hard link in an earlier export no longer
+    # matches the plugin file, and is replaced rather than reused
+    stat = os.stat(source)
+    try:
+        current = os.stat(cached)
+        if (current.st_size == stat.st_size and
+                int(current.st_mtime) == int(stat.st_mtime)):
+            return
+    except OSError:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+    tmp = "%s.%d.%d.tmp" % (cached, os.getpid(), threading.get_ident())
+    shutil.copy2(source, tmp)
+    os.replace(tmp, cached)
+
+
+def reflink(source, target):
+    if fcntl is None:
+        return False
+    try:
+        with open(source, "rb") as s, open(target, "wb") as t:
+            fcntl.ioctl(t.fileno(), FICLONE, s.fileno())
+        return True
+    except (IOError, OSError):
+        if os.path.exists(target):
+            os.remove(target)
+        return False
+
+
+JS_TOKEN = re.compile(r"""
+    (?P<string>'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*"|`(?:[^`\\]|\\.)*`)
+  | (?P<comment>/\*.*?\*/|//[^\n]*)
+  | (?P<space>[ \t\r\f\v]+)
+  | (?P<newline>\n)
+  | (?P<code>[^'"`/\s]+|.)
+""", re.VERBOSE | re.DOTALL)
+CSS_TOKEN = re.compile(r"""
+    (?P<string>'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*")
+  | (?P<comment>/\*.*?\*/)
+  | (?P<space>[ \t\r\f\v]+)
+  | (?P<newline>\n)
+  | (?P<code>[^'"/\s]+|.)
+""", re.VERBOSE | re.DOTALL)
+REGEXP = re.compile(r"/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*")
+# words after which a slash starts a regular expression, not a division
+REGEXP_KEYWORDS = {"return", "typeof", "case", "do", "else", "in",
+                   "instanceof", "new", "delete", "void", "throw", "yield",
+                   "await"}
+
+
+def regexpAllowed(previous):
+    if previous is None:
+        return True
+    if previous[-1] in "'\"`/":
+        return False
+    word = re.search(r"[\w$]+$", previous)
+    if word:
+        return word.group(0) in REGEXP_KEYWORDS
+    return previous[-1] not in ")]}"
+
+
+def minifyCode(code, css=False):
+    """
+    Strips the comments, indentation and blank lines of generated JS or
+    CSS. Strings, regular expressions and line breaks are kept, so
+    automatic semicolon insertion is unaffected. Code that cannot be
+    tokenized is returned as it is.
+    """
+    tokens = CSS_TOKEN if css else JS_TOKEN
+    out = []
+    previous = None
+    lineStart = True
+    space = False
+    pos = 0
+    while pos < len(code):
+        match = tokens.match(code, pos)
+        if match is None:
+            return code
+        kind = match.lastgroup
+        text = match.group(0)
+        if kind == "code" and text == "/" and regexpAllowed(previous):
+            regexp = REGEXP.match(code, pos)
+            if regexp:
+                match = regexp
+                text = regexp.group(0)
+        pos = match.end()
+        if kind == "comment" and "\n" in text:
+            kind = "newline"
+        if kind == "newline":
+            if not lineStart:
+                out.append("\n")
+            lineStart = True
+            space = False
+        elif kind in ("space", "comment"):
+            space = True
+        else:
+            if space and not lineStart:
+                out.append(" ")
+            out.append(text)
+            previous = text
+            lineStart = False
+            space = False
+    return "".join(out)
+
+
+TAG = re.compile(r"<script\b([^>]*)>(.*?)</script\s*>|<link\b([^>]*)>|"
+                 r"<style\b[^>]*>.*?</style\s*>|<!--.*?-->",
+                 re.IGNORECASE | re.DOTALL)
+ATTRIBUTE = re.compile(r"""([\w:-]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|"""
+                       r"""([^\s"'>]+)))?""")
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+SOURCE_MAP = re.compile(r"^\s*(//[#@] sourceMappingURL=.*|"
+                        r"/\*# sourceMappingURL=.*\*/)\s*$", re.MULTILINE)
+
+
+def tagAttributes(attributes):
+    return {match.group(1).lower(): (match.group(2) or match.group(3) or
+                                     match.group(4) or "")
+            for match in ATTRIBUTE.finditer(attributes or "")}
+
+
+def localPath(url):
+    if not url or re.match(r"^([A-Za-z][\w+.-]*:|/|#)", url) or "?" in url:
+        return None
+    return os.path.normpath(url)
+
+
+def bundledTag(match):
+    """
+    Returns the kind and path of a script or stylesheet tag that can join a
+    bundle, or (None, None).
+    """
+    if match.group(0).lower().startswith("<script"):
+        attributes = tagAttributes(match.group(1))
+        jsTypes = ("", "text/javascript", "application/javascript")
+        if (attributes.get("type", "").lower() in jsTypes and
+                not {"async", "defer", "nomodule", "integrity"} &
+                set(attributes)):
+            return "js", localPath(attributes.get("src"))
+    elif match.group(3) is not None:
+        attributes = tagAttributes(match.group(3))
+        if (attributes.get("rel", "").lower() == "stylesheet" and
+                attributes.get("media", "all").lower() == "all" and
+                "integrity" not in attributes):
+            return "css", localPath(attributes.get("href"))
+    return None, None
+
+
+def rebaseCss(css, source, bundleDir):
+    """
+    Rewrites the relative urls of a stylesheet moved into bundleDir.
+    """
+    def rebase(match):
+        url = match.group(2).strip()
+        if localPath(url) is None and "?" not in url and "#" not in url:
+            return match.group(0)
+        path, suffix = re.match(r"([^?#]*)(.*)", url).groups()
+        if localPath(path) is None:
+            return match.group(0)
+        path = os.path.relpath(os.path.join(os.path.dirname(source), path),
+                               bundleDir)
+        return "url(%s%s%s%s)" % (match.group(1), path.replace(os.sep, "/"),
+                                  suffix, match.group(1))
+    css = re.sub(r"^\s*@charset\s+[^;]*;", "", css)
+    return CSS_URL.sub(rebase, css)
+
+
+def bundlePage(folder, index, jsDir, cssDir=None, vendored=(),
+               layerData=None):
+    """
+    Minifies the generated scripts and stylesheets of an exported page and
+    joins each run of adjacent script or stylesheet tags into one bundle
+    in jsDir or cssDir, in document order, rewriting the page to load the
+    bundles. Files in vendored are copied plugin libraries and are bundled
+    as they are. The scripts in the layerData folder are left alone, as
+    they are large and each is cached on its own.
+    """
+    vendored = set(os.path.normpath(path) for path in vendored)
+    with codecs.open(index, encoding="utf-8") as f:
+        html = f.read()
+
+    def read(path, kind):
+        with codecs.open(os.path.join(folder, path), encoding="utf-8") as f:
+            code = f.read()
+        if path not in vendored:
+            code = minifyCode(code, kind == "css")
+        return code
+
+    def write(run):
+        kind = run[0][0]
+        paths = [path for _, path, _ in run]
+        bundleDir = jsDir if kind == "js" else cssDir or jsDir
+        if kind == "js":
+            code = "\n;\n".join(SOURCE_MAP.sub("", read(path, kind))
+                                for path in paths)
+        else:
+            code = "\n".join(rebaseCss(SOURCE_MAP.sub("", read(path, kind)),
+                                       path, bundleDir) for path in paths)
+        name = "bundle_%s.%s" % (hashlib.sha1(code.encode("utf-8"))
+                                 .hexdigest()[:10], kind)
+        os.makedirs(os.path.join(folder, bundleDir), exist_ok=True)
+        with codecs.open(os.path.join(folder, bundleDir, name), "w",
+                         encoding="utf-8") as f:
+            f.write(code)
+        url = "/".join(bundleDir.split(os.sep) + [name])
+        if kind == "js":
+            return '<script src="%s"></script>' % url
+        return '<link rel="stylesheet" href="%s">' % url
+
+    out = []
+    run = []
+    pos = 0
+
+    def flush():
+        if len(run) > 1:
+            out.append(write(run))
+        for kind, path, tag in run if len(run) == 1 else []:
+            out.append(tag)
+            if path not in vendored:
+                code = read(path, kind)
+                tmp = os.path.join(folder, path + ".tmp")
+                with codecs.open(tmp, "w", encoding="utf-8") as f:
+                    f.write(code)
+                os.replace(tmp, os.path.join(folder, path))
+        del run[:]
+
+    for match in TAG.finditer(html):
+        gap = html[pos:match.start()]
+        pos = match.end()
+        kind, path = bundledTag(match)
+        if (path is None or
+                path.split(os.sep)[0] == layerData or
+                not os.path.isfile(os.path.join(folder, path))):
+            kind = None
+        if gap.strip() or (run and run[0][0] != kind):
+            flush()
+        if not run:
+            out.append(gap)
+        if kind is not None:
+            run.append((kind, path, match.group(0)))
+            continue
+        flush()
+        tag = match.group(0)
+        if (tag.lower().startswith("<script") and match.group(2).strip()
+                and bundledTag(match)[0] == "js"):
+            start = match.start(2) - match.start()
+            end = match.end(2) - match.start()
+            tag = tag[:start] + "\n" + minifyCode(tag[start:end]) + tag[end:]
+        out.append(tag)
+    flush()
+    out.append(html[pos:])
+    with codecs.open(index, "w", encoding="utf-8") as f:
+        f.write("".join(out))
@@ -0,0 +1,144 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+from qgis.core import (QgsRenderContext,
+                       QgsExpressionContext,
+                       QgsExpressionContextUtils,
+                       QgsRuleBasedRenderer,
+                       QgsHeatmapRenderer,
+                       QgsSymbol)
+
+# attributes holding the symbology evaluated by QGIS at export
+BAKED_CLASS = "q2wClass"
+BAKED_ROTATION = "q2wRotation"
+
+
+def hasBakedSymbology(layer, encode2json, params):
+    """
+    Returns True if the symbology of a layer is evaluated in QGIS at export
+    and stored as attributes, rather than evaluated in the browser.
+    """
+    if not params["Data export"].get("Bake symbology", False):
+        return False
+    if layer.type() != layer.VectorLayer:
+        return False
+    if layer.customProperty("VectorTilesReader/vector_tile_url") is not None:
+        return False
+    if layer.providerType() == "WFS" and not encode2json:
+        return False
+    renderer = layer.renderer()
+    if isinstance(renderer, QgsHeatmapRenderer):
+        return False
+    return (isinstance(renderer, QgsRuleBasedRenderer) or
+            bool(getRotatedSymbols(renderer)))
+
+
+def getRotatedSymbols(renderer):
+    """
+    Returns the marker symbols of a renderer rotated by an expression, which
+    the browser cannot evaluate.
+    """
+    symbols = []
+    for symbol in renderer.symbols(QgsRenderContext()):
+        if symbol.type() != QgsSymbol.Marker:
+            continue
+        angle = symbol.dataDefinedAngle()
+        if angle.isActive() and angle.useExpression():
+            symbols.append(symbol)
+    return symbols
+
+
+def bakedRotation(symbol, baked, layerFormat="OpenLayers3"):
+    """
+    Returns the JavaScript of the rotation of a marker symbol in radians, or
+    None if it is not baked.
+    """
+    angle = symbol.dataDefinedAngle()
+    if not baked or not angle.isActive() or not angle.useExpression():
+        return None
+    if layerFormat == "Leaflet":
+        return "feature.properties['%s'] * 0.0174533" % BAKED_ROTATION
+    return "feature.get('%s') * 0.0174533" % BAKED_ROTATION
+
+
+class SymbologyBaker(object):
+    """
+    Evaluates the renderer of a layer for each exported feature, giving the
+    index of its top level rule and the rotation of its marker.
+    """
+
+    def __init__(self, layer):
+        self.renderer = layer.renderer().clone()
+        self.context = QgsRenderContext()
+        self.context.setExpressionContext(QgsExpressionContext(
+            QgsExpressionContextUtils.globalProjectLayerScopes(layer)))
+        # the top level rule of every rule, which is the style class
+        self.rules = {}
+        if isinstance(self.renderer, QgsRuleBasedRenderer):
+            for index, rule in enumerate(
+                    self.renderer.rootRule().children()):
+                self.rules[rule.ruleKey()] = index
+                for child in rule.descendants():
+                    self.rules[child.ruleKey()] = index
+        self.rotated = bool(getRotatedSymbols(self.renderer))
+        self.layerFields = layer.fields()
+
+    def fields(self):
+        """
+        Returns the name and memory provider type of the baked attributes.
+        """
+        fields = []
+        if self.rules:
+            fields.append((BAKED_CLASS, "integer"))
+        if self.rotated:
+            fields.append((BAKED_ROTATION, "double"))
+        return fields
+
+    def values(self, feature):
+        """
+        Returns the baked attributes of a feature, in the order of fields().
+        """
+        self.context.expressionContext().setFeature(feature)
+        values = []
+        if self.rules:
+            # the browser styles a feature by the first rule it matches
+            keys = self.renderer.legendKeysForFeature(feature, self.context)
+            indexes = [self.rules[key] for key in keys if key in self.rules]
+            values.append(min(indexes) if indexes else -1)
+        if self.rotated:
+            rotation = 0
+            for symbol in self.renderer.symbolsForFeature(feature,
+                                                          self.context):
+                if symbol.type() == QgsSymbol.Marker:
+                    angle = symbol.dataDefinedAngle()
+                    if angle.isActive():
+                        rotation = angle.valueAsDouble(
+                            self.context.expressionContext(),
+                            symbol.angle())[0]
+                        break
+            values.append(rotation)
+        return values
+
+    def start(self):
+        """
+        Prepares the renderer for values(). Every call must be paired with
+        stop().
+        """
+        self.renderer.startRender(self.context, self.layerFields)
+
+    def stop(self):
+        self.renderer.stopRender(self.context)
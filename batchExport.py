@@ -0,0 +1,324 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""
+Exports QGIS projects to web maps without the QGIS interface, each with
+the writer and settings saved in it by the qgis2web dialog. Projects are
+exported in parallel worker processes, each running its own offscreen
+QgsApplication.
+
+    python batchExport.py -o OUTPUT [-j JOBS] project.qgz [project.qgs ...]
+
+A file listing one project per line can be given as @projects.txt. Every
+project is written to its own folder under OUTPUT, and a summary of the
+time taken and size written is printed, and saved as JSON with --summary.
+Exits with an error if any project failed.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from collections import OrderedDict
+
+PLUGIN_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# size of the canvas a project is exported from, in pixels
+CANVAS_SIZE = (1280, 800)
+POPUP_LABELS = ["no label",
+                "inline label - always visible",
+                "inline label - visible with data",
+                "hidden field",
+                "header label - always visible",
+                "header label - visible with data"]
+
+qgsApp = None
+
+
+def initWorker(pluginParent):
+    """Starts the offscreen QGIS application of a worker process."""
+    global qgsApp
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    if pluginParent not in sys.path:
+        sys.path.insert(0, pluginParent)
+    from qgis.core import QgsApplication
+    if "QGIS_PREFIX_PATH" in os.environ:
+        QgsApplication.setPrefixPath(os.environ["QGIS_PREFIX_PATH"], True)
+    qgsApp = QgsApplication([], True)
+    qgsApp.initQgis()
+
+
+class OffscreenCanvas(object):
+    """
+    Stands in for the map canvas of a project loaded without the QGIS
+    interface, showing the default view of the project.
+    """
+
+    def __init__(self, project, width, height):
+        from qgis.core import (QgsCoordinateTransform,
+                               QgsMapSettings)
+        from qgis.PyQt.QtCore import QSize
+        settings = QgsMapSettings()
+        settings.setDestinationCrs(project.crs())
+        settings.setTransformContext(project.transformContext())
+        settings.setOutputSize(QSize(width, height))
+        settings.setBackgroundColor(project.backgroundColor())
+        settings.setSelectionColor(project.selectionColor())
+        root = project.layerTreeRoot()
+        settings.setLayers([treeLayer.layer()
+                            for treeLayer in root.findLayers()
+                            if treeLayer.isVisible()])
+        extent = project.viewSettings().defaultViewExtent()
+        if extent.isNull() or extent.isEmpty():
+            extent = settings.fullExtent()
+        elif extent.crs().isValid() and extent.crs() != project.crs():
+            extent = QgsCoordinateTransform(
+                extent.crs(), project.crs(),
+                project).transformBoundingBox(extent)
+        settings.setExtent(extent)
+        self._mapSettings = settings
+        self._size = QSize(width, height)
+
+    def mapSettings(self):
+        return self._mapSettings
+
+    def extent(self):
+        return self._mapSettings.visibleExtent()
+
+    def size(self):
+        return self._size
+
+
+class OffscreenIface(object):
+    """
+    Stands in for the QGIS interface passed to the writers.
+    """
+
+    def __init__(self, project, width, height):
+        self.canvas = OffscreenCanvas(project, width, height)
+
+    def mapCanvas(self):
+        return self.canvas
+
+
+def isChecked(value):
+    """
+    Reads a checkbox stored as a layer property, either as a Qt check
+    state or as "true" or "false".
+    """
+    return value == 2 or str(value).lower() == "true"
+
+
+def isExported(layer):
+    from qgis.core import QgsMapLayer, QgsWkbTypes
+    return (layer.type() != QgsMapLayer.PluginLayer and
+            (layer.type() != QgsMapLayer.VectorLayer or
+             layer.wkbType() != QgsWkbTypes.NoGeometry) and
+            layer.customProperty("ol_layer_type") is None)
+
+
+def layerPopup(layer):
+    """Returns the popup label of each visible field of a layer."""
+    popup = OrderedDict()
+    if layer.type() != layer.VectorLayer:
+        return popup
+    for fieldIndex, field in enumerate(layer.fields()):
+        if layer.editorWidgetSetup(fieldIndex).type() == 'Hidden':
+            continue
+        label = layer.customProperty("qgis2web/popup/" + field.name())
+        popup[field.name()] = label if label in POPUP_LABELS else "no label"
+    return popup
+
+
+def projectLayers(project):
+    """
+    Returns the layers the dialog would export from a project, with their
+    groups and options as saved on the layers, in the order the writers
+    take them.
+    """
+    from qgis.core import QgsWkbTypes
+    layers = []
+    groups = OrderedDict()
+    options = []
+    root = project.layerTreeRoot()
+    for treeLayer in root.findLayers():
+        layer = treeLayer.layer()
+        if layer is None or not isExported(layer) or not treeLayer.isVisible():
+            continue
+        parent = treeLayer.parent()
+        if parent.parent() is not None:
+            groups.setdefault(parent.name(), []).append(layer)
+        layers.append(layer)
+        isVector = layer.type() == layer.VectorLayer
+        isWMS = not isVector and layer.providerType() == "wms"
+        vis = layer.customProperty("qgis2web/Visible", True)
+        options.append((
+            layerPopup(layer),
+            not (vis == 0 or str(vis).lower() == "false"),
+            isVector and layer.customProperty("qgis2web/Popups") != 0,
+            (isVector and layer.providerType() == "WFS" and
+             isChecked(layer.customProperty("qgis2web/Encode to JSON"))),
+            (isVector and
+             layer.geometryType() == QgsWkbTypes.PointGeometry and
+             isChecked(layer.customProperty("qgis2web/Cluster"))),
+            isWMS and isChecked(
+                layer.customProperty("qgis2web/GetFeatureInfo")),
+            isWMS and isChecked(layer.customProperty("qgis2web/BaseMap")),
+            isVector and isChecked(
+                layer.customProperty("qgis2web/ExportRelated"))))
+    # popup, visible, interactive, json, cluster, getFeatureInfo, baseMap
+    # and exportRelated, each a list in the order of the layers
+    columns = [list(values) for values in zip(*options[::-1])]
+    if not columns:
+        columns = [[] for _ in range(8)]
+    groups = {name: groupLayers[::-1] for name, groupLayers in groups.items()}
+    return (layers[::-1], groups) + tuple(columns)
+
+
+def exportProjectFile(path, folder, width, height):
+    """
+    Exports one project into folder, in a worker process. Returns a
+    summary of the export.
+    """
+    from qgis.core import QgsProject
+    from qgis2web.writerRegistry import WRITER_REGISTRY
+    from qgis2web.publisher import fileSizes
+    start = time.perf_counter()
+    result = {"project": path, "ok": False, "index": None, "files": 0,
+              "bytes": 0, "seconds": 0.0, "error": None, "warnings": []}
+    project = QgsProject.instance()
+    try:
+        project.clear()
+        if not project.read(path):
+            raise IOError("could not read %s: %s" % (path, project.error()))
+        writer = WRITER_REGISTRY.createWriterFromProject()
+        (writer.layers, writer.groups, writer.popup, writer.visible,
+         writer.interactive, writer.json, writer.cluster,
+         writer.getFeatureInfo, writer.baseMap,
+         writer.exportRelated) = projectLayers(project)
+        os.makedirs(folder, exist_ok=True)
+        results = writer.write(OffscreenIface(project, width, height),
+                               folder)
+        result["index"] = results.index_file
+        sizes = fileSizes(results.folder)
+        result["files"], result["bytes"] = len(sizes), sum(sizes.values())
+        result["warnings"] = results.report.warnings
+        result["ok"] = True
+    except Exception:
+        result["error"] = traceback.format_exc()
+    finally:
+        project.clear()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def exportTask(task):
+    return exportProjectFile(*task)
+
+
+def outputFolders(projects, output):
+    """Names an output folder after each project, keeping them apart."""
+    folders = []
+    used = set()
+    for path in projects:
+        name = os.path.splitext(os.path.basename(path))[0]
+        folder = name
+        count = 1
+        while folder in used:
+            count += 1
+            folder = "%s_%d" % (name, count)
+        used.add(folder)
+        folders.append(os.path.join(output, folder))
+    return folders
+
+
+def printSummary(results, seconds):
+    width = max([len(os.path.basename(r["project"])) for r in results] +
+                [7])
+    print("%-*s  %6s  %9s  %6s  %s" % (width, "project", "status", "time (s)",
+                                       "files", "size (MB)"))
+    for result in results:
+        print("%-*s  %6s  %9.1f  %6d  %.1f" % (
+            width, os.path.basename(result["project"]),
+            "ok" if result["ok"] else "failed", result["seconds"],
+            result["files"], result["bytes"] / 1048576.0))
+    failed = [result for result in results if not result["ok"]]
+    print("%d projects, %d failed, %.1f MB in %.1f s" % (
+        len(results), len(failed),
+        sum(result["bytes"] for result in results) / 1048576.0, seconds))
+    for result in failed:
+        print("\n%s:\n%s" % (result["project"], result["error"]))
+    for result in results:
+        for warning in result["warnings"]:
+            print("%s: %s" % (os.path.basename(result["project"]), warning))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export QGIS projects to web maps with qgis2web.",
+        fromfile_prefix_chars="@")
+    parser.add_argument("projects", nargs="+",
+                        help=".qgs or .qgz project files")
+    parser.add_argument("-o", "--output", required=True,
+                        help="folder the web maps are written to")
+    parser.add_argument("-j", "--jobs", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="number of projects exported at once")
+    parser.add_argument("--size", default="%dx%d" % CANVAS_SIZE,
+                        help="canvas size in pixels, as WIDTHxHEIGHT")
+    parser.add_argument("--summary",
+                        help="file the summary is written to as JSON")
+    args = parser.parse_args(argv)
+
+    width, height = [int(value) for value in args.size.lower().split("x")]
+    projects = [os.path.abspath(path.strip()) for path in args.projects
+                if path.strip()]
+    output = os.path.abspath(args.output)
+    tasks = [(path, folder, width, height) for path, folder in
+             zip(projects, outputFolders(projects, output))]
+
+    start = time.perf_counter()
+    results = []
+    # each worker has its own QgsApplication and project, so they are
+    # started fresh rather than forked from this process
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(max(1, min(args.jobs, len(tasks))),
+                      initializer=initWorker,
+                      initargs=(PLUGIN_PARENT,),
+                      maxtasksperchild=20) as pool:
+        for result in pool.imap_unordered(exportTask, tasks):
+            print("%s %s (%.1f s)" % ("done" if result["ok"] else "FAILED",
+                                      result["project"], result["seconds"]))
+            sys.stdout.flush()
+            results.append(result)
+    seconds = time.perf_counter() - start
+
+    order = {path: index for index, path in enumerate(projects)}
+    results.sort(key=lambda result: order[result["project"]])
+    printSummary(results, seconds)
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump({"seconds": seconds, "projects": results}, f,
+                      indent=2)
+    return 1 if any(not result["ok"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,6 +19,8 @@ from qgis.core import QgsApplication
 import os
 import shutil
 from qgis2web.exporter import EXPORTER_REGISTRY
+from qgis2web.markerStore import MARKER_FORMATS
+from qgis2web.assetBundler import pluginVersion
 from qgis.gui import QgsColorButton
 from qgis.PyQt.QtGui import QColor
 
@@ -27,16 +29,22 @@ def getTemplates():
     src = os.path.join(os.path.dirname(__file__), "templates")
     dst = os.path.join(QgsApplication.qgisSettingsDirPath(), "qgis2web",
                        "templates")
-    if not os.path.exists(dst):
-        shutil.copytree(src, dst)
-    else:
+    # the plugin templates are installed once for each plugin version,
+    # keeping templates added by the user
+    marker = os.path.join(dst, ".version")
+    try:
+        with open(marker) as f:
+            installed = f.read().strip()
+    except (IOError, OSError):
+        installed = None
+    if installed != pluginVersion():
+        if not os.path.exists(dst):
+            os.makedirs(dst)
         for fname in os.listdir(src):
-            with open(os.path.join(src, fname)) as s:
-                srcCode = s.read()
-            with open(os.path.join(dst, os.path.basename(fname)), 'w') as d:
-                d.seek(0)
-                d.write(srcCode)
-                d.truncate()
+            shutil.copyfile(os.path.join(src, fname),
+                            os.path.join(dst, fname))
+        with open(marker, "w") as f:
+            f.write(pluginVersion())
     return tuple(f[:f.find(".")] for f in os.listdir(dst)
                  if f.endswith("html"))
 
@@ -70,7 +78,19 @@ def getParams(configure_exporter_action=None):
         "Data export": {
             "Precision": ("maintain", "1", "2", "3", "4", "5", "6", "7", "8",
                           "9", "10", "11", "12", "13", "14", "15"),
-            "Minify GeoJSON files": True
+            "Minify GeoJSON files": True,
+            "Raster export": ("Image", "XYZ tiles", "Cloud-Optimized GeoTIFF"),
+            "SVG markers": MARKER_FORMATS,
+            "Raster quality": ("75", "50", "60", "70", "80", "85", "90", "95",
+                               "100"),
+            "Precompute point clusters": False,
+            "Pre-aggregate heatmaps": False,
+            "Bake symbology": False,
+            "Bundle scripts and styles": False,
+            "Layer size budget (MB)": ("5", "1", "2", "10", "20", "50",
+                                       "100"),
+            "Layer feature budget": ("20000", "1000", "5000", "10000",
+                                     "50000", "100000", "500000")
         },
         "Scale/Zoom": {
             "Extent": ("Canvas extent", "Fit to layers extent"),
@@ -1,8 +1,25 @@
-from qgis.core import QgsExpression, QgsExpressionNode, QgsMessageLog, Qgis
+from collections import OrderedDict
+from qgis.core import (Qgis,
+                       QgsApplication,
+                       QgsExpression,
+                       QgsExpressionNode,
+                       QgsExpressionContext)
+import os
 import re
 import json
+import math
+import hashlib
+import threading
 
-whenfunctions = []
+# bumped whenever the generated JS changes, invalidating the compile cache
+COMPILER_VERSION = 1
+# compiled functions kept in the compile cache, least recently used dropped
+COMPILE_CACHE_LIMIT = 5000
+
+# functions whose result is not fixed by their arguments
+volatile_functions = {"rand", "randf", "now", "uuid", "$now", "eval", "env",
+                      "var", "attribute", "attributes", "get_feature",
+                      "get_feature_by_id", "aggregate", "layer_property"}
 
 binary_ops = [
     "||", "&&",
@@ -14,6 +31,15 @@ binary_ops = [
 
 unary_ops = ["!", "-"]
 
+# written for the functions called but missing from the runtime library
+stub_template = """function %s(values, context) {
+    return false;
+};"""
+
+# top level functions of the runtime library
+library_function = re.compile(r"^function ([\w$]+)\(.*?^\};?$",
+                              re.MULTILINE | re.DOTALL)
+
 
 def gen_func_stubs():
     """
@@ -21,15 +47,11 @@ def gen_func_stubs():
     """
     funcs = QgsExpression.Functions()
     functions = []
-    temp = """function %s(values, context) {
-    return false;
-};
-"""
     for func in funcs:
         name = func.name()
         if name.startswith("$"):
             continue
-        newfunc = temp % ("fnc_" + name)
+        newfunc = stub_template % ("fnc_" + name) + "\n"
         functions.append(newfunc)
     return "\n".join(functions)
 
@@ -45,173 +67,277 @@ def exp2func(expstr, name=None, mapLib=None):
     """
     Convert a QgsExpression into a JS function.
     """
-    global whenfunctions
-    whenfunctions = []
     exp = QgsExpression(expstr)
-    js = walkExpression(exp.rootNode(), mapLib=mapLib)
+    # columns read more than once are read into locals up front
+    counts = {}
+    count_columns(exp.rootNode(), counts)
+    columns = OrderedDict()
+    for column in sorted(counts):
+        if counts[column] > 1:
+            columns[column] = "column_%d" % len(columns)
+    js = walkExpression(exp.rootNode(), mapLib, columns)
     if name is None:
-        import random
-        import string
-        name = 'exp_' + ''.join(random.choice(string.ascii_lowercase) for _ in range(4))
+        name = hashlib.sha1(("%s\n%s" % (mapLib, exp.dump())).encode(
+            "utf-8")).hexdigest()[:12]
     name = "exp_" + name + "_eval_expression"
+    declarations = ["var feature = context.feature;"]
+    if mapLib == "Leaflet":
+        declarations.append("var attributes = feature.properties || feature;")
+    for column, local in columns.items():
+        declarations.append("var %s = %s;" % (local,
+                                              column_read(column, mapLib)))
     temp = """
 function %s(context) {
     // %s
 
-    var feature = context.feature;
     %s
-    if (feature.properties) {
-        return %s;
-    } else {
-        return %s;
-    }
+    return %s;
 }""" % (name,
-        exp.dump(),
-        "\n".join(whenfunctions),
-        js,
-        js.replace("feature.properties['", "feature['"))
+        exp.dump().replace("\n", " "),
+        "\n    ".join(declarations),
+        js)
     return temp, name, exp.dump()
 
 
-def walkExpression(node, mapLib):
+def walkExpression(node, mapLib, columns=None):
+    jsExp, constant = compileNode(node, mapLib, columns)
+    if constant:
+        jsExp = fold(node, jsExp)
+    return jsExp
+
+
+def compileNode(node, mapLib, columns=None):
+    """
+    Compiles an expression tree bottom up, folding the largest subtrees
+    which are constant.
+    :return: the JS of the tree, and whether it reads no feature, variable
+    or changing function, so that it can be evaluated once at export
+    """
     if node is None:
-        jsExp = "null"
-    elif node.nodeType() == QgsExpressionNode.ntBinaryOperator:
-        jsExp = handle_binary(node, mapLib)
+        return "null", True
+    nodeType = node.nodeType()
+    if nodeType == QgsExpressionNode.ntLiteral:
+        return handle_literal(node), True
+    if nodeType == QgsExpressionNode.ntColumnRef:
+        return handle_columnRef(node, mapLib, columns), False
+    children = child_nodes(node)
+    if children is None:
+        return "null", is_constant(node)
+    compiled = [compileNode(child, mapLib, columns) for child in children]
+    if (all(constant for _, constant in compiled) and
+            is_constant_operation(node)):
+        return walkNode(node, [jsExp for jsExp, _ in compiled]), True
+    args = [fold(child, jsExp) if constant else jsExp
+            for child, (jsExp, constant) in zip(children, compiled)]
+    return walkNode(node, args), False
+
+
+def fold(node, jsExp):
+    """
+    Returns the folded value of a constant tree, or its JS when it cannot
+    be folded.
+    """
+    if node is None or node.nodeType() == QgsExpressionNode.ntLiteral:
+        return jsExp
+    folded = fold_constant(node)
+    return jsExp if folded is None else folded
+
+
+def walkNode(node, args):
+    if node.nodeType() == QgsExpressionNode.ntBinaryOperator:
+        jsExp = handle_binary(node, args)
     elif node.nodeType() == QgsExpressionNode.ntUnaryOperator:
-        jsExp = handle_unary(node, mapLib)
+        jsExp = handle_unary(node, args)
     elif node.nodeType() == QgsExpressionNode.ntInOperator:
-        jsExp = handle_in(node, mapLib)
+        jsExp = handle_in(node, args)
     elif node.nodeType() == QgsExpressionNode.ntFunction:
-        jsExp = handle_function(node, mapLib)
-    elif node.nodeType() == QgsExpressionNode.ntLiteral:
-        jsExp = handle_literal(node)
-    elif node.nodeType() == QgsExpressionNode.ntColumnRef:
-        jsExp = handle_columnRef(node, mapLib)
+        jsExp = handle_function(node, args)
     elif node.nodeType() == QgsExpressionNode.ntCondition:
-        jsExp = handle_condition(node, mapLib)
+        jsExp = handle_condition(node, args)
+    else:
+        jsExp = "null"
     return jsExp
 
 
-def handle_condition(node, mapLib):
-    global condtioncounts
-    subexps = re.findall(r"WHEN(\s+.*?\s+)THEN(\s+.*?\s+)", node.dump())
-    QgsMessageLog.logMessage(subexps, "qgis2web", level=Qgis.Info)
-    count = 1
-    js = ""
-    for sub in subexps:
-        when = sub[0].strip()
-        then = sub[1].strip()
-        QgsMessageLog.logMessage(then, "qgis2web", level=Qgis.Info)
-        whenpart = QgsExpression(when)
-        thenpart = QgsExpression(then)
-        whenjs = walkExpression(whenpart.rootNode(), mapLib)
-        thenjs = walkExpression(thenpart.rootNode(), mapLib)
-        style = "if" if count == 1 else "else if"
-        js += """
-        %s %s {
-          return %s;
-        }
-        """ % (style, whenjs, thenjs)
-        js = js.strip()
-        count += 1
-
-    elsejs = "null"
-    if "ELSE" in node.dump():
-        elseexps = re.findall(r"ELSE(\s+.*?\s+)END", node.dump())
-        elsestr = elseexps[0].strip()
-        exp = QgsExpression(elsestr)
-        elsejs = walkExpression(exp.rootNode(), mapLib)
-    funcname = "_CASE()"
-    temp = """function %s {
-    %s
-    else {
-     return %s;
-    }
-    };""" % (funcname, js, elsejs)
-    whenfunctions.append(temp)
-    return funcname
+def child_nodes(node):
+    """
+    Returns the operands of a node, in the order its handler takes their
+    JS, or None for nodes which are not compiled.
+    """
+    nodeType = node.nodeType()
+    if nodeType == QgsExpressionNode.ntBinaryOperator:
+        return [node.opLeft(), node.opRight()]
+    elif nodeType == QgsExpressionNode.ntUnaryOperator:
+        return [node.operand()]
+    elif nodeType == QgsExpressionNode.ntInOperator:
+        return [node.node()] + list(node.list().list())
+    elif nodeType == QgsExpressionNode.ntFunction:
+        return list(node.args().list()) if node.args() is not None else []
+    elif nodeType == QgsExpressionNode.ntCondition:
+        children = []
+        for whenThen in node.conditions():
+            children.extend([whenThen.whenExp(), whenThen.thenExp()])
+        children.append(node.elseExp())
+        return children
+    return None
+
+
+def count_columns(node, counts):
+    """
+    Counts the reads of each column in an expression tree.
+    """
+    if node is None:
+        return
+    if node.nodeType() == QgsExpressionNode.ntColumnRef:
+        counts[node.name()] = counts.get(node.name(), 0) + 1
+        return
+    for child in child_nodes(node) or []:
+        count_columns(child, counts)
+
+
+def is_constant_operation(node):
+    """
+    Tells if a node gives the same result for the same operands, leaving
+    out the functions which read the feature or change between calls.
+    """
+    if node.nodeType() != QgsExpressionNode.ntFunction:
+        return True
+    function = QgsExpression.Functions()[node.fnIndex()]
+    name = function.name()
+    return not (name in volatile_functions or name.startswith("$") or
+                function.usesGeometry(node) or
+                function.referencedColumns(node))
+
+
+def is_constant(node):
+    """
+    Tells if an expression tree reads no feature, variable or changing
+    function, so that it can be evaluated once at export. Only used for
+    the nodes which are not compiled, as it parses the tree again.
+    """
+    exp = QgsExpression(node.dump())
+    if exp.hasParserError():
+        return False
+    if exp.referencedColumns() or exp.referencedVariables():
+        return False
+    if exp.needsGeometry():
+        return False
+    functions = exp.referencedFunctions()
+    return not any(function in volatile_functions or
+                   function.startswith("$") for function in functions)
+
+
+def fold_constant(node):
+    """
+    Evaluates a constant expression tree.
+    :return: the JS literal of its value, or None if it cannot be folded
+    """
+    exp = QgsExpression(node.dump())
+    value = exp.evaluate(QgsExpressionContext())
+    if exp.hasEvalError():
+        return None
+    return js_literal(value)
 
 
-def handle_binary(node, mapLib):
+def js_literal(val):
+    """
+    Returns the JS literal of a value, or None for values without one.
+    """
+    if val is None or (hasattr(val, "isNull") and val.isNull()):
+        return "null"
+    if isinstance(val, bool):
+        return "true" if val else "false"
+    if isinstance(val, (int, float)):
+        if isinstance(val, float) and (math.isnan(val) or math.isinf(val)):
+            return None
+        return repr(val)
+    if isinstance(val, str):
+        return json.dumps(val)
+    return None
+
+
+def handle_condition(node, args):
+    elsejs = args[-1]
+    for whenjs, thenjs in reversed(list(zip(args[:-1:2], args[1:-1:2]))):
+        if whenjs == "true":
+            elsejs = thenjs
+        elif whenjs not in ("false", "null"):
+            elsejs = "(%s ? %s : %s)" % (whenjs, thenjs, elsejs)
+    return elsejs
+
+
+def handle_binary(node, args):
     op = node.op()
     retOp = binary_ops[op]
-    left = node.opLeft()
-    right = node.opRight()
-    retLeft = walkExpression(left, mapLib)
-    retRight = walkExpression(right, mapLib)
+    retLeft, retRight = args
     if retOp == "LIKE":
-        return "(%s.indexOf(%s) > -1)" % (retLeft[:-1],
+        return "(%s.indexOf(%s) > -1)" % (retLeft,
                                           re.sub("[_%]", "", retRight))
     elif retOp == "NOT LIKE":
-        return "(%s.indexOf(%s) == -1)" % (retLeft[:-1],
+        return "(%s.indexOf(%s) == -1)" % (retLeft,
                                            re.sub("[_%]", "", retRight))
     elif retOp == "ILIKE":
         return "(%s.toLowerCase().indexOf(%s.toLowerCase()) > -1)" % (
-            retLeft[:-1],
+            retLeft,
             re.sub("[_%]", "", retRight))
     elif retOp == "NOT ILIKE":
         return "(%s.toLowerCase().indexOf(%s.toLowerCase()) == -1)" % (
-            retLeft[:-1],
+            retLeft,
             re.sub("[_%]", "", retRight))
     elif retOp == "~":
-        return "/%s/.test(%s)" % (retRight[1:-2], retLeft[:-1])
+        return "new RegExp(%s).test(%s)" % (retRight, retLeft)
     elif retOp == "//":
-        return "(Math.floor(%s %s %s))" % (retLeft, retOp, retRight)
+        return "(Math.floor(%s / %s))" % (retLeft, retRight)
+    elif retOp == "^":
+        return "Math.pow(%s, %s)" % (retLeft, retRight)
     else:
         return "(%s %s %s)" % (retLeft, retOp, retRight)
 
 
-def handle_unary(node, mapLib):
+def handle_unary(node, args):
     op = node.op()
-    operand = node.operand()
     retOp = unary_ops[op]
-    retOperand = walkExpression(operand, mapLib)
-    return "%s %s " % (retOp, retOperand)
+    return "(%s%s)" % (retOp, args[0])
 
 
-def handle_in(node, mapLib):
-    operand = node.node()
-    retOperand = walkExpression(operand, mapLib)
-    list = node.list().dump()
-    retList = json.dumps(list)
+def handle_in(node, args):
+    retOperand = args[0]
+    retList = ", ".join(args[1:])
     if node.isNotIn():
         notIn = "!"
     else:
         notIn = ""
-    return "%s%s.indexOf(%s) > -1 " % (notIn, retList, retOperand)
+    return "(%s([%s].indexOf(%s) > -1))" % (notIn, retList, retOperand)
 
 
 def handle_literal(node):
-    val = node.value()
-    quote = ""
+    val = js_literal(node.value())
     if val is None:
-        val = "null"
-    elif isinstance(val, str):
-        quote = "'"
-        val = val.replace("\n", "\\n")
-    return "%s%s%s" % (quote, str(val), quote)
+        val = json.dumps(str(node.value()))
+    return val
 
 
-def handle_function(node, mapLib):
+def handle_function(node, args):
     fnIndex = node.fnIndex()
     func = QgsExpression.Functions()[fnIndex]
-    args = node.args().list()
     retFunc = (func.name())
-    retArgs = []
-    for arg in args:
-        retArgs.append(walkExpression(arg, mapLib))
-    retArgs = ",".join(retArgs)
+    retArgs = ",".join(args)
     return "fnc_%s([%s], context)" % (retFunc, retArgs)
 
 
-def handle_columnRef(node, mapLib):
+def handle_columnRef(node, mapLib, columns=None):
+    if columns and node.name() in columns:
+        return columns[node.name()]
+    return column_read(node.name(), mapLib)
+
+
+def column_read(name, mapLib):
     if mapLib is None:
-        return "feature['%s'] " % node.name()
+        return "feature[%s]" % json.dumps(name)
     if mapLib == "Leaflet":
-        return "feature.properties['%s'] " % node.name()
+        return "attributes[%s]" % json.dumps(name)
     else:
-        return "feature.get('%s') " % node.name()
+        return "feature.get(%s)" % json.dumps(name)
 
 
 def render_examples():
@@ -270,18 +396,185 @@ def render_examples():
         f.writelines("\n\n".join(lines))
 
 
+class CompileCache(object):
+    """
+    Generated JS functions kept on disk across exports, keyed by the
+    expression text, target library and function name.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = None
+        self.dirty = False
+
+    def key(self, exp, name, mapLib):
+        return hashlib.sha1(json.dumps(
+            [COMPILER_VERSION, Qgis.QGIS_VERSION_INT, mapLib, name,
+             exp]).encode("utf-8")).hexdigest()
+
+    def load(self):
+        if self.entries is None:
+            self.entries = OrderedDict()
+            try:
+                with open(self.path) as f:
+                    self.entries.update(json.load(f))
+            except (IOError, OSError, ValueError):
+                pass
+
+    def get(self, exp, name, mapLib):
+        key = self.key(exp, name, mapLib)
+        with self.lock:
+            self.load()
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = entry
+            return entry
+
+    def put(self, exp, name, mapLib, entry):
+        key = self.key(exp, name, mapLib)
+        with self.lock:
+            self.load()
+            self.entries.pop(key, None)
+            self.entries[key] = list(entry)
+            while len(self.entries) > COMPILE_CACHE_LIMIT:
+                self.entries.popitem(last=False)
+            self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            try:
+                folder = os.path.dirname(self.path)
+                if not os.path.exists(folder):
+                    os.makedirs(folder)
+                tmp = "%s.%d.tmp" % (self.path, threading.get_ident())
+                with open(tmp, "w") as f:
+                    json.dump(self.entries, f)
+                os.replace(tmp, self.path)
+                self.dirty = False
+            except (IOError, OSError):
+                pass
+
+
+class ExpressionCompiler(object):
+    """
+    Compiles the expressions of one expressions file. Compilers share no
+    state but the compile cache, and may be used from several threads.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.functions = OrderedDict()
+
+    def compile(self, exp, name=None, mapLib=None):
+        """
+        Generate JS function for exp, to be written by write. An expression
+        already compiled gives the name of its existing function.
+        :param exp: The expression to export to JS
+        :return: The name of the function you can call.
+        """
+        key = (mapLib, QgsExpression(exp).dump())
+        with self.lock:
+            if key in self.functions:
+                return self.functions[key][0]
+        entry = self.cache.get(exp, name, mapLib) if self.cache else None
+        if entry is None:
+            functionjs, fnName, _ = compile(exp, name=name, mapLib=mapLib)
+            entry = (fnName, functionjs)
+            if self.cache:
+                self.cache.put(exp, name, mapLib, entry)
+        with self.lock:
+            return self.functions.setdefault(key, tuple(entry))[0]
+
+    def write(self, filename):
+        """
+        Rewrite the runtime library at the given file name with only the
+        library functions the compiled functions call, followed by the
+        compiled functions, in a single write.
+        """
+        with self.lock:
+            compiled = "".join("\n\n" + functionjs for name, functionjs
+                               in self.functions.values())
+        with open(filename) as f:
+            library = OrderedDict(
+                (match.group(1), match.group(0))
+                for match in library_function.finditer(f.read()))
+        runtime = tree_shake(library, compiled)
+        with open(filename, "w") as f:
+            f.write("\n\n".join(runtime) + compiled)
+        if self.cache:
+            self.cache.save()
+
+
+compileCache = CompileCache(os.path.join(QgsApplication.qgisSettingsDirPath(),
+                                         "qgis2web", "expressions.json"))
+# the compiler of each expressions file being exported, per export thread
+compilers = threading.local()
+
+
+def getCompilers():
+    if not hasattr(compilers, "files"):
+        compilers.files = {}
+    return compilers.files
+
+
+def getCompiler(filename):
+    files = getCompilers()
+    if filename not in files:
+        files[filename] = ExpressionCompiler(compileCache)
+    return files[filename]
+
+
 def compile_to_file(exp, name=None, mapLib=None, filename="expressions.js"):
     """
-    Generate JS function to file from exp and append it to the end of the given file name.
+    Generate JS function for exp, to be appended to the end of the given file
+    name by write_expressions. An expression already compiled for the file
+    gives the name of its existing function.
     :param exp: The expression to export to JS
     :return: The name of the function you can call.
     """
-    functionjs, name, _ = compile(exp, name=name, mapLib=mapLib)
-    with open(filename, "a") as f:
-        f.write("\n\n")
-        f.write(functionjs)
+    return getCompiler(filename).compile(exp, name, mapLib)
+
 
-    return name
+def write_expressions(filename):
+    """
+    Rewrite the runtime library at the given file name with the functions
+    compiled for it, and forget them.
+    """
+    compiler = getCompilers().pop(filename, None) or ExpressionCompiler()
+    compiler.write(filename)
+
+
+def discard_expressions():
+    """
+    Forget the functions compiled in this thread for expressions files that
+    were not written, such as those of a cancelled or failed export.
+    """
+    getCompilers().clear()
+
+
+def tree_shake(library, js):
+    """
+    Return the library functions called from js and, in turn, from those
+    functions, in library order. Calls to QGIS functions the library does
+    not implement are given stubs.
+    """
+    used = set()
+    stack = [js]
+    while stack:
+        body = stack.pop()
+        for name in re.findall(r"\b(fnc_[\w$]+|qgis2web_\w+)\(", body):
+            if name not in used:
+                used.add(name)
+                stack.append(library.get(name, ""))
+    runtime = [function for name, function in library.items()
+               if name in used]
+    runtime.extend(stub_template % name for name in sorted(used)
+                   if name not in library and name.startswith("fnc_"))
+    return runtime
 
 
 if __name__ == "__main__":
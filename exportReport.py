@@ -0,0 +1,262 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from html import escape
+
+from qgis2web.publisher import fileSizes
+
+# written next to index.html
+REPORT_NAME = "export-report.json"
+REPORT_VERSION = 1
+# budgets used when the params have none
+SIZE_BUDGET_MB = 5
+FEATURE_BUDGET = 20000
+# generated scripts of the page, as opposed to copied libraries
+PAGE_SCRIPTS = ("qgis2web.js", "qgis2web_expressions.js", "layers.js")
+
+
+def fileCategory(path):
+    """
+    Returns the category of an exported file, given by its path relative
+    to the export folder with forward slashes.
+    """
+    parts = path.split("/")
+    name = parts[-1]
+    if len(parts) == 1:
+        return "html" if name.endswith(".html") else "other"
+    if name.startswith("legend"):
+        return "legends"
+    if name in PAGE_SCRIPTS:
+        return "scripts"
+    folder = parts[0]
+    if folder in ("layers", "data"):
+        return "data"
+    if folder == "styles":
+        return "styles" if name.endswith(".js") else "images"
+    if folder in ("images", "markers"):
+        return "images"
+    if folder in ("resources", "js", "css", "webfonts"):
+        return "libraries"
+    return "other"
+
+
+def layerBytes(folder, layer):
+    """
+    Returns the bytes of the files a layer writes under folder, which are
+    named after it: its files, its tiles folder and its cluster folder.
+    """
+    size = 0
+    roots = [os.path.join(folder, "clusters", layer)]
+    for entry in os.scandir(folder):
+        if entry.name != layer and not entry.name.startswith(layer + "."):
+            continue
+        if entry.is_dir():
+            roots.append(entry.path)
+        else:
+            size += entry.stat().st_size
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                size += os.path.getsize(os.path.join(dirpath, filename))
+    return size
+
+
+def formatBytes(size):
+    if size < 1024:
+        return "%d B" % size
+    for unit in ("KB", "MB", "GB"):
+        size /= 1024.0
+        if size < 1024 or unit == "GB":
+            return "%.1f %s" % (size, unit)
+
+
+class ExportReport(object):
+    """
+    Times the stages of an export and measures what it writes: the wall
+    and CPU time of each stage, the features, vertices and bytes of each
+    layer, and the bytes of each category of file. Layers over the size or
+    feature budget of the params are warned about.
+
+    Stages nest, and their times are exclusive: while a stage runs, the
+    stage it is nested in is paused, so that the times add up to the whole
+    export. CPU time is that of the writing thread.
+    """
+
+    def __init__(self, params=None):
+        dataExport = (params or {}).get("Data export", {})
+        self.sizeBudget = float(dataExport.get("Layer size budget (MB)",
+                                               SIZE_BUDGET_MB))
+        self.featureBudget = int(dataExport.get("Layer feature budget",
+                                                FEATURE_BUDGET))
+        self.stages = []
+        self.layers = {}
+        self.files = {}
+        self.warnings = []
+        self.running = []
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def layer(self, name):
+        if name not in self.layers:
+            self.layers[name] = {"features": 0, "vertices": 0, "bytes": 0,
+                                 "wall": 0.0, "cpu": 0.0}
+        return self.layers[name]
+
+    def pause(self):
+        if self.running:
+            entry = self.running[-1]
+            entry["wall"] += time.perf_counter() - entry.pop("wallStart")
+            entry["cpu"] += time.thread_time() - entry.pop("cpuStart")
+
+    def resume(self):
+        if self.running:
+            entry = self.running[-1]
+            entry["wallStart"] = time.perf_counter()
+            entry["cpuStart"] = time.thread_time()
+
+    @contextmanager
+    def stage(self, name, layer=None, folder=None):
+        """
+        Times a stage, for one layer if given. The files named after the
+        layer under folder are counted for it.
+        """
+        entry = {"stage": name, "layer": layer, "wall": 0.0, "cpu": 0.0}
+        self.pause()
+        self.running.append(entry)
+        self.resume()
+        try:
+            yield entry
+        finally:
+            self.pause()
+            self.running.pop()
+            self.resume()
+            self.stages.append(entry)
+            if layer:
+                stats = self.layer(layer)
+                stats["wall"] += entry["wall"]
+                stats["cpu"] += entry["cpu"]
+                if folder and os.path.isdir(folder):
+                    stats["bytes"] += layerBytes(folder, layer)
+
+    def addFeatures(self, features, vertices):
+        """
+        Counts features written by the innermost running stage of a layer.
+        """
+        for entry in reversed(self.running):
+            if entry["layer"]:
+                stats = self.layer(entry["layer"])
+                stats["features"] += features
+                stats["vertices"] += vertices
+                return
+
+    def finish(self, folder):
+        """
+        Measures the files under folder, checks the budgets and writes the
+        report there.
+        """
+        self.files = {}
+        for path, size in fileSizes(folder).items():
+            category = self.files.setdefault(fileCategory(path),
+                                             {"files": 0, "bytes": 0})
+            category["files"] += 1
+            category["bytes"] += size
+        self.wall = sum(entry["wall"] for entry in self.stages)
+        self.cpu = sum(entry["cpu"] for entry in self.stages)
+        self.warnings = []
+        for name, stats in sorted(self.layers.items()):
+            if stats["bytes"] > self.sizeBudget * 1024 * 1024:
+                self.warnings.append(
+                    "%s writes %s, over the %g MB budget" %
+                    (name, formatBytes(stats["bytes"]), self.sizeBudget))
+            if stats["features"] > self.featureBudget:
+                self.warnings.append(
+                    "%s has %d features, over the budget of %d" %
+                    (name, stats["features"], self.featureBudget))
+        with open(os.path.join(folder, REPORT_NAME), "w") as f:
+            json.dump(self.asDict(), f, indent=2, sort_keys=True)
+
+    def stageTotals(self):
+        """
+        Returns the wall and CPU time of each stage, in order of first run.
+        """
+        totals = {}
+        for entry in self.stages:
+            total = totals.setdefault(entry["stage"], [0.0, 0.0])
+            total[0] += entry["wall"]
+            total[1] += entry["cpu"]
+        order = []
+        for entry in self.stages:
+            if entry["stage"] not in order:
+                order.append(entry["stage"])
+        return [(name, totals[name][0], totals[name][1]) for name in order]
+
+    def asDict(self):
+        return {"version": REPORT_VERSION,
+                "wall": round(self.wall, 3),
+                "cpu": round(self.cpu, 3),
+                "stages": [{"stage": entry["stage"],
+                            "layer": entry["layer"],
+                            "wall": round(entry["wall"], 3),
+                            "cpu": round(entry["cpu"], 3)}
+                           for entry in self.stages],
+                "layers": {name: dict(stats, wall=round(stats["wall"], 3),
+                                      cpu=round(stats["cpu"], 3))
+                           for name, stats in self.layers.items()},
+                "files": self.files,
+                "budgets": {"sizeMB": self.sizeBudget,
+                            "features": self.featureBudget},
+                "warnings": self.warnings}
+
+    def summaryHtml(self):
+        """
+        Returns the report as HTML tables, for the feedback dialog.
+        """
+        cell = '<td style="padding-right: 12px">%s</td>'
+        rows = ["<tr>%s</tr>" % "".join(cell % value for value in values)
+                for values in
+                [("<b>Stage</b>", "<b>Wall</b>", "<b>CPU</b>")] +
+                [(name, "%.2f s" % wall, "%.2f s" % cpu)
+                 for name, wall, cpu in self.stageTotals()] +
+                [("<b>Total</b>", "%.2f s" % self.wall, "%.2f s" % self.cpu)]]
+        html = "<table>%s</table>" % "".join(rows)
+        if self.layers:
+            rows = ["<tr>%s</tr>" % "".join(cell % value for value in values)
+                    for values in
+                    [("<b>Layer</b>", "<b>Features</b>", "<b>Vertices</b>",
+                      "<b>Size</b>", "<b>Time</b>")] +
+                    [(escape(name), stats["features"], stats["vertices"],
+                      formatBytes(stats["bytes"]), "%.2f s" % stats["wall"])
+                     for name, stats in sorted(
+                         self.layers.items(),
+                         key=lambda item: -item[1]["wall"])]]
+            html += "<table>%s</table>" % "".join(rows)
+        rows = ["<tr>%s</tr>" % "".join(cell % value for value in values)
+                for values in
+                [("<b>Files</b>", "<b>Count</b>", "<b>Size</b>")] +
+                [(category, stats["files"], formatBytes(stats["bytes"]))
+                 for category, stats in sorted(
+                     self.files.items(), key=lambda item: -item[1]["bytes"])]]
+        html += "<table>%s</table>" % "".join(rows)
+        for warning in self.warnings:
+            html += '<br/><span style="color: orange">%s</span>' % escape(
+                warning)
+        return html
@@ -0,0 +1,313 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import queue
+import threading
+import traceback
+
+from qgis.core import (Qgis,
+                       QgsMapSettings,
+                       QgsMessageLog,
+                       QgsRectangle,
+                       QgsTask)
+from qgis.PyQt import sip
+from qgis.PyQt.QtCore import QObject, QSize, pyqtSignal
+
+from qgis2web.feedbackDialog import Feedback, ExportCancelled
+from qgis2web.utils import exportState, snapshotFeatureSources, checkCancelled
+
+
+class CanvasSnapshot(object):
+    """
+    The state of the map canvas read by the writers, copied on the main
+    thread so that a background export does not touch the live canvas.
+    """
+
+    def __init__(self, canvas):
+        self._mapSettings = QgsMapSettings(canvas.mapSettings())
+        self._extent = QgsRectangle(canvas.extent())
+        self._size = QSize(canvas.size())
+
+    def mapSettings(self):
+        return self._mapSettings
+
+    def extent(self):
+        return self._extent
+
+    def size(self):
+        return self._size
+
+
+class IfaceSnapshot(object):
+    """
+    Stands in for the QGIS interface passed to the writers.
+    """
+
+    def __init__(self, iface):
+        self.canvas = CanvasSnapshot(iface.mapCanvas())
+
+    def mapCanvas(self):
+        return self.canvas
+
+
+class FeedbackRelay(QObject):
+    """
+    Calls a feedback object living on the main thread from a background
+    task, through a queued signal.
+    """
+    call = pyqtSignal(str, tuple)
+
+    def __init__(self, target):
+        QObject.__init__(self)
+        self.target = target
+        self.call.connect(self.deliver)
+
+    def deliver(self, method, args):
+        if isinstance(self.target, QObject) and sip.isdeleted(self.target):
+            return
+        getattr(self.target, method)(*args)
+
+
+class TaskFeedback(Feedback):
+    """
+    Feedback of an export running in a QgsTask: cancellation and progress
+    come from the task, and messages are relayed to a feedback object,
+    such as the feedback dialog, on the main thread.
+    """
+
+    def __init__(self, task, target=None):
+        self.task = task
+        self.relay = FeedbackRelay(target if target is not None
+                                   else Feedback())
+
+    def cancelled(self):
+        return self.task.isCanceled()
+
+    def acceptCancel(self):
+        # the writer and an exporter publishing alongside it both stop
+        with self.task.lock:
+            if self.task.cancelAccepted:
+                return
+            self.task.cancelAccepted = True
+        self.relay.call.emit("acceptCancel", ())
+
+    def reset(self):
+        self.relay.call.emit("reset", ())
+
+    def completeStep(self):
+        self.relay.call.emit("completeStep", ())
+
+    def setCompleted(self, text):
+        self.relay.call.emit("setCompleted", (text,))
+
+    def showFeedback(self, feedback):
+        self.relay.call.emit("showFeedback", (feedback,))
+
+    def setFatalError(self, error):
+        self.relay.call.emit("setFatalError", (error,))
+
+    def setProgress(self, progress):
+        self.task.setProgress(progress)
+        self.relay.call.emit("setProgress", (progress,))
+
+
+class PublishFeedback(TaskFeedback):
+    """
+    Feedback of an exporter publishing an export while it is written,
+    whose progress only shows once the writer, reporting its own, is done.
+    """
+
+    def __init__(self, feedback, pipeline):
+        self.task = feedback.task
+        self.relay = feedback.relay
+        self.pipeline = pipeline
+
+    def setProgress(self, progress):
+        if self.pipeline.isFinished():
+            TaskFeedback.setProgress(self, progress)
+
+
+class PublishPipeline(object):
+    """
+    Hands the files of an export to the exporter publishing it while it is
+    being written. The writer offers its output folder at checkpoints,
+    once the files of a stage are complete, and the files created since
+    the last checkpoint are queued for the exporter.
+
+    Only the folders whose modification time changed are listed again, so
+    a checkpoint costs little in a large export. Files rewritten in place
+    are not offered again; exporters compare the finished output with what
+    they uploaded.
+    """
+
+    def __init__(self):
+        self.folder = None
+        self.offered = set()
+        # modification time and subfolders of each folder listed
+        self.listed = {}
+        self.queue = queue.Queue()
+        self.finished = threading.Event()
+        self.result = None
+
+    def offer(self, folder):
+        """
+        Queues the files under folder which were not offered yet. Called by
+        the writer.
+        """
+        if self.finished.is_set():
+            return
+        self.folder = folder
+        pending = [folder]
+        while pending:
+            directory = pending.pop()
+            mtime = os.stat(directory).st_mtime_ns
+            listed = self.listed.get(directory)
+            if listed is not None and listed[0] == mtime:
+                pending.extend(listed[1])
+                continue
+            subfolders = []
+            for entry in os.scandir(directory):
+                if entry.is_dir():
+                    subfolders.append(entry.path)
+                elif entry.path not in self.offered:
+                    self.offered.add(entry.path)
+                    self.queue.put(os.path.relpath(
+                        entry.path, folder).replace(os.sep, "/"))
+            self.listed[directory] = (mtime, subfolders)
+            pending.extend(subfolders)
+
+    def finish(self, results):
+        """
+        Ends the pipeline with the WriterResult of the export, or None if
+        it failed or was cancelled.
+        """
+        if not self.finished.is_set():
+            self.result = results
+            self.finished.set()
+            self.queue.put(None)
+
+    def isFinished(self):
+        return self.finished.is_set()
+
+    def files(self):
+        """
+        Yields each file offered, by its path relative to folder with
+        forward slashes, until the writer finishes.
+        """
+        while True:
+            path = self.queue.get()
+            if path is None:
+                return
+            yield path
+
+    def results(self):
+        """
+        Waits for the writer and returns its WriterResult, or None.
+        """
+        self.finished.wait()
+        return self.result
+
+
+class ExportTask(QgsTask):
+    """
+    Writes a web map in the background, then optionally hands it to an
+    exporter. The layers are read through snapshots of their feature
+    sources, taken when the task is created on the main thread.
+
+    The exporter runs on a thread of its own, publishing the files through
+    a PublishPipeline as the writer completes them, so that uploading
+    overlaps writing.
+
+    onFinished(task, result) is called on the main thread once the task
+    ends; result is False if it was cancelled or failed, in which case
+    task.error holds the traceback of a failure.
+    """
+
+    def __init__(self, description, writer, iface, folder, feedback=None,
+                 exporter=None, onFinished=None):
+        QgsTask.__init__(self, description, QgsTask.CanCancel)
+        self.writer = writer
+        self.iface = IfaceSnapshot(iface)
+        self.folder = folder
+        self.exporter = exporter
+        self.onFinished = onFinished
+        self.target = feedback
+        self.feedback = TaskFeedback(self, feedback)
+        self.sources = snapshotFeatureSources(writer.layers)
+        self.results = None
+        self.published = False
+        self.error = None
+        self.lock = threading.Lock()
+        self.cancelAccepted = False
+        self.setDependentLayers(writer.layers)
+        if hasattr(feedback, "cancelRequested"):
+            feedback.cancelRequested.connect(self.cancel)
+
+    def run(self):
+        exportState.feedback = self.feedback
+        exportState.sources = self.sources
+        pipeline = None
+        publishing = None
+        if self.exporter is not None:
+            pipeline = exportState.pipeline = PublishPipeline()
+            publishing = threading.Thread(target=self.publish,
+                                          args=(pipeline,))
+            publishing.start()
+        try:
+            self.results = self.writer.write(self.iface,
+                                             dest_folder=self.folder,
+                                             feedback=self.feedback)
+            if pipeline is not None:
+                checkCancelled()
+                self.feedback.showFeedback('Success')
+                pipeline.finish(self.results)
+                publishing.join()
+            return not self.isCanceled() and self.error is None
+        except ExportCancelled:
+            self.feedback.acceptCancel()
+            return False
+        except Exception:
+            self.error = traceback.format_exc()
+            return False
+        finally:
+            if pipeline is not None:
+                pipeline.finish(None)
+                publishing.join()
+            exportState.feedback = None
+            exportState.sources = {}
+            exportState.pipeline = None
+
+    def publish(self, pipeline):
+        try:
+            self.published = self.exporter.postProcessPipeline(
+                pipeline, feedback=PublishFeedback(self.feedback, pipeline))
+        except Exception:
+            self.error = traceback.format_exc()
+
+    def finished(self, result):
+        if hasattr(self.target, "cancelRequested"):
+            try:
+                self.target.cancelRequested.disconnect(self.cancel)
+            except (TypeError, RuntimeError):
+                pass
+        if self.error is not None:
+            QgsMessageLog.logMessage(self.error, "qgis2web",
+                                     level=Qgis.Critical)
+        if self.onFinished is not None:
+            self.onFinished(self, result)
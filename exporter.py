@@ -22,9 +22,14 @@ import ftplib
 
 from qgis.core import QgsProject
 from qgis.PyQt.QtCore import QObject
-from qgis.PyQt.QtWidgets import QFileDialog, QInputDialog, QDialog, QLineEdit
-from .utils import tempFolder
+from qgis.PyQt.QtWidgets import (QFileDialog, QInputDialog, QDialog,
+                                 QLineEdit, QFormLayout, QDialogButtonBox,
+                                 QSpinBox, QCheckBox)
+from .utils import tempFolder, runOnMainThread
 from .feedbackDialog import Feedback
+from .ftpPublisher import FtpPublisher, FTP_CONNECTIONS
+from .s3Publisher import (S3Publisher, S3_CONNECTIONS, S3_ERRORS,
+                          CACHE_MAX_AGE, boto3_available)
 
 from .ui_ftp_configuration import Ui_FtpConfiguration
 translator = QObject()
@@ -80,6 +85,21 @@ class Exporter(QObject):
         """
         pass
 
+    def postProcessPipeline(self, pipeline, feedback=None):
+        """
+        Called while the HTML output is being written, on a thread of its
+        own. Exporters uploading files can override this to start on the
+        files the pipeline yields as the writer completes them. By default
+        waits for the writer and calls postProcess().
+        :param pipeline: PublishPipeline of the export
+        :param feedback: optional feedback object for progress reports
+        Returns True if processing was successful
+        """
+        results = pipeline.results()
+        if results is None:
+            return False
+        return self.postProcess(results, feedback)
+
     def destinationUrl(self):
         """
         :return: URL corresponding to final location for exported
@@ -232,6 +252,8 @@ class FtpExporter(Exporter):
         self.port = 21
         # if none, user will be prompted for password
         self.password = None
+        # concurrent connections used to upload
+        self.connections = FTP_CONNECTIONS
         self.temp_folder = self.newTempFolder(tempFolder())
 
     def newTempFolder(self, base):
@@ -262,25 +284,31 @@ class FtpExporter(Exporter):
         return self.temp_folder
 
     def postProcess(self, results, feedback=None):
+        return self.publish(results, None, feedback)
+
+    def postProcessPipeline(self, pipeline, feedback=None):
+        return self.publish(None, pipeline, feedback)
+
+    def publish(self, results, pipeline, feedback=None):
+        """
+        Uploads the results of an export, or the files of an export still
+        being written through pipeline
+        """
         if not feedback:
             feedback = Feedback()
 
-        self.export_file = results.index_file
-        file_count = max(len(results.files), 1)
-
         # generate a new temp_folder for next export
         self.temp_folder = self.newTempFolder(tempFolder())
 
-        source_folder = results.folder
-
         if not self.host or not self.username or not self.port:
             return False
 
         # get password
         password = self.password
         if password is None:
-            password, ok = QInputDialog.getText(
-                None, 'Enter FTP password', 'Password', QLineEdit.Password)
+            password, ok = runOnMainThread(
+                QInputDialog.getText, None, 'Enter FTP password', 'Password',
+                QLineEdit.Password)
             if not password or not ok:
                 feedback.setFatalError('User cancelled')
                 return False
@@ -288,87 +316,32 @@ class FtpExporter(Exporter):
         feedback.showFeedback(
             'Connecting to {} on port {}...'.format(self.host, self.port))
 
-        ftp = ftplib.FTP()
+        publisher = FtpPublisher(self.host, self.port, self.username,
+                                 password, self.remote_folder,
+                                 self.connections)
         try:
-            ftp.connect(self.host, self.port)
-        except Exception:
-            feedback.setFatalError('Could not connect to server!')
-            return False
-
-        feedback.showFeedback('Connected!')
-        feedback.showFeedback('Logging in as {}...'.format(self.username))
-        if feedback.cancelled():
-            feedback.acceptCancel()
-            return False
-
-        try:
-            ftp.login(self.username, password)
-        except Exception:
-            feedback.setFatalError("""Login failed for
-                                      user {}!""".format(self.username))
-            return False
-
-        feedback.showFeedback('Logged in to {}'.format(self.host))
-
-        def cwd_and_create(p):
-            """
-            recursively changes directory to an ftp target,
-            creating new folders as required.
-            """
-            if not p:
-                return
             try:
-                ftp.cwd(p)
+                publisher.connection()
+            except ftplib.error_perm:
+                feedback.setFatalError("""Login failed for
+                                          user {}!""".format(self.username))
+                return False
             except Exception:
-                parent, base = os.path.split(p)
-                cwd_and_create(parent)
-                if base:
-                    feedback.showFeedback('Creating {}'.format(base))
-                    ftp.mkd(base)
-                    ftp.cwd(base)
-
-        cwd_and_create(self.remote_folder)
-
-        feedback.uploaded_count = 0.0
-
-        def uploadPath(path):
-            if feedback.cancelled():
-                feedback.acceptCancel()
+                feedback.setFatalError('Could not connect to server!')
                 return False
+            feedback.showFeedback('Logged in to {}'.format(self.host))
 
-            files = os.listdir(path)
-            os.chdir(path)
-            for f in files:
-                if feedback.cancelled():
-                    feedback.acceptCancel()
-                    return False
-                current_path = os.path.join(path, f)
-                if os.path.isfile(current_path):
-                    feedback.showFeedback('Uploading {}'.format(f))
-                    fh = open(f, 'rb')
-                    ftp.storbinary('STOR %s' % f, fh)
-                    fh.close()
-                    feedback.uploaded_count += 1
-                    feedback.setProgress(
-                        100 * feedback.uploaded_count / file_count)
-                elif os.path.isdir(current_path):
-                    feedback.showFeedback('Creating folder {}'.format(f))
-                    try:
-                        ftp.mkd(f)
-                    except Exception:
-                        pass
-                    ftp.cwd(f)
-                    if not uploadPath(current_path):
-                        return False
-            ftp.cwd('..')
-            os.chdir('..')
-            return True
-
-        if not uploadPath(os.path.join('.', source_folder)):
+            if not publisher.publish(results and results.folder, feedback,
+                                     pipeline):
+                return False
+        except ftplib.all_errors as e:
+            feedback.setFatalError('Upload failed: {}'.format(e))
             return False
+        finally:
+            publisher.close()
 
+        self.export_file = (results or pipeline.results()).index_file
         feedback.setCompleted('Upload complete!')
-        ftp.close()
         return True
 
     def destinationUrl(self):
@@ -407,6 +380,233 @@ class FtpExporter(Exporter):
             self.port = port
 
 
+class S3ConfigurationDialog(QDialog):
+
+    """
+    A dialog for configuring the bucket and credentials of an S3
+    compatible object store
+    """
+
+    def __init__(self, parent=None):
+        QDialog.__init__(self, parent)
+        self.setWindowTitle(self.tr("S3 Configuration"))
+        layout = QFormLayout(self)
+        self.endpointLineEdit = QLineEdit()
+        self.endpointLineEdit.setPlaceholderText(
+            self.tr("Amazon S3, or e.g. http://localhost:9000"))
+        self.regionLineEdit = QLineEdit()
+        self.bucketLineEdit = QLineEdit()
+        self.prefixLineEdit = QLineEdit()
+        self.accessKeyLineEdit = QLineEdit()
+        self.accessKeyLineEdit.setPlaceholderText(
+            self.tr("From the environment"))
+        self.publicUrlLineEdit = QLineEdit()
+        self.maxAgeSpinBox = QSpinBox()
+        self.maxAgeSpinBox.setRange(0, 31536000)
+        self.maxAgeSpinBox.setSuffix(" s")
+        self.compressCheckBox = QCheckBox(self.tr("Gzip text files"))
+        layout.addRow(self.tr("Endpoint"), self.endpointLineEdit)
+        layout.addRow(self.tr("Region"), self.regionLineEdit)
+        layout.addRow(self.tr("Bucket"), self.bucketLineEdit)
+        layout.addRow(self.tr("Folder"), self.prefixLineEdit)
+        layout.addRow(self.tr("Access key"), self.accessKeyLineEdit)
+        layout.addRow(self.tr("Public URL"), self.publicUrlLineEdit)
+        layout.addRow(self.tr("Cache lifetime"), self.maxAgeSpinBox)
+        layout.addRow("", self.compressCheckBox)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok |
+                                   QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def setSettings(self, exporter):
+        """
+        Sets the settings of an S3Exporter to initially show in the dialog
+        """
+        self.endpointLineEdit.setText(exporter.endpoint)
+        self.regionLineEdit.setText(exporter.region)
+        self.bucketLineEdit.setText(exporter.bucket)
+        self.prefixLineEdit.setText(exporter.prefix)
+        self.accessKeyLineEdit.setText(exporter.access_key)
+        self.publicUrlLineEdit.setText(exporter.public_url)
+        self.maxAgeSpinBox.setValue(exporter.max_age)
+        self.compressCheckBox.setChecked(exporter.compress)
+
+    def applySettings(self, exporter):
+        """
+        Stores the settings from the dialog in an S3Exporter
+        """
+        exporter.endpoint = self.endpointLineEdit.text().strip()
+        exporter.region = self.regionLineEdit.text().strip()
+        exporter.bucket = self.bucketLineEdit.text().strip()
+        exporter.prefix = self.prefixLineEdit.text().strip().strip("/")
+        exporter.access_key = self.accessKeyLineEdit.text().strip()
+        exporter.public_url = self.publicUrlLineEdit.text().strip()
+        exporter.max_age = self.maxAgeSpinBox.value()
+        exporter.compress = self.compressCheckBox.isChecked()
+
+
+class S3Exporter(Exporter):
+
+    """
+    Exporter for writing web map to a bucket of Amazon S3 or another S3
+    compatible object store, such as MinIO
+    """
+
+    def __init__(self):
+        super(Exporter, self).__init__()
+        # empty endpoint and region use the Amazon S3 defaults
+        self.endpoint = ''
+        self.region = ''
+        self.bucket = 'mybucket'
+        self.prefix = ''
+        # if empty, credentials come from the environment or ~/.aws
+        self.access_key = ''
+        # if none, user will be prompted for the secret key
+        self.secret_key = None
+        # URL of the bucket as served to browsers, if not the endpoint
+        self.public_url = ''
+        self.max_age = CACHE_MAX_AGE
+        self.compress = True
+        self.connections = S3_CONNECTIONS
+        self.export_file = None
+        self.temp_folder = self.newTempFolder(tempFolder())
+
+    def newTempFolder(self, base):
+        stamp = datetime.now().strftime("%Y_%m_%d-%H_%M_%S_%f")
+        return os.path.join(base, 'qgis2web_' + stamp)
+
+    @classmethod
+    def type(cls):
+        return 's3'
+
+    @classmethod
+    def name(cls):
+        return QObject.tr(translator, 'Export to S3 bucket')
+
+    def configure(self, parent_widget=None):
+        dialog = S3ConfigurationDialog(parent_widget)
+        dialog.setSettings(self)
+        if dialog.exec_():
+            dialog.applySettings(self)
+
+    def exportDirectory(self):
+        return self.temp_folder
+
+    def postProcess(self, results, feedback=None):
+        return self.publish(results, None, feedback)
+
+    def postProcessPipeline(self, pipeline, feedback=None):
+        return self.publish(None, pipeline, feedback)
+
+    def publish(self, results, pipeline, feedback=None):
+        """
+        Uploads the results of an export, or the files of an export still
+        being written through pipeline
+        """
+        if not feedback:
+            feedback = Feedback()
+
+        # generate a new temp_folder for next export
+        self.temp_folder = self.newTempFolder(tempFolder())
+
+        if not boto3_available:
+            feedback.setFatalError(
+                'Exporting to S3 needs the boto3 Python package')
+            return False
+        if not self.bucket:
+            return False
+
+        secret_key = self.secret_key
+        if self.access_key and secret_key is None:
+            secret_key, ok = runOnMainThread(
+                QInputDialog.getText, None, 'Enter S3 secret key',
+                'Secret key', QLineEdit.Password)
+            if not secret_key or not ok:
+                feedback.setFatalError('User cancelled')
+                return False
+
+        feedback.showFeedback('Publishing to bucket {}...'.format(
+            self.bucket))
+        try:
+            publisher = S3Publisher(self.bucket, self.prefix, self.endpoint,
+                                    self.region, self.access_key, secret_key,
+                                    self.connections, self.compress,
+                                    self.max_age)
+            if not publisher.publish(results and results.folder, feedback,
+                                     pipeline):
+                return False
+        except S3_ERRORS as e:
+            feedback.setFatalError('Upload failed: {}'.format(e))
+            return False
+
+        self.export_file = self.objectUrl('index.html')
+        feedback.setCompleted('Upload complete!')
+        return True
+
+    def objectUrl(self, path):
+        """
+        Returns the URL an object is served at
+        """
+        key = '/'.join([part for part in [self.prefix, path] if part])
+        if self.public_url:
+            return '{}/{}'.format(self.public_url.rstrip('/'), key)
+        if self.endpoint:
+            return '{}/{}/{}'.format(self.endpoint.rstrip('/'), self.bucket,
+                                     key)
+        if self.region:
+            return 'https://{}.s3.{}.amazonaws.com/{}'.format(
+                self.bucket, self.region, key)
+        return 'https://{}.s3.amazonaws.com/{}'.format(self.bucket, key)
+
+    def destinationUrl(self):
+        return self.export_file
+
+    def writeToProject(self):
+        QgsProject.instance().writeEntry("qgis2web",
+                                         "S3Endpoint",
+                                         self.endpoint)
+        QgsProject.instance().writeEntry("qgis2web",
+                                         "S3Region",
+                                         self.region)
+        QgsProject.instance().writeEntry("qgis2web",
+                                         "S3Bucket",
+                                         self.bucket)
+        QgsProject.instance().writeEntry("qgis2web",
+                                         "S3Folder",
+                                         self.prefix)
+        QgsProject.instance().writeEntry("qgis2web",
+                                         "S3AccessKey",
+                                         self.access_key)
+        QgsProject.instance().writeEntry("qgis2web",
+                                         "S3PublicUrl",
+                                         self.public_url)
+        QgsProject.instance().writeEntry("qgis2web",
+                                         "S3MaxAge",
+                                         self.max_age)
+        QgsProject.instance().writeEntry("qgis2web",
+                                         "S3Compress",
+                                         self.compress)
+
+    def readFromProject(self):
+        project = QgsProject.instance()
+        for key, attribute in (("S3Endpoint", "endpoint"),
+                               ("S3Region", "region"),
+                               ("S3Bucket", "bucket"),
+                               ("S3Folder", "prefix"),
+                               ("S3AccessKey", "access_key"),
+                               ("S3PublicUrl", "public_url")):
+            value, ok = project.readEntry("qgis2web", key)
+            if ok:
+                setattr(self, attribute, value)
+        max_age, ok = project.readNumEntry("qgis2web", "S3MaxAge")
+        if ok:
+            self.max_age = max_age
+        compress, ok = project.readBoolEntry("qgis2web", "S3Compress")
+        if ok:
+            self.compress = compress
+
+
 class ExporterRegistry(QObject):
 
     """
@@ -419,7 +619,7 @@ class ExporterRegistry(QObject):
         super(ExporterRegistry, self).__init__(parent)
 
         self.exporters = {e.type(): e for e in
-                          [FolderExporter, FtpExporter]}
+                          [FolderExporter, FtpExporter, S3Exporter]}
 
     def getExporters(self):
         """
@@ -16,13 +16,20 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
-from qgis.PyQt.QtCore import QObject, QCoreApplication
+from qgis.PyQt.QtCore import QObject, QCoreApplication, pyqtSignal
 from qgis.PyQt.QtWidgets import QDialog, QDialogButtonBox
 from .ui_feedback_dialog import Ui_Feedback
 
 translator = QObject()
 
 
+class ExportCancelled(Exception):
+
+    """
+    Raised at a checkpoint of an export which the user has cancelled
+    """
+
+
 class Feedback(object):
 
     """
@@ -87,6 +94,8 @@ class FeedbackDialog(QDialog, Ui_Feedback, Feedback):
     A dialog for showing feedback
     """
 
+    cancelRequested = pyqtSignal()
+
     def __init__(self, parent=None):
         QDialog.__init__(self, parent)
         self.setupUi(self)
@@ -107,6 +116,7 @@ class FeedbackDialog(QDialog, Ui_Feedback, Feedback):
 
     def cancel(self):
         self.is_cancelled = True
+        self.cancelRequested.emit()
 
     def cancelled(self):
         self.processEvents()
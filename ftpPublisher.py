@@ -0,0 +1,265 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import ftplib
+import hashlib
+import io
+import json
+import os
+import posixpath
+import threading
+import time
+
+from qgis2web.publisher import (Publisher, MANIFEST_NAME, MANIFEST_VERSION,
+                                INDEX_FILES, HASH_BLOCK)
+
+# uploads are written under this suffix and renamed once complete
+PART_SUFFIX = ".part"
+FTP_CONNECTIONS = 4
+FTP_TIMEOUT = 60
+# servers drop sessions left idle for a few minutes, so connections idle
+# for longer than this are checked before being used again
+FTP_IDLE_CHECK = 30
+# completed uploads between two saves of the manifest
+MANIFEST_SAVE_INTERVAL = 50
+
+
+def fileDigest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fileEntry(folder, path):
+    """
+    Returns the size and content hash of a file, given by its path relative
+    to folder with forward slashes.
+    """
+    path = os.path.join(folder, *path.split("/"))
+    return {"size": os.path.getsize(path), "sha1": fileDigest(path)}
+
+
+class FtpPublisher(Publisher):
+    """
+    Publishes a folder to an FTP site. Only the files whose size or hash
+    differ from the manifest kept on the server are uploaded, over a pool
+    of connections.
+
+    Each file is uploaded under a temporary name and renamed into place,
+    so that an interrupted upload is resumed by the next publish rather
+    than restarted. All paths are absolute on the server and local files
+    are opened by their full path: neither the FTP sessions' nor the
+    process' working directory is relied upon.
+    """
+
+    def __init__(self, host, port, username, password, remoteFolder,
+                 connections=FTP_CONNECTIONS, timeout=FTP_TIMEOUT):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.remoteFolder = remoteFolder
+        Publisher.__init__(self, connections)
+        self.timeout = timeout
+        self.root = None
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.foldersLock = threading.Lock()
+        self.opened = []
+
+    def connect(self):
+        ftp = ftplib.FTP()
+        ftp.connect(self.host, self.port, timeout=self.timeout)
+        ftp.login(self.username, self.password)
+        ftp.voidcmd("TYPE I")
+        with self.lock:
+            self.opened.append(ftp)
+        return ftp
+
+    def connection(self):
+        """
+        Returns the connection of the calling thread, opened on first use
+        and opened again if the server dropped it while idle.
+        """
+        ftp = getattr(self.local, "ftp", None)
+        if (ftp is not None and
+                time.monotonic() - self.local.used > FTP_IDLE_CHECK):
+            try:
+                ftp.voidcmd("NOOP")
+            except ftplib.all_errors:
+                self.discard(ftp)
+                ftp = None
+        if ftp is None:
+            ftp = self.local.ftp = self.connect()
+        self.local.used = time.monotonic()
+        return ftp
+
+    def discard(self, ftp):
+        with self.lock:
+            if ftp in self.opened:
+                self.opened.remove(ftp)
+        ftp.close()
+
+    def close(self):
+        with self.lock:
+            for ftp in self.opened:
+                try:
+                    ftp.quit()
+                except ftplib.all_errors:
+                    ftp.close()
+            self.opened = []
+        self.local = threading.local()
+
+    def remotePath(self, path):
+        return posixpath.join(self.root, path)
+
+    def makeRoot(self, ftp):
+        """
+        Creates the remote folder as needed and returns its absolute path.
+        """
+        folder = self.remoteFolder.replace("\\", "/")
+        start = ftp.pwd()
+        path = "/" if folder.startswith("/") else start
+        for part in folder.split("/"):
+            if not part:
+                continue
+            path = posixpath.join(path, part)
+            try:
+                ftp.mkd(path)
+            except ftplib.error_perm:
+                pass
+        ftp.cwd(path)
+        root = ftp.pwd()
+        ftp.cwd(start)
+        return root
+
+    def makeFolders(self, ftp, paths, known):
+        """Creates the remote folders of paths, parents first."""
+        folders = set()
+        for path in paths:
+            folder = posixpath.dirname(path)
+            while folder and folder not in known:
+                folders.add(folder)
+                folder = posixpath.dirname(folder)
+        for folder in sorted(folders, key=lambda f: f.count("/")):
+            try:
+                ftp.mkd(self.remotePath(folder))
+            except ftplib.error_perm:
+                pass
+            known.add(folder)
+
+    def readManifest(self, ftp):
+        data = io.BytesIO()
+        try:
+            ftp.retrbinary("RETR " + self.remotePath(MANIFEST_NAME),
+                           data.write)
+            manifest = json.loads(data.getvalue().decode("utf-8"))
+        except (ftplib.error_perm, ValueError):
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        return manifest.get("files", {})
+
+    def writeManifest(self, ftp, manifest):
+        data = json.dumps({"version": MANIFEST_VERSION, "files": manifest},
+                          sort_keys=True).encode("utf-8")
+        part = self.remotePath(MANIFEST_NAME + PART_SUFFIX)
+        ftp.storbinary("STOR " + part, io.BytesIO(data))
+        self.rename(ftp, part, self.remotePath(MANIFEST_NAME))
+
+    def rename(self, ftp, source, target):
+        try:
+            ftp.rename(source, target)
+        except ftplib.error_perm:
+            # some servers will not rename over an existing file
+            try:
+                ftp.delete(target)
+            except ftplib.error_perm:
+                pass
+            ftp.rename(source, target)
+
+    def fileVersion(self, folder, path):
+        return fileEntry(folder, path)
+
+    def isPublished(self, path, entry):
+        return self.manifest.get(path) == entry
+
+    def upload(self, folder, path, entry):
+        """
+        Uploads one file over the connection of the calling thread,
+        resuming what an earlier publish left of the same content.
+        """
+        ftp = self.connection()
+        with self.foldersLock:
+            self.makeFolders(ftp, [path], self.known)
+        target = self.remotePath(path)
+        # the hash keeps a partial upload from being resumed with
+        # different content
+        part = "%s.%s%s" % (target, entry["sha1"][:12], PART_SUFFIX)
+        try:
+            offset = ftp.size(part)
+        except ftplib.error_perm:
+            offset = None
+        if offset is not None and offset > entry["size"]:
+            offset = None
+        if offset is None or offset < entry["size"]:
+            with open(os.path.join(folder, *path.split("/")), "rb") as f:
+                f.seek(offset or 0)
+                ftp.storbinary("STOR " + part, f, rest=offset or None)
+        self.rename(ftp, part, target)
+
+    def begin(self, feedback):
+        feedback.showFeedback('Comparing with the published files...')
+        # the connection is asked for at each use, as the writer may leave
+        # it idle for longer than the server keeps it open
+        self.root = self.makeRoot(self.connection())
+        remote = self.readManifest(self.connection())
+        self.known = set(posixpath.dirname(path) for path in remote)
+        # what is on the server, saved as uploads complete so that an
+        # interrupted publish does not upload them again
+        self.manifest = dict(remote)
+        self.recorded = 0
+
+    def uploaded(self, path, entry, result):
+        self.manifest[path] = entry
+        self.recorded += 1
+        if self.recorded % MANIFEST_SAVE_INTERVAL == 0:
+            self.writeManifest(self.connection(), self.manifest)
+
+    def interrupt(self):
+        try:
+            self.writeManifest(self.connection(), self.manifest)
+        except ftplib.all_errors:
+            pass
+
+    def complete(self, folder, local, feedback):
+        for path in sorted(local):
+            if (path in INDEX_FILES and
+                    self.manifest.get(path) != local[path]):
+                self.upload(folder, path, local[path])
+                self.manifest[path] = local[path]
+        feedback.setProgress(100)
+        for path in [path for path in self.manifest if path not in local]:
+            try:
+                self.connection().delete(self.remotePath(path))
+            except ftplib.error_perm:
+                pass
+            self.manifest.pop(path, None)
+        self.writeManifest(self.connection(), self.manifest)
@@ -0,0 +1,102 @@
+var qgis2webClusters = (function() {
+    var indexes = {};
+
+    function lngLatToTile(lng, lat, z) {
+        var n = Math.pow(2, z);
+        lat = Math.max(-85.0511287798, Math.min(85.0511287798, lat));
+        var sin = Math.sin(lat * Math.PI / 180);
+        var x = Math.floor((lng / 360 + 0.5) * n);
+        var y = Math.floor((0.5 - 0.25 * Math.log((1 + sin) / (1 - sin)) / Math.PI) * n);
+        return [Math.min(n - 1, Math.max(0, x)), Math.min(n - 1, Math.max(0, y))];
+    }
+
+    function addScript(src) {
+        var script = document.createElement('script');
+        script.src = src;
+        script.onload = script.onerror = function() {
+            script.parentNode.removeChild(script);
+        };
+        document.body.appendChild(script);
+    }
+
+    return {
+        register: function(name, index) {
+            index.available = {};
+            for (var z in index.tiles) {
+                var tiles = index.tiles[z].tiles;
+                index.available[z] = {};
+                for (var i = 0; i < tiles.length; i++) {
+                    index.available[z][tiles[i]] = true;
+                }
+            }
+            index.zoom = null;
+            index.loaded = {};
+            index.pending = {};
+            index.generation = 0;
+            indexes[name] = index;
+        },
+        // Largest cell weight of the loaded level of a heatmap grid
+        maxWeight: function(name) {
+            var index = indexes[name];
+            return index.zoom === null ? 1 : index.tiles[index.zoom].maxWeight;
+        },
+        zoomForResolution: function(metresPerPixel) {
+            return Math.log(156543.03392804097 / metresPerPixel) / Math.LN2;
+        },
+        // Loads the tiles of the cluster level for zoom covering bbox
+        // ([west, south, east, north] in degrees). Returns true when the
+        // cluster level has changed, meaning that previously loaded
+        // features must be removed by the caller.
+        load: function(name, zoom, bbox, onData) {
+            var index = indexes[name];
+            var z = Math.max(index.minZoom, Math.min(index.maxZoom, Math.round(zoom)));
+            var changed = z !== index.zoom;
+            if (changed) {
+                index.zoom = z;
+                index.loaded = {};
+                index.pending = {};
+                index.generation++;
+            }
+            var tileZ = index.tiles[z].tileZoom;
+            var min = lngLatToTile(Math.max(bbox[0], -180), bbox[3], tileZ);
+            var max = lngLatToTile(Math.min(bbox[2], 180), bbox[1], tileZ);
+            var available = index.available[z] || {};
+            for (var x = min[0]; x <= max[0]; x++) {
+                for (var y = min[1]; y <= max[1]; y++) {
+                    var key = x + '_' + y;
+                    if (!available[key] || index.loaded[key]) {
+                        continue;
+                    }
+                    index.loaded[key] = true;
+                    index.pending[z + '/' + key] = {generation: index.generation, onData: onData};
+                    addScript(index.path + z + '/' + key + '.js');
+                }
+            }
+            return changed;
+        },
+        tile: function(name, z, x, y, data) {
+            var index = indexes[name];
+            var key = z + '/' + x + '_' + y;
+            var pending = index.pending[key];
+            delete index.pending[key];
+            if (pending && pending.generation === index.generation) {
+                pending.onData(data);
+            }
+        },
+        leafletMarker: function(feature, latlng) {
+            var count = feature.properties.point_count;
+            var size = count < 10 ? 'small' : count < 100 ? 'medium' : 'large';
+            var marker = L.marker(latlng, {
+                icon: L.divIcon({
+                    html: '<div><span>' + count + '</span></div>',
+                    className: 'marker-cluster marker-cluster-' + size,
+                    iconSize: L.point(40, 40)
+                })
+            });
+            marker.on('click', function() {
+                marker._map.setView(latlng, feature.properties.expansion_zoom);
+            });
+            return marker;
+        }
+    };
+})();
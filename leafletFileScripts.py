@@ -5,132 +5,121 @@ import os
 import shutil
 import codecs
 from qgis2web.utils import replaceInTemplate
+from qgis2web.assetBundler import AssetManifest
 
 
-def writeFoldersAndFiles(pluginDir, feedback, outputProjectFileName,
-                         cluster_set, measure, matchCRS, layerSearch,
-                         filterItems, canvas, address, locate, layersList):
-    feedback.showFeedback("Exporting libraries...")
+def writeFoldersAndFiles(pluginDir, feedback, outputProjectFileName):
     jsStore = os.path.join(outputProjectFileName, 'js')
     os.makedirs(jsStore)
     jsStore += os.sep
     jsDir = pluginDir + os.sep + 'leaflet' + os.sep + 'js' + os.sep
     dataStore = os.path.join(outputProjectFileName, 'data')
     os.makedirs(dataStore)
-    imageDir = pluginDir + os.sep + 'leaflet' + os.sep + 'images' + os.sep
     imageStore = os.path.join(outputProjectFileName, 'images')
+    os.makedirs(imageStore)
     legendStore = os.path.join(outputProjectFileName, 'legend')
     os.makedirs(legendStore)
     cssStore = os.path.join(outputProjectFileName, 'css')
     os.makedirs(cssStore)
     cssStore += os.sep
-    cssDir = pluginDir + os.sep + 'leaflet' + os.sep + 'css' + os.sep
-    fontDir = pluginDir + os.sep + 'webfonts' + os.sep
     fontStore = os.path.join(outputProjectFileName, 'webfonts')
     os.makedirs(fontStore)
-    fontStore += os.sep
     markerStore = os.path.join(outputProjectFileName, 'markers')
     os.makedirs(markerStore)
+    # rewritten with the functions the export uses, so never linked
     shutil.copyfile(jsDir + 'qgis2web_expressions.js',
                     jsStore + 'qgis2web_expressions.js')
-    shutil.copyfile(jsDir + 'leaflet.wms.js',
-                    jsStore + 'leaflet.wms.js')
-    shutil.copyfile(jsDir + 'leaflet-tilelayer-wmts.js',
-                    jsStore + 'leaflet-tilelayer-wmts.js')
-    shutil.copyfile(jsDir + 'leaflet-svg-shape-markers.min.js',
-                    jsStore + 'leaflet-svg-shape-markers.min.js')
-    shutil.copyfile(jsDir + 'leaflet.pattern.js',
-                    jsStore + 'leaflet.pattern.js')
-    shutil.copyfile(jsDir + 'rbush.min.js',
-                    jsStore + 'rbush.min.js')
-    shutil.copyfile(jsDir + 'labelgun.min.js',
-                    jsStore + 'labelgun.min.js')
-    shutil.copyfile(jsDir + 'labels.js',
-                    jsStore + 'labels.js')
-    shutil.copyfile(jsDir + 'leaflet.js', jsStore + 'leaflet.js')
-    shutil.copyfile(jsDir + 'leaflet.js.map', jsStore + 'leaflet.js.map')
-    shutil.copyfile(cssDir + 'leaflet.css', cssStore + 'leaflet.css')
-    if layersList != "None":
-        shutil.copyfile(jsDir + 'L.Control.Layers.Tree.min.js',
-                        jsStore + 'L.Control.Layers.Tree.min.js')
-        shutil.copyfile(cssDir + 'L.Control.Layers.Tree.css',
-                        cssStore + 'L.Control.Layers.Tree.css')
-    if address:
-        shutil.copyfile(jsDir + 'leaflet-control-geocoder.Geocoder.js',
-                        jsStore + 'leaflet-control-geocoder.Geocoder.js')
-        shutil.copyfile(cssDir + 'leaflet-control-geocoder.Geocoder.css',
-                        cssStore + 'leaflet-control-geocoder.Geocoder.css')
-    if locate:
-        shutil.copyfile(jsDir + 'L.Control.Locate.min.js',
-                        jsStore + 'L.Control.Locate.min.js')
-        shutil.copyfile(cssDir + 'L.Control.Locate.min.css',
-                        cssStore + 'L.Control.Locate.min.css')
-    shutil.copyfile(jsDir + 'multi-style-layer.js',
-                    jsStore + 'multi-style-layer.js')
-    shutil.copyfile(jsDir + 'Autolinker.min.js',
-                    jsStore + 'Autolinker.min.js')
-    shutil.copyfile(jsDir + 'OSMBuildings-Leaflet.js',
-                    jsStore + 'OSMBuildings-Leaflet.js')
-    shutil.copyfile(jsDir + 'leaflet-heat.js',
-                    jsStore + 'leaflet-heat.js')
-    shutil.copyfile(jsDir + 'Leaflet.VectorGrid.js',
-                    jsStore + 'Leaflet.VectorGrid.js')
-    shutil.copyfile(jsDir + 'leaflet-hash.js', jsStore + 'leaflet-hash.js')
-    shutil.copyfile(jsDir + 'leaflet.rotatedMarker.js',
-                    jsStore + 'leaflet.rotatedMarker.js')
+    return dataStore, cssStore
+
+
+def coreLibraries():
+    """
+    Returns the manifest of the libraries every Leaflet map loads.
+    """
+    manifest = AssetManifest('leaflet')
+    for lib in ['leaflet.js', 'leaflet.js.map',
+                'L.Control.Layers.Tree.min.js', 'leaflet.rotatedMarker.js',
+                'leaflet.pattern.js', 'leaflet-hash.js', 'Autolinker.min.js',
+                'rbush.min.js', 'labelgun.min.js', 'labels.js']:
+        manifest.add(os.path.join('js', lib), os.path.join('js', lib))
+    for css in ['leaflet.css', 'L.Control.Layers.Tree.css',
+                'fontawesome-all.min.css']:
+        manifest.add(os.path.join('css', css), os.path.join('css', css))
+    manifest.addTree(os.path.join('css', 'images'),
+                     os.path.join('css', 'images'))
+    for font in ['fa-solid-900.woff2', 'fa-solid-900.ttf']:
+        manifest.add(os.path.join(os.pardir, 'webfonts', font),
+                     os.path.join('webfonts', font))
+    return manifest
+
+
+def writeCoreLibraries(feedback, outputProjectFileName):
+    """
+    Writes the libraries every map loads, before the layers are exported,
+    returning their manifest.
+    """
+    feedback.showFeedback("Exporting libraries...")
+    manifest = coreLibraries()
+    manifest.write(outputProjectFileName)
+    feedback.completeStep()
+    return manifest
 
-    # copy icons
-    shutil.copyfile(cssDir + 'fontawesome-all.min.css',
-                    cssStore + 'fontawesome-all.min.css')
-    shutil.copyfile(fontDir + 'fa-solid-900.woff2',
-                    fontStore + 'fa-solid-900.woff2')
-    shutil.copyfile(fontDir + 'fa-solid-900.ttf',
-                    fontStore + 'fa-solid-900.ttf')
 
-    if len(cluster_set):
-        shutil.copyfile(jsDir + 'leaflet.markercluster.js',
-                        jsStore + 'leaflet.markercluster.js')
-        shutil.copyfile(cssDir + 'MarkerCluster.css',
-                        cssStore + 'MarkerCluster.css')
-        shutil.copyfile(cssDir + 'MarkerCluster.Default.css',
-                        cssStore + 'MarkerCluster.Default.css')
+def writeLibraries(feedback, outputProjectFileName, cluster_set, measure,
+                   matchCRS, layerSearch, filterItems, canvas, address,
+                   locate, useMultiStyle, useHeat, useShapes, useOSMB,
+                   useWMS, useWMTS, useVT, useClusterIndex=False,
+                   useCOG=False, written=None):
+    """
+    Writes the libraries loaded by writeHTMLstart, and no others, returning
+    their manifest. Those in the manifest written, from
+    writeCoreLibraries(), are not written again.
+    """
+    feedback.showFeedback("Exporting libraries...")
+    manifest = coreLibraries()
+    libraries = [(locate, ['L.Control.Locate.min.js'],
+                  ['L.Control.Locate.min.css']),
+                 (useMultiStyle, ['multi-style-layer.js'], []),
+                 (useHeat, ['leaflet-heat.js'], []),
+                 (useVT, ['Leaflet.VectorGrid.js'], []),
+                 (useShapes, ['leaflet-svg-shape-markers.min.js'], []),
+                 (useOSMB, ['OSMBuildings-Leaflet.js'], []),
+                 (useClusterIndex, ['qgis2web_clusters.js'], []),
+                 (useCOG, ['qgis2web_cog.js'], []),
+                 (any(cluster_set), ['leaflet.markercluster.js'],
+                  ['MarkerCluster.css', 'MarkerCluster.Default.css']),
+                 (layerSearch != "None", ['leaflet-search.js'],
+                  ['leaflet-search.css']),
+                 (filterItems != [], ['tailDT.js', 'nouislider.min.js',
+                                      'wNumb.js'],
+                  ['filter.css', 'nouislider.min.css']),
+                 (address, ['leaflet-control-geocoder.Geocoder.js'],
+                  ['leaflet-control-geocoder.Geocoder.css']),
+                 (measure != "None", ['leaflet-measure.js'],
+                  ['leaflet-measure.css']),
+                 (useWMS, ['leaflet.wms.js'], []),
+                 (useWMTS, ['leaflet-tilelayer-wmts.js'], []),
+                 (matchCRS and canvas.mapSettings().destinationCrs().authid()
+                  != 'EPSG:4326', ['proj4.js', 'proj4leaflet.js'], [])]
+    for used, jsLibs, cssLibs in libraries:
+        if not used:
+            continue
+        for lib in jsLibs:
+            manifest.add(os.path.join('js', lib), os.path.join('js', lib))
+        for css in cssLibs:
+            manifest.add(os.path.join('css', css), os.path.join('css', css))
     if layerSearch != "None":
-        shutil.copyfile(jsDir + 'leaflet-search.js',
-                        jsStore + 'leaflet-search.js')
-        shutil.copyfile(cssDir + 'leaflet-search.css',
-                        cssStore + 'leaflet-search.css')
-        shutil.copytree(imageDir, imageStore)
-    else:
-        os.makedirs(imageStore)
-    if filterItems != []:
-        shutil.copyfile(jsDir + 'tailDT.js',
-                        jsStore + 'tailDT.js')
-        shutil.copyfile(cssDir + 'filter.css',
-                        cssStore + 'filter.css')
-        shutil.copyfile(jsDir + 'nouislider.min.js',
-                        jsStore + 'nouislider.min.js')
-        shutil.copyfile(jsDir + 'wNumb.js',
-                        jsStore + 'wNumb.js')
-        shutil.copyfile(cssDir + 'nouislider.min.css',
-                        cssStore + 'nouislider.min.css')
-    if measure != "None":
-        shutil.copyfile(jsDir + 'leaflet-measure.js',
-                        jsStore + 'leaflet-measure.js')
-        shutil.copyfile(cssDir + 'leaflet-measure.css',
-                        cssStore + 'leaflet-measure.css')
-    shutil.copytree(cssDir + 'images', cssStore + 'images')
-    if (matchCRS and
-            canvas.mapSettings().destinationCrs().authid() != 'EPSG:4326'):
-        shutil.copyfile(jsDir + 'proj4.js', jsStore + 'proj4.js')
-        shutil.copyfile(jsDir + 'proj4leaflet.js', jsStore + 'proj4leaflet.js')
+        manifest.addTree('images', 'images')
+    manifest.write(outputProjectFileName, written)
     feedback.completeStep()
-    return dataStore, cssStore
+    return manifest
 
 
 def writeHTMLstart(outputIndex, webpage_name, cluster_set, address, measure,
                    matchCRS, layerSearch, filterItems, canvas, locate,
                    qgis2webJS, template, feedback, useMultiStyle, useHeat,
-                   useShapes, useOSMB, useWMS, useWMTS, useVT):
+                   useShapes, useOSMB, useWMS, useWMTS, useVT,
+                   useClusterIndex=False, useCOG=False):
     useCluster = False
     for cluster in cluster_set:
         if cluster:
@@ -139,7 +128,8 @@ def writeHTMLstart(outputIndex, webpage_name, cluster_set, address, measure,
     cssAddress = '<link rel="stylesheet" href="css/leaflet.css">'
     jsAddress = '<script src="js/leaflet.js"></script>'
     cssAddress += """
-        <link rel="stylesheet" href="css/L.Control.Layers.Tree.css">"""
+        <link rel="stylesheet" href="css/L.Control.Layers.Tree.css">
+        <link rel="stylesheet" href="legend/legend.css">"""
     jsAddress += """
         <script src="js/L.Control.Layers.Tree.min.js"></script>"""
     if locate:
@@ -165,6 +155,12 @@ def writeHTMLstart(outputIndex, webpage_name, cluster_set, address, measure,
     if useOSMB:
         jsAddress += """
         <script src="js/OSMBuildings-Leaflet.js"></script>"""
+    if useClusterIndex:
+        jsAddress += """
+        <script src="js/qgis2web_clusters.js"></script>"""
+    if useCOG:
+        jsAddress += """
+        <script src="js/qgis2web_cog.js"></script>"""
     extracss = '<link rel="stylesheet" href="css/qgis2web.css">'
     extracss += """
         <link rel="stylesheet" href="css/fontawesome-all.min.css">"""
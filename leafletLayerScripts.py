@@ -7,7 +7,6 @@ from qgis.core import (QgsSingleSymbolRenderer,
                        QgsRuleBasedRenderer,
                        QgsNullSymbolRenderer,
                        QgsHeatmapRenderer,
-                       QgsSymbolLayerUtils,
                        QgsDataSourceUri,
                        QgsRenderContext,
                        QgsWkbTypes)
@@ -17,6 +16,8 @@ from qgis2web.leafletScriptStrings import (popupScript,
                                            pointToLayerFunction,
                                            wfsScript,
                                            clusterScript,
+                                           clusterIndexScript,
+                                           heatmapGridScript,
                                            iconLegend)
 try:
     from vector_tiles_reader.plugin.util.tile_json import TileJSON
@@ -25,8 +26,10 @@ except ImportError:
     vt_enabled = False
 
 from qgis2web.exp2js import compile_to_file
+from qgis2web.legendSprite import legendIcon
+from qgis2web.markerStore import MarkerStore
 from qgis2web.utils import (is25d, safeName, handleHiddenField, BLEND_MODES,
-                            TYPE_MAP)
+                            TYPE_MAP, layerFeatures, symbolPreviewImage)
 
 
 def writeVectorLayer(layer, safeLayerName, usedFields, highlight,
@@ -35,11 +38,14 @@ def writeVectorLayer(layer, safeLayerName, usedFields, highlight,
                      canvas, zIndex,
                      restrictToExtent, extent, feedback, labelCode, vtLabels,
                      vtStyles, useMultiStyle, useHeat, useVT, useShapes,
-                     useOSMB):
+                     useOSMB, clusterIndex=False, heatmapGrid=False,
+                     legendSprite=None, markerStore=None, baked=False):
     vts = layer.customProperty("VectorTilesReader/vector_tile_url")
     feedback.showFeedback("Writing %s as JSON..." % layer.name())
     zIndex = zIndex + 400
-    markerFolder = os.path.join(outputProjectFileName, "markers")
+    if markerStore is None:
+        markerStore = MarkerStore(os.path.join(outputProjectFileName,
+                                               "markers"), "markers/")
     labeltext, vtLabels = getLabels(layer, safeLayerName,
                                     outputProjectFileName, vts, vtLabels,
                                     feedback)
@@ -61,7 +67,7 @@ def writeVectorLayer(layer, safeLayerName, usedFields, highlight,
         renderContext = QgsRenderContext.fromMapSettings(canvas.mapSettings())
         fields = layer.fields()
         renderer.startRender(renderContext, fields)
-        for feat in layer.getFeatures():
+        for feat in layerFeatures(layer):
             if isinstance(renderer, QgsCategorizedSymbolRenderer):
                 classAttribute = renderer.classAttribute()
                 attrValue = feat.attribute(classAttribute)
@@ -88,7 +94,7 @@ def writeVectorLayer(layer, safeLayerName, usedFields, highlight,
     elif isinstance(renderer, QgsHeatmapRenderer):
         useHeat = True
         new_obj = heatmapLayer(layer, safeLayerName, interactive, renderer,
-                               feedback)
+                               feedback, heatmapGrid)
     elif vts is not None:
         useVT = True
         if vts in vtStyles:
@@ -101,7 +107,7 @@ def writeVectorLayer(layer, safeLayerName, usedFields, highlight,
         vtStyle = vtStyles[vts]
         (style, markerType, useMapUnits,
          useShapes) = getLayerStyle(layer, safeLayerName, interactive,
-                                    markerFolder, outputProjectFileName,
+                                    markerStore, outputProjectFileName,
                                     useShapes, feedback)
         style = style.replace("feature.properties['", "feature.['")
         if layer.name() not in vtStyle:
@@ -123,9 +129,9 @@ def writeVectorLayer(layer, safeLayerName, usedFields, highlight,
     else:
         (style, markerType, useMapUnits,
          useShapes) = getLayerStyle(layer, safeLayerName, interactive,
-                                    markerFolder, outputProjectFileName,
-                                    useShapes, feedback)
-        (legend, symbol) = getLegend(layer, renderer, outputProjectFileName,
+                                    markerStore, outputProjectFileName,
+                                    useShapes, feedback, baked)
+        (legend, symbol) = getLegend(layer, renderer, legendSprite,
                                      safeLayerName, feedback)
         legends[safeLayerName] = legend
         slCount = 0
@@ -135,7 +141,8 @@ def writeVectorLayer(layer, safeLayerName, usedFields, highlight,
          useMultiStyle) = getLayer(layer, renderer, safeLayerName, interactive,
                                    outputProjectFileName, usedFields, legends,
                                    cluster, json, wfsLayers, markerType,
-                                   useMultiStyle, slCount, feedback)
+                                   useMultiStyle, slCount, feedback,
+                                   clusterIndex)
     blend = BLEND_MODES[layer.blendMode()]
     if vts is None:
         new_obj = u"""{style}
@@ -357,14 +364,12 @@ def getPopups(layer, safeLayerName, highlight, popupsOnHover, popup, vts,
     return new_pop, popFuncs
 
 
-def getLegend(layer, renderer, outputProjectFileName, safeLayerName, feedback):
+def getLegend(layer, renderer, legendSprite, safeLayerName, feedback):
     if isinstance(renderer, QgsSingleSymbolRenderer):
         symbol = renderer.symbol()
-        legendIcon = QgsSymbolLayerUtils.symbolPreviewPixmap(symbol,
-                                                             QSize(16, 16))
-        legendIcon.save(os.path.join(outputProjectFileName, "legend",
-                                     safeLayerName + ".png"))
-        legend = ('<img src="legend/' + safeLayerName + '.png" /> ')
+        legendSprite.add(safeLayerName,
+                         symbolPreviewImage(symbol, QSize(16, 16)))
+        legend = legendIcon(safeLayerName) + ' '
         legend += layer.name().replace("'", "\\'")
     elif isinstance(renderer, QgsNullSymbolRenderer):
         legend = layer.name().replace("'", "\\'")
@@ -385,7 +390,7 @@ def getLegend(layer, renderer, outputProjectFileName, safeLayerName, feedback):
         legend += "<table>"
         for cnt, c in enumerate(classes):
             symbol = c.symbol()
-            legend = iconLegend(symbol, c, outputProjectFileName,
+            legend = iconLegend(symbol, c, legendSprite,
                                 safeLayerName, legend, cnt)
         legend += "</table>"
         symbol = classes[0].symbol()
@@ -394,14 +399,15 @@ def getLegend(layer, renderer, outputProjectFileName, safeLayerName, feedback):
 
 def getLayer(layer, renderer, safeLayerName, interactive,
              outputProjectFileName, usedFields, legends, cluster, json,
-             wfsLayers, markerType, useMultiStyle, slCount, feedback):
+             wfsLayers, markerType, useMultiStyle, slCount, feedback,
+             clusterIndex=False):
     if layer.geometryType() == QgsWkbTypes.PointGeometry:
         (new_obj,
          wfsLayers,
          useMultiStyle) = pointLayer(layer, safeLayerName, interactive,
                                      cluster, usedFields, json, wfsLayers,
                                      markerType, slCount, useMultiStyle,
-                                     feedback)
+                                     feedback, clusterIndex)
     else:
         (new_obj, wfsLayers,
          useMultiStyle) = nonPointLayer(layer, safeLayerName, interactive,
@@ -411,7 +417,8 @@ def getLayer(layer, renderer, safeLayerName, interactive,
 
 
 def pointLayer(layer, safeLayerName, interactive, cluster, usedFields, json,
-               wfsLayers, markerType, slCount, useMultiStyle, feedback):
+               wfsLayers, markerType, slCount, useMultiStyle, feedback,
+               clusterIndex=False):
     if layer.providerType() == 'WFS' and json is False:
         p2lf = ""
         if slCount < 1:
@@ -433,8 +440,10 @@ def pointLayer(layer, safeLayerName, interactive, cluster, usedFields, json,
         (new_obj,
          useMultiStyle) = buildPointJSON(slCount, safeLayerName, usedFields,
                                          interactive, markerType, layerAttr,
-                                         useMultiStyle)
-        if cluster:
+                                         useMultiStyle, clusterIndex)
+        if cluster and clusterIndex:
+            new_obj += clusterIndexScript(safeLayerName)
+        elif cluster:
             new_obj += clusterScript(safeLayerName)
     return new_obj, wfsLayers, useMultiStyle
 
@@ -458,7 +467,8 @@ def nonPointLayer(layer, safeLayerName, interactive, usedFields, json,
     return new_obj, wfsLayers, useMultiStyle
 
 
-def heatmapLayer(layer, safeLayerName, interactive, renderer, feedback):
+def heatmapLayer(layer, safeLayerName, interactive, renderer, feedback,
+                 heatmapGrid=False):
     attrText = layer.attribution()
     if attrText != "":
         attrUrl = layer.attributionUrl()
@@ -481,6 +491,9 @@ def heatmapLayer(layer, safeLayerName, interactive, renderer, feedback):
     for stop in hmStops:
         hmRamp += str(stop.offset) + ": '" + stop.color.name() + "', "
     hmRamp += "1: '" + hmEnd + "'}"
+    if heatmapGrid:
+        return heatmapGridScript(safeLayerName, layerAttr, interactive,
+                                 hmRadius, hmRamp)
     new_obj = """
         var %(sln)s_hm = geoJson2heat(json_%(sln)s,
                                       '%(hmWeight)s');
@@ -518,7 +531,7 @@ def VTLayer(json_url):
 
 
 def buildPointJSON(slCount, sln, usedFields, interactive, markerType, layerAttr,
-                   useMultiStyle):
+                   useMultiStyle, clusterIndex=False):
     multiStyle = ""
     if slCount > 1:
         multiStyle = ".multiStyle"
@@ -541,7 +554,14 @@ def buildPointJSON(slCount, sln, usedFields, interactive, markerType, layerAttr,
                 var context = {{
                     feature: feature,
                     variables: {{}}
-                }};
+                }};"""
+            if clusterIndex:
+                pointJSON += """
+                if (feature.properties.cluster) {{
+                    return %s;
+                }}""" % ("qgis2webClusters.leafletMarker(feature, latlng)"
+                         if sl == 0 else "L.layerGroup()")
+            pointJSON += """
                 return L.{markerType}(latlng, """
             pointJSON += """style_{sln}_%s(feature));
             }},""" % sl
@@ -551,7 +571,13 @@ def buildPointJSON(slCount, sln, usedFields, interactive, markerType, layerAttr,
                 var context = {{
                     feature: feature,
                     variables: {{}}
-                }};
+                }};"""
+        if clusterIndex:
+            pointJSON += """
+                if (feature.properties.cluster) {{
+                    return qgis2webClusters.leafletMarker(feature, latlng);
+                }}"""
+        pointJSON += """
                 return L.{markerType}(latlng, style_{sln}_0(feature));
             }},"""
     if slCount > 1:
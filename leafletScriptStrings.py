@@ -1,5 +1,4 @@
 import re
-import os
 import traceback
 from urllib.parse import parse_qs
 from qgis.PyQt.QtCore import QSize, QDateTime
@@ -7,12 +6,12 @@ from qgis.core import (QgsProject,
                        QgsCoordinateReferenceSystem,
                        QgsCoordinateTransform,
                        QgsMapLayer,
-                       QgsSymbolLayerUtils,
                        QgsSvgMarkerSymbolLayer,
                        QgsMessageLog,
                        Qgis,
                        QgsWkbTypes)
-from qgis2web.utils import scaleToZoom, safeName
+from qgis2web.utils import scaleToZoom, safeName, symbolPreviewImage
+from qgis2web.legendSprite import legendIcon
 
 
 def jsonScript(layer):
@@ -329,19 +328,16 @@ def popupScript(safeLayerName, popFuncs, highlight, popupsOnHover):
     return popup
 
 
-def iconLegend(symbol, catr, outputProjectFileName, layerName, catLegend, cnt):
+def iconLegend(symbol, catr, legendSprite, layerName, catLegend, cnt):
     try:
         iconSize = int((symbol.size() * 4) + 5)
     except Exception:
         iconSize = 16
-    legendIcon = QgsSymbolLayerUtils.symbolPreviewPixmap(symbol,
-                                                         QSize(iconSize,
-                                                               iconSize))
+    icon = symbolPreviewImage(symbol, QSize(iconSize, iconSize))
     safeLabel = re.sub(r'[\W_]+', '', catr.label()) + str(cnt)
-    legendIcon.save(os.path.join(outputProjectFileName, "legend",
-                                 layerName + "_" + safeLabel + ".png"))
-    catLegend += """<tr><td style="text-align: center;"><img src="legend/"""
-    catLegend += layerName + "_" + safeLabel + """.png" /></td><td>"""
+    legendSprite.add(layerName + "_" + safeLabel, icon)
+    catLegend += """<tr><td style="text-align: center;">"""
+    catLegend += legendIcon(layerName + "_" + safeLabel) + """</td><td>"""
     catLegend += catr.label().replace("'", "\\'") + "</td></tr>"
     return catLegend
 
@@ -388,6 +384,95 @@ def clusterScript(safeLayerName):
     return cluster
 
 
+def clusterIndexScript(safeLayerName):
+    cluster = """
+        var cluster_{safeLayerName} = layer_{safeLayerName};
+        function loadClusters_{safeLayerName}() {{
+            var bounds = map.getBounds();
+            var changed = qgis2webClusters.load(
+                '{safeLayerName}', map.getZoom(),
+                [bounds.getWest(), bounds.getSouth(),
+                 bounds.getEast(), bounds.getNorth()],
+                function(json) {{
+                    layer_{safeLayerName}.addData(json);
+                }});
+            if (changed) {{
+                layer_{safeLayerName}.clearLayers();
+            }}
+        }}
+        map.on('moveend', loadClusters_{safeLayerName});
+        loadClusters_{safeLayerName}();
+""".format(safeLayerName=safeLayerName)
+    return cluster
+
+
+def heatmapGridScript(safeLayerName, layerAttr, interactive, hmRadius,
+                      hmRamp):
+    heatmap = """
+        var layer_%(sln)s = new L.heatLayer([], {
+            attribution: '%(attr)s',
+            interactive: %(int)s,
+            radius: %(hmRadius)d,
+            max: 1,
+            minOpacity: 1,
+            gradient: %(hmRamp)s});
+        var cells_%(sln)s = [];
+        function loadHeatmap_%(sln)s() {
+            var bounds = map.getBounds();
+            var changed = qgis2webClusters.load(
+                '%(sln)s', map.getZoom(),
+                [bounds.getWest(), bounds.getSouth(),
+                 bounds.getEast(), bounds.getNorth()],
+                function(json) {
+                    var cells = json.features.map(function(feature) {
+                        return [feature.geometry.coordinates[1],
+                                feature.geometry.coordinates[0],
+                                feature.properties.weight];
+                    });
+                    cells_%(sln)s = cells_%(sln)s.concat(cells);
+                    layer_%(sln)s.setLatLngs(cells_%(sln)s);
+                });
+            if (changed) {
+                layer_%(sln)s.setOptions({
+                    max: qgis2webClusters.maxWeight('%(sln)s')});
+                cells_%(sln)s = [];
+                layer_%(sln)s.setLatLngs(cells_%(sln)s);
+            }
+        }
+        map.on('moveend', loadHeatmap_%(sln)s);
+        loadHeatmap_%(sln)s();
+        """ % {"sln": safeLayerName, "attr": layerAttr,
+               "int": str(interactive).lower(), "hmRadius": hmRadius,
+               "hmRamp": hmRamp}
+    return heatmap
+
+
+def rasterTilesScript(safeLayerName, zIndex, grid):
+    raster = """
+        map.createPane('pane_{sln}');
+        map.getPane('pane_{sln}').style.zIndex = {zIndex};
+        var layer_{sln} = L.tileLayer('data/{sln}/{{z}}/{{x}}/{{y}}.png', {{
+            pane: 'pane_{sln}',
+            minNativeZoom: {minZoom},
+            maxNativeZoom: {maxZoom}
+        }});""".format(sln=safeLayerName, zIndex=zIndex,
+                       minZoom=grid["minZoom"], maxZoom=grid["maxZoom"])
+    return raster
+
+
+def rasterCOGScript(safeLayerName, zIndex, raster):
+    raster = """
+        map.createPane('pane_{sln}');
+        map.getPane('pane_{sln}').style.zIndex = {zIndex};
+        var layer_{sln} = qgis2webCOG.leafletLayer('data/{cog}', {{
+            pane: 'pane_{sln}',
+            minNativeZoom: {minZoom},
+            maxNativeZoom: {maxZoom}
+        }});""".format(sln=safeLayerName, zIndex=zIndex, cog=raster["cog"],
+                       minZoom=raster["minZoom"], maxZoom=raster["maxZoom"])
+    return raster
+
+
 def wmsScript(layer, safeLayerName, useWMS, useWMTS, identify, minZoom,
               maxZoom, count):
     d = parse_qs(layer.source())
@@ -478,9 +563,19 @@ def wmsScript(layer, safeLayerName, useWMS, useWMTS, identify, minZoom,
     return wms, useWMS, useWMTS
 
 
-def rasterScript(layer, safeLayerName, zIndex):
+def rasterScript(layer, safeLayerName, zIndex, raster=None):
     zIndex = zIndex + 400
-    out_raster = 'data/' + safeLayerName + '.png'
+    if raster is None:
+        raster = {"image": safeLayerName + ".png"}
+    if "cog" in raster:
+        return rasterCOGScript(safeLayerName, zIndex, raster)
+    if "image" not in raster:
+        return rasterTilesScript(safeLayerName, zIndex, raster)
+    if raster["image"] is None:
+        # the image could not be exported, the layer is left empty
+        return """
+        var layer_{sln} = L.layerGroup();""".format(sln=safeLayerName)
+    out_raster = 'data/' + raster["image"]
     pt2 = layer.extent()
     crsSrc = layer.crs()
     crsDest = QgsCoordinateReferenceSystem(4326)
@@ -11,11 +11,14 @@ from qgis.core import (QgsSingleSymbolRenderer,
                        QgsLinePatternFillSymbolLayer,
                        QgsSvgMarkerSymbolLayer)
 from qgis2web.exp2js import compile_to_file
-from qgis2web.utils import getRGBAColor, handleHiddenField
+from qgis2web.utils import (getRGBAColor, handleHiddenField,
+                            getCategoryLookup, getRangeLookup)
+from qgis2web.markerStore import colorizeSvg
+from qgis2web.bakedSymbology import BAKED_CLASS, bakedRotation
 
 
-def getLayerStyle(layer, sln, interactivity, markerFolder,
-                  outputProjectFilename, useShapes, feedback):
+def getLayerStyle(layer, sln, interactivity, markerStore,
+                  outputProjectFilename, useShapes, feedback, baked=False):
     markerType = None
     useMapUnits = False
     renderer = layer.renderer()
@@ -38,9 +41,9 @@ def getLayerStyle(layer, sln, interactivity, markerFolder,
             slCount = 1
         for sl in range(slCount):
             (styleCode, markerType, useMapUnits,
-             pattern) = getSymbolAsStyle(symbol, markerFolder,
+             pattern) = getSymbolAsStyle(symbol, markerStore,
                                          layer_alpha, interactivity, sln, sl,
-                                         useMapUnits, feedback)
+                                         useMapUnits, feedback, baked)
             style += pattern
             style += """
         function style_%s_%s() {
@@ -53,23 +56,27 @@ def getLayerStyle(layer, sln, interactivity, markerFolder,
         patterns = ""
         if slCount < 1:
             slCount = 1
+        values = []
+        for cat in renderer.categories():
+            if (cat.value() is not None and cat.value() != ""):
+                values.append(str(cat.value()))
+            else:
+                values.append(None)
+        style += getCategoryLookup("category_" + sln, values)
+        style += getFeatureClass(sln, "category", """category_%s(
+                    String(feature.properties['%s']))""" % (sln, classAttr))
         for sl in range(slCount):
             style += """
         function style_%s_%s(feature) {
-            switch(String(feature.properties['%s'])) {""" % (sln, sl,
-                                                             classAttr)
-            for cat in renderer.categories():
+            switch(featureCategory_%s(feature)) {""" % (sln, sl, sln)
+            for cnt, cat in enumerate(renderer.categories()):
                 (styleCode, markerType, useMapUnits,
-                 pattern) = getSymbolAsStyle(cat.symbol(), markerFolder,
+                 pattern) = getSymbolAsStyle(cat.symbol(), markerStore,
                                              layer_alpha, interactivity, sln,
-                                             sl, useMapUnits, feedback)
+                                             sl, useMapUnits, feedback, baked)
                 patterns += pattern
-                if (cat.value() is not None and cat.value() != ""):
-                    style += """
-                case '%s':""" % str(cat.value()).replace("'", "\\'")
-                else:
-                    style += """
-                default:"""
+                style += """
+                case %d:""" % cnt
                 style += """
                     return %s
                     break;""" % styleCode
@@ -83,24 +90,27 @@ def getLayerStyle(layer, sln, interactivity, markerFolder,
         patterns = ""
         if slCount < 1:
             slCount = 1
+        style += getRangeLookup("range_" + sln,
+                                [(ran.lowerValue(), ran.upperValue())
+                                 for ran in renderer.ranges()])
+        style += getFeatureClass(sln, "range", "range_%s(feature.properties['%s'])"
+                                 % (sln, classAttr))
         for sl in range(slCount):
             style += """
-        function style_%s_%s(feature) {""" % (sln, sl)
-            for ran in renderer.ranges():
+        function style_%s_%s(feature) {
+            switch(featureRange_%s(feature)) {""" % (sln, sl, sln)
+            for cnt, ran in enumerate(renderer.ranges()):
                 (styleCode, markerType, useMapUnits,
-                 pattern) = getSymbolAsStyle(ran.symbol(), markerFolder,
+                 pattern) = getSymbolAsStyle(ran.symbol(), markerStore,
                                              layer_alpha, interactivity, sln,
-                                             sl, useMapUnits, feedback)
+                                             sl, useMapUnits, feedback, baked)
                 patterns += pattern
                 style += """
-            if (feature.properties['%(a)s'] >= %(l)f """
-                style += """&& feature.properties['%(a)s'] <= %(u)f ) {
-                return %(s)s
-            }"""
-                style = style % {"a": classAttr, "l": ran.lowerValue(),
-                                 "u": ran.upperValue(),
-                                 "s": styleCode}
+                case %d:
+                    return %s
+                    break;""" % (cnt, styleCode)
             style = patterns + style + """
+            }
         }"""
     elif isinstance(renderer, QgsRuleBasedRenderer):
         symbol = renderer.rootRule().children()[0].symbol()
@@ -123,6 +133,17 @@ def getLayerStyle(layer, sln, interactivity, markerFolder,
             }}
         }}
         """.format(sl=sl)
+            if baked:
+                # the rule of each feature was found by QGIS at export
+                template = """
+        %s
+        function style_%s_{sl}(feature) {{
+            switch(feature.properties['{cls}']) {{%s
+                default:
+                    return %s;
+            }}
+        }}
+        """.format(sl=sl, cls=BAKED_CLASS)
             elsejs = "{fill: false, stroke: false}"
             js = ""
             root_rule = renderer.rootRule()
@@ -133,13 +154,18 @@ def getLayerStyle(layer, sln, interactivity, markerFolder,
             for count, rule in enumerate(rules):
                 if rule.symbol().symbolLayer(sl) is not None:
                     (styleCode, markerType, useMapUnits,
-                     pattern) = getSymbolAsStyle(rule.symbol(), markerFolder,
+                     pattern) = getSymbolAsStyle(rule.symbol(), markerStore,
                                                  layer_alpha, interactivity,
                                                  sln, sl, useMapUnits,
-                                                 feedback)
+                                                 feedback, baked)
                     patterns += pattern
                     name = "".join((sln, "rule", str(count)))
                     exp = rule.filterExpression()
+                    if baked:
+                        js += """
+                case %d:
+                    return %s;""" % (count, styleCode)
+                        continue
                     if rule.isElse():
                         elsejs = styleCode
                         continue
@@ -151,7 +177,7 @@ def getLayerStyle(layer, sln, interactivity, markerFolder,
                 """ % (ifelse, name, styleCode)
                     js = js.strip()
                     ifelse = "else if"
-            if js == "":
+            if js == "" and not baked:
                 js = """
                 if (false) {}"""
             style += template % (patterns, sln, js, elsejs)
@@ -166,8 +192,23 @@ def getLayerStyle(layer, sln, interactivity, markerFolder,
     return style, markerType, useMapUnits, useShapes
 
 
-def getSymbolAsStyle(symbol, markerFolder, layer_transparency, interactivity,
-                     sln, sl, useMapUnits, feedback):
+def getFeatureClass(sln, kind, lookup):
+    """
+    Returns a function giving the class of a feature, looked up on its first
+    use and kept on the feature for the functions of every symbol layer.
+    """
+    return """
+        function feature%(Kind)s_%(sln)s(feature) {
+            if (feature.%(kind)s_%(sln)s === undefined) {
+                feature.%(kind)s_%(sln)s = %(lookup)s;
+            }
+            return feature.%(kind)s_%(sln)s;
+        }""" % {"Kind": kind.capitalize(), "kind": kind, "sln": sln,
+                "lookup": lookup}
+
+
+def getSymbolAsStyle(symbol, markerStore, layer_transparency, interactivity,
+                     sln, sl, useMapUnits, feedback, baked=False):
     interactive = str(interactivity).lower()
     markerType = None
     pattern = ""
@@ -214,33 +255,24 @@ def getSymbolAsStyle(symbol, markerFolder, layer_transparency, interactivity,
         svgSize = sl.size() * 3.8
         if symbol.dataDefinedAngle().isActive():
             if symbol.dataDefinedAngle().useExpression():
-                rot = "0"
+                rot = bakedRotation(symbol, baked, "Leaflet") or "0"
             else:
                 rot = "feature.get("
                 rot += symbol.dataDefinedAngle().expressionOrField()
                 rot += ") * 0.0174533"
         else:
             rot = str(sl.angle() * 0.0174533)
+        # store a colorized svg, once per distinct content,
+        # replacing "param(...)" with actual values from QGIS
+        pColor = getRGBAColor(props["color"], alpha).strip("'")
+        pOutline = getRGBAColor(props["outline_color"], alpha).strip("'")
+        s = colorizeSvg(sl.path(), pColor, pOutline, props["outline_width"])
+        path = markerStore.addSvg(s, svgSize, svgSize, svgSize)[0]
         style = """
         rotationAngle: %s,
         rotationOrigin: 'center center',
-        icon: %s""" % (rot, getIcon("markers/" + sln + ".svg", svgSize))
+        icon: %s""" % (rot, getIcon(path, svgSize))
         markerType = "marker"
-
-        # save a colorized svg in the markers folder
-        # replacing "param(...)" with actual values from QGIS
-        # and renaming to safe layer name
-        pColor = getRGBAColor(props["color"], alpha).strip("'")
-        pOutline = getRGBAColor(props["outline_color"], alpha).strip("'")
-        with open(sl.path()) as f:
-            s = f.read()
-            s = s.replace('param(fill)', pColor)
-            s = s.replace('param(fill-opacity)', '1')
-            s = s.replace('param(outline)', pOutline)
-            s = s.replace('param(outline-width)', str(float(props["outline_width"]) * 80))
-            s = s.replace('param(outline-opacity)', '1')
-        with open(os.path.join(markerFolder, sln + ".svg"), 'w') as f:
-            f.write(s)
     elif isinstance(sl, QgsSimpleLineSymbolLayer):
         color = getRGBAColor(props["line_color"], alpha)
         line_width = props["line_width"]
@@ -30,16 +30,18 @@ from qgis.core import (Qgis,
                        QgsWkbTypes,
                        QgsMessageLog)
 import traceback
-from qgis.PyQt.QtCore import Qt, QObject
-from qgis.PyQt.QtGui import QCursor
-from qgis.PyQt.QtWidgets import QApplication
+from qgis.PyQt.QtCore import QObject
 import os
 from datetime import datetime
 import re
 from qgis2web.leafletFileScripts import (writeFoldersAndFiles,
                                          writeCSS,
+                                         writeLibraries,
+                                         writeCoreLibraries,
                                          writeHTMLstart)
 from qgis2web.leafletLayerScripts import writeVectorLayer
+from qgis2web.legendSprite import LegendSprite
+from qgis2web.markerStore import MarkerStore
 from qgis2web.leafletScriptStrings import (jsonScript,
                                            scaleDependentLabelScript,
                                            mapScript,
@@ -63,7 +65,18 @@ from qgis2web.leafletScriptStrings import (jsonScript,
                                            addMeasureControl,
                                            addZoomControl)
 from qgis2web.utils import (ALL_ATTRIBUTES, exportVector,
-                            exportRaster, safeName, returnFilterValues)
+                            exportRaster, exportRasterTiles,
+                            exportRasterCOG, safeName,
+                            returnFilterValues, checkCancelled,
+                            runOnMainThread, filesWritten, exportState,
+                            reportStage)
+from qgis2web.exportReport import ExportReport
+from qgis2web.pointClusters import (hasClusterIndex,
+                                    hasHeatmapGrid,
+                                    clusterZoomRange)
+from qgis2web.bakedSymbology import hasBakedSymbology
+from qgis2web.exp2js import write_expressions, discard_expressions
+from qgis2web.assetBundler import bundlePage
 from qgis2web.writer import (Writer,
                              WriterResult,
                              translator)
@@ -91,24 +104,34 @@ class LeafletWriter(Writer):
         if not feedback:
             feedback = Feedback()
         feedback.showFeedback('Creating Leaflet map...')
-        self.preview_file = self.writeLeaflet(
-            iface,
-            feedback,
-            layer_list=self.layers,
-            groups=self.groups,
-            popup=self.popup,
-            visible=self.visible,
-            interactive=self.interactive,
-            json=self.json,
-            cluster=self.cluster,
-            getFeatureInfo=self.getFeatureInfo,
-            baseMap = self.baseMap,
-            params=self.params,
-            folder=dest_folder,
-            exportRelatedList=self.exportRelated) # Pass exportRelated list here
+        report = exportState.report = ExportReport(self.params)
+        try:
+            # what no other stage times: the page, its scripts and setup
+            with report.stage("html"):
+                self.preview_file = self.writeLeaflet(
+                    iface,
+                    feedback,
+                    layer_list=self.layers,
+                    groups=self.groups,
+                    popup=self.popup,
+                    visible=self.visible,
+                    interactive=self.interactive,
+                    json=self.json,
+                    cluster=self.cluster,
+                    getFeatureInfo=self.getFeatureInfo,
+                    baseMap=self.baseMap,
+                    params=self.params,
+                    folder=dest_folder,
+                    exportRelatedList=self.exportRelated)
+        finally:
+            exportState.report = None
+            discard_expressions()
         result = WriterResult()
         result.index_file = self.preview_file
         result.folder = os.path.dirname(self.preview_file)
+        report.finish(result.folder)
+        result.report = report
+        feedback.showFeedback(report.summaryHtml())
         for dirpath, dirnames, filenames in os.walk(result.folder):
             result.files.extend([os.path.join(dirpath, f) for f in filenames])
         return result
@@ -120,8 +143,11 @@ class LeafletWriter(Writer):
             # Changed layersData parameter
             json, getFeatureInfo, baseMap, params, popup, exportRelatedList):
         outputProjectFileName = folder
-        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
         legends = {}
+        legendSprite = LegendSprite()
+        markerStore = MarkerStore(os.path.join(outputProjectFileName,
+                                               "markers"), "markers/",
+                                  params["Data export"]["SVG markers"])
         mapUnitLayers = []
         canvas = iface.mapCanvas()
         project = QgsProject.instance()
@@ -148,7 +174,6 @@ class LeafletWriter(Writer):
         measure = params["Appearance"]["Measure tool"]
         highlight = params["Appearance"]["Highlight on hover"]
         layerSearch = params["Appearance"]["Layer search"]
-        layerFilter = params["Appearance"]["Attribute filter"]
         popupsOnHover = params["Appearance"]["Show popups on hover"]
         template = params["Appearance"]["Template"]
         widgetAccent = params["Appearance"]["Widget Icon"]
@@ -156,17 +181,33 @@ class LeafletWriter(Writer):
         layersList = params["Appearance"]["Layers list"]
 
         usedFields = [ALL_ATTRIBUTES] * len(popup)
+        clusterIndex = [hasClusterIndex(layer, clst, jsonEncode, params)
+                        for layer, clst, jsonEncode in zip(layer_list, cluster,
+                                                           json)]
+        heatmapGrid = [hasHeatmapGrid(layer, jsonEncode, params)
+                       for layer, jsonEncode in zip(layer_list, json)]
+        bakedSymbology = [hasBakedSymbology(layer, jsonEncode, params)
+                          for layer, jsonEncode in zip(layer_list, json)]
+        clusterZooms = clusterZoomRange(params)
+        # Leaflet only shows tiles on the default Web Mercator grid
+        rasterTiles = (params["Data export"]["Raster export"] == "XYZ tiles"
+                       and not matchCRS)
+        rasterCOG = (params["Data export"]["Raster export"] ==
+                     "Cloud-Optimized GeoTIFF" and not matchCRS)
+        rasterExports = {}
+        rasterQuality = int(params["Data export"]["Raster quality"])
 
-        QgsApplication.initQgis()
+        runOnMainThread(QgsApplication.initQgis)
 
         dataStore, cssStore = writeFoldersAndFiles(pluginDir, feedback,
-                                                   outputProjectFileName,
-                                                   cluster, measure,
-                                                   matchCRS, layerSearch,
-                                                   layerFilter, canvas,
-                                                   addressSearch, locate, layersList)
-        writeCSS(cssStore, mapSettings.backgroundColor().name(), feedback,
-                 widgetAccent, widgetBackground, layersList)
+                                                   outputProjectFileName)
+        with reportStage("styles"):
+            writeCSS(cssStore, mapSettings.backgroundColor().name(), feedback,
+                     widgetAccent, widgetBackground, layersList)
+        with reportStage("libraries"):
+            coreManifest = writeCoreLibraries(feedback,
+                                              outputProjectFileName)
+        filesWritten(outputProjectFileName)
 
         wfsLayers = ""
         labelCode = ""
@@ -189,31 +230,62 @@ class LeafletWriter(Writer):
         lyrCount = 0
         for layer, jsonEncode, eachPopup, clst, exportRelated in zip(layer_list, json,
                                                       popup, cluster, exportRelatedList):
+            checkCancelled()
+            feedback.setProgress(int(100 * lyrCount / len(layer_list)))
             rawLayerName = layer.name()
             safeLayerName = safeName(rawLayerName) + "_" + str(lyrCount)
             vts = layer.customProperty("VectorTilesReader/vector_tile_url")
-            if layer.providerType() != 'WFS' or jsonEncode is True:
-                if layer.type() == QgsMapLayer.VectorLayer and vts is None:
-                    feedback.showFeedback('Exporting %s to JSON...' %
-                                          layer.name())
-                    exportVector(layer, safeLayerName, dataStore,
-                                 restrictToExtent, iface, extent, precision,
-                                 exp_crs, minify, exportRelated) # Pass exportRelated flag
-                    jsons += jsonScript(safeLayerName)
-                    scaleDependentLabels = \
-                        scaleDependentLabelScript(layer, safeLayerName)
-                    labelVisibility += scaleDependentLabels
-                    feedback.completeStep()
+            with reportStage("data", safeLayerName, dataStore):
+                if layer.providerType() != 'WFS' or jsonEncode is True:
+                    if (layer.type() == QgsMapLayer.VectorLayer and
+                            vts is None):
+                        feedback.showFeedback('Exporting %s to JSON...' %
+                                              layer.name())
+                        exportVector(layer, safeLayerName, dataStore,
+                                     restrictToExtent, iface, extent,
+                                     precision, exp_crs, minify,
+                                     exportRelated,
+                                     clusterZooms if clusterIndex[lyrCount]
+                                     else None,
+                                     clusterZooms if heatmapGrid[lyrCount]
+                                     else None, bakedSymbology[lyrCount])
+                        jsons += jsonScript(safeLayerName)
+                        scaleDependentLabels = \
+                            scaleDependentLabelScript(layer, safeLayerName)
+                        labelVisibility += scaleDependentLabels
+                        feedback.completeStep()
 
-                elif layer.type() == QgsMapLayer.RasterLayer:
-                    if layer.dataProvider().name() != "wms":
-                        layersFolder = os.path.join(outputProjectFileName,
-                                                    "data")
-                        exportRaster(layer, lyrCount, layersFolder,
-                                     feedback, iface, matchCRS)
+                    elif layer.type() == QgsMapLayer.RasterLayer:
+                        if layer.dataProvider().name() != "wms":
+                            layersFolder = os.path.join(
+                                outputProjectFileName, "data")
+                            grid = None
+                            if rasterTiles:
+                                grid = exportRasterTiles(layer, lyrCount,
+                                                         layersFolder,
+                                                         feedback, iface,
+                                                         False,
+                                                         int(minZoom),
+                                                         int(maxZoom))
+                            elif rasterCOG:
+                                grid = exportRasterCOG(layer, lyrCount,
+                                                       layersFolder, feedback,
+                                                       int(maxZoom),
+                                                       rasterQuality)
+                            if grid is None:
+                                image = exportRaster(layer, lyrCount,
+                                                     layersFolder, feedback,
+                                                     iface, matchCRS,
+                                                     int(maxZoom),
+                                                     rasterQuality)
+                                rasterExports[safeLayerName] = {
+                                    "image": image}
+                            else:
+                                rasterExports[safeLayerName] = grid
             if layer.hasScaleBasedVisibility():
                 scaleDependentLayers += scaleDependentLayerScript(
                     layer, safeLayerName, clst)
+            filesWritten(outputProjectFileName)
             lyrCount += 1
         if scaleDependentLayers != "":
             scaleDependentLayers = scaleDependentScript(scaleDependentLayers)
@@ -261,33 +333,33 @@ class LeafletWriter(Writer):
         new_src += extentCode
 
         for count, layer in enumerate(layer_list):
+            checkCancelled()
             rawLayerName = layer.name()
             safeLayerName = safeName(rawLayerName) + "_" + str(count)
             if (layer.type() == QgsMapLayer.VectorLayer and
                     layer.wkbType() != QgsWkbTypes.NoGeometry):
-                (new_src,
-                 legends,
-                 wfsLayers,
-                 labelCode,
-                 vtLabels,
-                 vtStyles,
-                 useMapUnits,
-                 useMultiStyle,
-                 useHeat,
-                 useVT,
-                 useShapes,
-                 useOSMB) = writeVectorLayer(layer, safeLayerName,
-                                             usedFields[count], highlight,
-                                             popupsOnHover, popup[count],
-                                             outputProjectFileName,
-                                             wfsLayers, cluster[count],
-                                             visible[count],
-                                             interactive[count], json[count],
-                                             legends, new_src, canvas, count,
-                                             restrictToExtent, extent,
-                                             feedback, labelCode, vtLabels,
-                                             vtStyles, useMultiStyle, useHeat,
-                                             useVT, useShapes, useOSMB)
+                with reportStage("styles"):
+                    (new_src,
+                     legends,
+                     wfsLayers,
+                     labelCode,
+                     vtLabels,
+                     vtStyles,
+                     useMapUnits,
+                     useMultiStyle,
+                     useHeat,
+                     useVT,
+                     useShapes,
+                     useOSMB) = writeVectorLayer(
+                        layer, safeLayerName, usedFields[count], highlight,
+                        popupsOnHover, popup[count], outputProjectFileName,
+                        wfsLayers, cluster[count], visible[count],
+                        interactive[count], json[count], legends, new_src,
+                        canvas, count, restrictToExtent, extent, feedback,
+                        labelCode, vtLabels, vtStyles, useMultiStyle,
+                        useHeat, useVT, useShapes, useOSMB,
+                        clusterIndex[count], heatmapGrid[count],
+                        legendSprite, markerStore, bakedSymbology[count])
                 if useMapUnits:
                     mapUnitLayers.append(safeLayerName)
             elif layer.type() == QgsMapLayer.RasterLayer:
@@ -304,12 +376,18 @@ class LeafletWriter(Writer):
                     useRaster = True
                     feedback.showFeedback('Writing %s as raster layer...' %
                                           layer.name())
-                    new_obj = rasterScript(layer, safeLayerName, count)
+                    new_obj = rasterScript(layer, safeLayerName, count,
+                                           rasterExports.get(safeLayerName))
                     feedback.completeStep()
                 if visible[count]:
                     new_obj += """
         map.addLayer(layer_""" + safeLayerName + """);"""
                 new_src += new_obj
+            filesWritten(outputProjectFileName)
+        with reportStage("legends"):
+            legendSprite.save(os.path.join(outputProjectFileName, "legend"))
+        write_expressions(os.path.join(outputProjectFileName, "js",
+                                       "qgis2web_expressions.js"))
         the_src = new_src
         new_src = jsons + """
         <script>"""
@@ -379,14 +457,27 @@ class LeafletWriter(Writer):
                              labelVisibility, searchLayer, useHeat,
                              useRaster, labelsList, mapUnitLayers)
         new_src += end
+        with reportStage("libraries"):
+            manifest = writeLibraries(
+                feedback, outputProjectFileName, cluster, measure, matchCRS,
+                layerSearch, filterItems, canvas, addressSearch, locate,
+                useMultiStyle, useHeat, useShapes, useOSMB, useWMS, useWMTS,
+                useVT, any(clusterIndex) or any(heatmapGrid),
+                any("cog" in raster for raster in rasterExports.values()),
+                coreManifest)
+        filesWritten(outputProjectFileName)
         try:
             writeHTMLstart(outputIndex, title, cluster, addressSearch,
                            measure, matchCRS, layerSearch, filterItems, canvas,
                            locate, new_src, template, feedback, useMultiStyle,
-                           useHeat, useShapes, useOSMB, useWMS, useWMTS, useVT)
+                           useHeat, useShapes, useOSMB, useWMS, useWMTS, useVT,
+                           any(clusterIndex) or any(heatmapGrid),
+                           any("cog" in raster
+                               for raster in rasterExports.values()))
+            if params["Data export"].get("Bundle scripts and styles", False):
+                bundlePage(outputProjectFileName, outputIndex, "js", "css",
+                           manifest.assets, layerData="data")
         except Exception:
             QgsMessageLog.logMessage(traceback.format_exc(),
                                      "qgis2web", level=Qgis.Critical)
-        finally:
-            QApplication.restoreOverrideCursor()
         return outputIndex
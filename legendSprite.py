@@ -0,0 +1,116 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import codecs
+import hashlib
+from collections import OrderedDict
+from qgis.PyQt.QtCore import Qt
+from qgis.PyQt.QtGui import QImage, QPainter
+
+# widest row of the sprite sheet in pixels, wider icons get their own row
+SPRITE_WIDTH = 1024
+
+
+def legendIcon(name):
+    """
+    Returns the HTML showing the legend icon added to the sprite as name.
+    """
+    return '<span class="legend-icon legend-%s"></span>' % name
+
+
+class LegendSprite(object):
+    """
+    Collects the legend icons of an export in memory, and writes the
+    distinct ones to a single sprite sheet with a stylesheet giving a
+    legend-<name> class to every icon added.
+    """
+
+    def __init__(self):
+        # distinct images by pixel hash, and the names sharing each of them
+        self.images = OrderedDict()
+        self.names = OrderedDict()
+
+    def add(self, name, image):
+        """
+        Adds a QImage, or a QPixmap, to the sprite as name.
+        """
+        if not isinstance(image, QImage):
+            image = image.toImage()
+        image = image.convertToFormat(QImage.Format_ARGB32)
+        if image.isNull():
+            return
+        bits = image.constBits()
+        bits.setsize(image.bytesPerLine() * image.height())
+        key = hashlib.sha1(bytes(bits)).hexdigest()
+        key += "_%dx%d" % (image.width(), image.height())
+        if key not in self.images:
+            self.images[key] = image
+            self.names[key] = []
+        self.names[key].append(name)
+
+    def pack(self):
+        """
+        Places the icons in rows, tallest first.
+        :return: the size of the sheet and the offset of each icon
+        """
+        offsets = {}
+        x = y = rowHeight = width = 0
+        keys = sorted(self.images, key=lambda k: -self.images[k].height())
+        for key in keys:
+            image = self.images[key]
+            if x and x + image.width() > SPRITE_WIDTH:
+                x = 0
+                y += rowHeight
+                rowHeight = 0
+            offsets[key] = (x, y)
+            x += image.width()
+            width = max(width, x)
+            rowHeight = max(rowHeight, image.height())
+        return width, y + rowHeight, offsets
+
+    def save(self, folder, name="legend"):
+        """
+        Writes the sprite sheet and its stylesheet to folder.
+        """
+        css = """.legend-icon {
+    display: inline-block;
+    vertical-align: middle;
+    background-image: url("%s.png");
+    background-repeat: no-repeat;
+}
+""" % name
+        if self.images:
+            width, height, offsets = self.pack()
+            sheet = QImage(width, height, QImage.Format_ARGB32)
+            sheet.fill(Qt.transparent)
+            painter = QPainter(sheet)
+            for key, image in self.images.items():
+                x, y = offsets[key]
+                painter.drawImage(x, y, image)
+                css += """%s {
+    width: %dpx;
+    height: %dpx;
+    background-position: -%dpx -%dpx;
+}
+""" % (", ".join(".legend-" + n for n in self.names[key]),
+                    image.width(), image.height(), x, y)
+            painter.end()
+            sheet.save(os.path.join(folder, name + ".png"))
+        with codecs.open(os.path.join(folder, name + ".css"), "w",
+                         "utf-8") as f:
+            f.write(css)
@@ -53,6 +53,7 @@ from qgis.PyQt.QtWidgets import (QAction,
                                  QHBoxLayout,
                                  QVBoxLayout,
                                  QTreeWidgetItem,
+                                 QStyledItemDelegate,
                                  QComboBox,
                                  QListWidget,
                                  QCheckBox,
@@ -65,6 +66,7 @@ from qgis.PyQt.QtWidgets import (QAction,
                                  QLineEdit,
                                  QDialogButtonBox,
                                  QSizePolicy)
+from qgis.PyQt import sip
 from qgis.PyQt.uic import loadUiType
 from qgis.PyQt.QtNetwork import QNetworkProxy
 
@@ -99,6 +101,7 @@ from qgis2web.leafletWriter import LeafletWriter
 from qgis2web.writerRegistry import (WRITER_REGISTRY)
 from qgis2web.exporter import (EXPORTER_REGISTRY)
 from qgis2web.feedbackDialog import FeedbackDialog
+from qgis2web.exportTask import ExportTask
 
 from qgis.gui import QgsColorButton
 
@@ -132,13 +135,25 @@ class MainDialog(QDialog, FORM_CLASS):
         self.setAllLayersEncodeValue = "default"
         self.setAllPopupFieldsComboValue = None
         self.setAllApplyButton.clicked.connect(self.setAllApplyClicked)
+
+        # layer options are only built when a layer is expanded, and popup
+        # fields are edited through a delegate rather than a widget each
+        self.layersTree.itemExpanded.connect(self.populateLayerItem)
+        self.popupFieldDelegate = PopupFieldDelegate(self.layersTree)
+        self.layersTree.setItemDelegate(self.popupFieldDelegate)
+        self.layersTree.setEditTriggers(QAbstractItemView.AllEditTriggers)
+        self.layerSearchFields = None
+        self.attrFilterFields = None
         
         self.layer_search_combo = None
         self.layer_filter_select = None
         self.exporter_combo = None
 
         self.feedback = FeedbackDialog(self)
-        self.feedback.setModal(True)
+        # only blocks this dialog, so QGIS stays usable during an export
+        self.feedback.setWindowModality(Qt.WindowModal)
+        self.exportTask = None
+        self.previewTask = None
         
         stgs = QSettings()
 
@@ -442,9 +457,27 @@ class MainDialog(QDialog, FORM_CLASS):
                         treeOption.setDisabled(False)
 
     def createPreview(self):
+        """
+        Writes the preview in a background task, replacing any preview
+        still being written, and loads it once done
+        """
+        if self.previewTask is not None:
+            self.previewTask.cancel()
         writer = self.createWriter()
-        preview_file = writer.write(self.iface, dest_folder=utils.tempFolder()).index_file
-        return preview_file
+        self.previewTask = ExportTask(self.tr('Writing qgis2web preview'),
+                                      writer, self.iface, utils.tempFolder(),
+                                      onFinished=self.previewFinished)
+        QgsApplication.taskManager().addTask(self.previewTask)
+
+    def previewFinished(self, task, result):
+        if sip.isdeleted(self):
+            return
+        if task is self.previewTask:
+            self.previewTask = None
+        if result:
+            self.loadPreviewFile(task.results.index_file)
+        elif task.error is not None:
+            self.showErrorMessage(task.error)
 
     def shouldAutoPreview(self):
         """
@@ -481,8 +514,7 @@ class MainDialog(QDialog, FORM_CLASS):
             self.previewMap()
 
     def previewMap(self):
-        preview_file = self.createPreview()
-        self.loadPreviewFile(preview_file)
+        self.createPreview()
 
     def openDonationPage(self):
         webbrowser.open('https://www.opengis.it/buy-me-a-coffee/')
@@ -495,21 +527,34 @@ class MainDialog(QDialog, FORM_CLASS):
 
         self.feedback.reset()
         self.feedback.show()
-        results = writer.write(self.iface,
-                               dest_folder=write_folder,
-                               feedback=self.feedback)
-        self.feedback.showFeedback('Success')
+        self.exportTask = ExportTask(self.tr('Exporting qgis2web map'),
+                                     writer, self.iface, write_folder,
+                                     feedback=self.feedback,
+                                     exporter=self.exporter,
+                                     onFinished=self.exportFinished)
+        QgsApplication.taskManager().addTask(self.exportTask)
+
+    def exportFinished(self, task, result):
+        if sip.isdeleted(self):
+            return
+        self.exportTask = None
+        if task.error is not None:
+            self.feedback.setFatalError(
+                'Export failed, see the qgis2web message log')
+            return
+        if not result:
+            return
         if self.closeFeedbackOnSuccess.checkState() == Qt.Checked:
             self.feedback.close()
-        result = self.exporter.postProcess(results, feedback=self.feedback)
-        if result and (not os.environ.get('CI') and
-                       not os.environ.get('TRAVIS')):
+        if task.published and (not os.environ.get('CI') and
+                               not os.environ.get('TRAVIS')):
             webbrowser.open_new_tab(self.exporter.destinationUrl())
             
     
 
     def populate_layers_and_groups(self, dlg):
         """Populate layers on QGIS into our layers and group tree view."""
+        fieldSchema.clear()
         root_node = QgsProject.instance().layerTreeRoot()
         tree_layers = root_node.findLayers()
         self.layers_item = QTreeWidgetItem()
@@ -545,51 +590,43 @@ class MainDialog(QDialog, FORM_CLASS):
                     QgsMessageLog.logMessage(traceback.format_exc(), "qgis2web", level=Qgis.Critical)
              
         self.layersTree.addTopLevelItem(self.layers_item)
-        self.layersTree.expandAll()
+        self.layersTree.expandItem(self.layers_item)
+        for i in range(self.layers_item.childCount()):
+            item = self.layers_item.child(i)
+            if isinstance(item, TreeGroupItem):
+                item.setExpanded(True)
         self.layersTree.resizeColumnToContents(0)
         self.layersTree.resizeColumnToContents(1)
-        
-        def find_items_recursively(root_item, target_text, found_items=None):
-            """Recursively search for items with a specific text."""
-            if found_items is None:
-                found_items = []
-
-            if root_item.text(0) == target_text:
-                found_items.append(root_item)
-            # elif root_item.text(0) != "":
-                # found_items.append(root_item) 
-
-            for i in range(root_item.childCount()):
-                child_item = root_item.child(i)
-                find_items_recursively(child_item, target_text, found_items)
-
-            if found_items:
-                return found_items
+
+    def populateLayerItem(self, item):
+        if isinstance(item, TreeLayerItem):
+            item.populate()
+
+    def exportedLayers(self):
+        """
+        Returns the checked layers in the order of getLayersAndGroups,
+        without reading their options.
+        """
+        layers = []
+        for i in range(self.layers_item.childCount()):
+            item = self.layers_item.child(i)
+            if item.checkState(0) != Qt.Checked:
+                continue
+            if isinstance(item, TreeLayerItem):
+                layers.append(item.layer)
             else:
-                return None
-                    
-        for i in range(self.layers_item.childCount()): 
-            layersItem = self.layers_item.child(i)
-            if layersItem.checkState(0) != Qt.Checked: 
-                layersItem.setExpanded(False)
-            for group in range(layersItem.childCount()):
-                layersInGroup = layersItem.child(group)
-                if layersInGroup.checkState(0) != Qt.Checked: 
-                    layersInGroup.setExpanded(False)
-
-            popups_items = find_items_recursively(layersItem, "Popups")
-            if popups_items is not None:
-                for popups_item in popups_items:
-                    widget = self.layersTree.itemWidget(popups_item, 1)
-                    if widget:
-                        if not widget.isChecked():
-                            popups_item.setExpanded(False)
-                        else:
-                            popups_item.setExpanded(True)
-                        for k in range(popups_item.childCount()):
-                            popupFieldsItem = popups_item.child(k) 
-                            if popupFieldsItem.text(0) == "":
-                                popups_item.setHidden(True)
+                for j in range(item.childCount()):
+                    child = item.child(j)
+                    if (isinstance(child, TreeLayerItem) and
+                            child.checkState(0) == Qt.Checked):
+                        layers.append(child.layer)
+        return layers[::-1]
+
+    def exportedFields(self):
+        """Returns each exported vector layer with its visible fields."""
+        return [(layer, fieldSchema.visibleFields(layer))
+                for layer in self.exportedLayers()
+                if layer.type() == layer.VectorLayer]
 
     def populateSetAllCombo(self):
         self.setAllCombo.addItem("Layers to: Export Checked/Unchecked")
@@ -673,21 +710,18 @@ class MainDialog(QDialog, FORM_CLASS):
             print("Error in layersSettingsApplyClicked:", str(e))
 
     def populateLayerSearch(self):
+        layers = self.exportedLayers()
+        fields = [(layer.id(), layer.name(), fieldSchema.visibleFields(layer))
+                  for layer in layers if layer.type() == layer.VectorLayer]
+        if fields == self.layerSearchFields:
+            return
+        self.layerSearchFields = fields
         self.layer_search_combo.clear()
         self.layer_search_combo.addItem("None")
-        # Adjust unpacking for populateLayerSearch (ignore exportRelatedList)
-        (layers, groups, popup, visible, interactive,
-         json, cluster, getFeatureInfo, baseMap, _) = self.getLayersAndGroups()
         for count, layer in enumerate(layers):
             if layer.type() == layer.VectorLayer:
-                options = []
-                fields = layer.fields()
-                for f in fields:
-                    fieldIndex = fields.indexFromName(f.name())
-                    editorWidget = layer.editorWidgetSetup(fieldIndex).type()
-                    if editorWidget == 'Hidden':
-                        continue
-                    options.append(f.name())
+                options = [name for name, _ in
+                           fieldSchema.visibleFields(layer)]
                 for option in options:
                     displayStr = layer.name() + ": " + option
                     self.layer_search_combo.insertItem(0, displayStr)
@@ -697,25 +731,18 @@ class MainDialog(QDialog, FORM_CLASS):
                         sln + "_" + str(count))
 
     def populateAttrFilter(self):
+        fields = [(layer.name(), layerFields)
+                  for layer, layerFields in self.exportedFields()]
+        if fields == self.attrFilterFields:
+            return
+        self.attrFilterFields = fields
         self.layer_filter_select.clear()
-        # Adjust unpacking for populateAttrFilter (ignore exportRelatedList)
-        (layers, groups, popup, visible, interactive,
-         json, cluster, getFeatureInfo, baseMap, _) = self.getLayersAndGroups()
         options = []
-        for count, layer in enumerate(layers):
-            if layer.type() == layer.VectorLayer:
-                fields = layer.fields()
-                for f in fields:
-                    fieldIndex = fields.indexFromName(f.name())
-                    editorWidget = layer.editorWidgetSetup(fieldIndex).type()
-                    if editorWidget == 'Hidden':
-                        continue
-                    if utils.boilType(f.typeName()) in ["int", "str", "real",
-                                                        "date", "bool",
-                                                        "time", "datetime"]:
-                        options.append([f.name() + ": " +
-                                        utils.boilType(f.typeName()),
-                                        layer.name()])
+        for layerName, layerFields in fields:
+            for name, fieldType in layerFields:
+                if fieldType in ["int", "str", "real", "date", "bool",
+                                 "time", "datetime"]:
+                    options.append([name + ": " + fieldType, layerName])
         preCleanOptions = {}
         for entry in options:
             if entry[0] not in list(preCleanOptions.keys()):
@@ -914,6 +941,8 @@ class MainDialog(QDialog, FORM_CLASS):
         return (layers, groups, popup, visible, interactive, json, cluster, getFeatureInfo, baseMap, exportRelatedList)
 
     def reject(self):
+        if self.previewTask is not None:
+            self.previewTask.cancel()
         self.saveParameters()
         # Adjust unpacking for reject (include exportRelatedList)
         (layers, groups, popup, visible, interactive,
@@ -1017,7 +1046,112 @@ class TreeGroupItem(QTreeWidgetItem):
         return self.interactiveCheck.isChecked()
 
 
+POPUP_LABELS = ["no label",
+                "inline label - always visible",
+                "inline label - visible with data",
+                "hidden field",
+                "header label - always visible",
+                "header label - visible with data"]
+
+# item data role marking the value column of a popup field
+POPUP_FIELD_ROLE = Qt.UserRole + 1
+
+
+def setAll(value, default):
+    """Applies a "set all" choice of the dialog to a layer option."""
+    if value == "checked":
+        return True
+    if value == "unchecked":
+        return False
+    return default
+
+
+class FieldSchema(object):
+    """
+    The fields of the layers listed in the dialog, read once per layer and
+    dropped when the fields of the layer change.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        # the layer and slot connected to, by layer id
+        self.watched = {}
+
+    def clear(self):
+        """
+        Forgets every layer, as a project opened again has new layers under
+        the same ids.
+        """
+        for layer, slot in self.watched.values():
+            try:
+                layer.updatedFields.disconnect(slot)
+            except (RuntimeError, TypeError):
+                # the layer was deleted with its project
+                pass
+        self.fields = {}
+        self.watched = {}
+
+    def visibleFields(self, layer):
+        """
+        Returns the name and boiled type of each field of a layer that is
+        not hidden from its attribute form.
+        """
+        layerId = layer.id()
+        if layerId not in self.fields:
+            fields = layer.fields()
+            self.fields[layerId] = [
+                (f.name(), utils.boilType(f.typeName()))
+                for fieldIndex, f in enumerate(fields)
+                if layer.editorWidgetSetup(fieldIndex).type() != 'Hidden']
+            if layerId not in self.watched:
+                def slot(layerId=layerId):
+                    self.fields.pop(layerId, None)
+                self.watched[layerId] = (layer, slot)
+                layer.updatedFields.connect(slot)
+        return self.fields[layerId]
+
+
+fieldSchema = FieldSchema()
+
+
+class PopupFieldDelegate(QStyledItemDelegate):
+    """
+    Edits the popup label of a field with a combo box which only exists
+    while the field is being edited, instead of one widget per field.
+    """
+
+    def isPopupField(self, index):
+        return index.sibling(index.row(), 1).data(POPUP_FIELD_ROLE) is True
+
+    def createEditor(self, parent, option, index):
+        if not self.isPopupField(index):
+            return QStyledItemDelegate.createEditor(self, parent, option,
+                                                    index)
+        if index.column() != 1:
+            return None
+        editor = QComboBox(parent)
+        editor.addItems(POPUP_LABELS)
+        editor.activated.connect(lambda: self.commitData.emit(editor))
+        return editor
+
+    def setEditorData(self, editor, index):
+        if not self.isPopupField(index):
+            return QStyledItemDelegate.setEditorData(self, editor, index)
+        editor.setCurrentIndex(max(editor.findText(index.data()), 0))
+
+    def setModelData(self, editor, model, index):
+        if not self.isPopupField(index):
+            return QStyledItemDelegate.setModelData(self, editor, model,
+                                                    index)
+        model.setData(index, editor.currentText())
+
+
 class TreeLayerItem(QTreeWidgetItem):
+    """
+    A layer of the layers tree. The option rows of the layer are only built
+    when it is first expanded; until then its options are read from the
+    layer's custom properties.
+    """
     layerIcon = QIcon(os.path.join(os.path.dirname(__file__), "icons",
                                    "layer.png"))
 
@@ -1025,6 +1159,7 @@ class TreeLayerItem(QTreeWidgetItem):
         QTreeWidgetItem.__init__(self)
         self.iface = iface
         self.layer = layer
+        self.tree = tree
         self.setText(0, layer.name())
         self.setIcon(0, self.layerIcon)
         project = QgsProject.instance()
@@ -1038,203 +1173,165 @@ class TreeLayerItem(QTreeWidgetItem):
         if dlg.setAllLayersExportValue == "unchecked":
             self.setCheckState(0, Qt.Unchecked)
 
-        self.visibleItem = QTreeWidgetItem(self)
-        self.visibleCheck = QCheckBox()
+        isVector = layer.type() == layer.VectorLayer
         vis = layer.customProperty("qgis2web/Visible", True)
-        if vis == 0 or str(vis).lower() == "false":
-            self.visibleCheck.setChecked(False)
-        else:
-            self.visibleCheck.setChecked(True)
-        # set all
-        if dlg.setAllLayersVisibleValue == "checked":
-            self.visibleCheck.setChecked(True)
-        if dlg.setAllLayersVisibleValue == "unchecked":
-            self.visibleCheck.setChecked(False)
-        self.visibleItem.setText(0, "Visible")
-        self.addChild(self.visibleItem)
-        tree.setItemWidget(self.visibleItem, 1, self.visibleCheck)
+        self.options = {
+            "visible": setAll(dlg.setAllLayersVisibleValue,
+                              not (vis == 0 or str(vis).lower() == "false")),
+            "exportRelated": isVector and str(layer.customProperty(
+                "qgis2web/ExportRelated", "false")).lower() == "true",
+            "interactive": isVector and setAll(
+                dlg.setAllLayersPopupsValue,
+                layer.customProperty("qgis2web/Popups") != 0),
+            "json": (isVector and layer.providerType() == 'WFS' and setAll(
+                dlg.setAllLayersEncodeValue,
+                layer.customProperty("qgis2web/Encode to JSON") == 2)),
+            "cluster": (isVector and
+                        layer.geometryType() == QgsWkbTypes.PointGeometry and
+                        setAll(dlg.setAllLayersClusterValue,
+                               layer.customProperty("qgis2web/Cluster") == 2)),
+            "getFeatureInfo": (not isVector and
+                               layer.providerType() == 'wms' and setAll(
+                                   dlg.setAllLayersGetFeatureInfo,
+                                   layer.customProperty(
+                                       "qgis2web/GetFeatureInfo") == 2)),
+            "baseMap": (not isVector and layer.providerType() == 'wms' and
+                        setAll(dlg.setAllLayersBaseMap,
+                               layer.customProperty("qgis2web/BaseMap") == 2))
+        }
+        self.popupLabel = dlg.setAllPopupFieldsComboValue
+        self.relations = None
+        self.popupItem = None
+        self.populated = False
+        self.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+
+    def hasRelations(self):
+        """Returns True if the layer takes part in a valid relation."""
+        if self.relations is not None:
+            return self.relations
+        layer = self.layer
+        self.relations = False
+        try:
+            relation_manager = QgsProject.instance().relationManager()
+            # Check if layer ID is valid before querying relations
+            if layer and layer.isValid() and layer.id():
+                for relation in relation_manager.relations().values():
+                    # the layer is either referencing (has foreign keys) or
+                    # referenced (its primary key is used by other layers)
+                    related = [relation.referencingLayer(),
+                               relation.referencedLayer()]
+                    if (any(related_layer and
+                            related_layer.id() == layer.id()
+                            for related_layer in related) and
+                            relation.isValid()):
+                        self.relations = True
+                        break
+            else:
+                QgsMessageLog.logMessage(f"Layer {layer.name()} is invalid or has no ID, cannot check relations.", "qgis2web", level=Qgis.Warning)
+        except Exception as e:
+            QgsMessageLog.logMessage(f"Error checking relations for layer {layer.name()}: {e}", "qgis2web", level=Qgis.Warning)
+        return self.relations
+
+    def addCheck(self, text, option, changed=None):
+        """Adds an option row with a checkbox bound to self.options."""
+        item = QTreeWidgetItem(self)
+        item.setText(0, text)
+        check = QCheckBox()
+        check.setChecked(self.options[option])
+        check.stateChanged.connect(
+            lambda state: self.options.update({option: state == Qt.Checked}))
+        if changed is not None:
+            check.stateChanged.connect(changed)
+        self.tree.setItemWidget(item, 1, check)
+        return item, check
+
+    def populate(self):
+        """Builds the option rows of the layer, the first time it is
+        expanded."""
+        if self.populated:
+            return
+        self.populated = True
+        layer = self.layer
+        tree = self.tree
+
+        self.visibleItem, self.visibleCheck = self.addCheck("Visible",
+                                                            "visible")
 
         # Add Related Data Checkbox (Column 3)
         if layer.type() == layer.VectorLayer:
-            self.relatedDataItem = QTreeWidgetItem(self)
-            self.relatedDataCheck = QCheckBox()
-            has_relations = False
-            # Check for relations
-            try:
-                relation_manager = QgsProject.instance().relationManager()
-                # Check if layer ID is valid before querying relations
-                if layer and layer.isValid() and layer.id():
-                    # Replace relationsForLayer with the correct approach
-                    all_relations = relation_manager.relations()
-                    # Check if layer is a referencing layer (has foreign keys)
-                    referencing_relations = [rel for rel in all_relations.values() 
-                                            if rel.referencingLayer() and rel.referencingLayer().id() == layer.id()]
-                    
-                    # Check if layer is a referenced layer (primary key is referenced by other layers)
-                    referenced_relations = [rel for rel in all_relations.values() 
-                                            if rel.referencedLayer() and rel.referencedLayer().id() == layer.id()]
-                    
-                    # Combine both types of relations
-                    layer_relations = referencing_relations + referenced_relations
-                    
-                    # Check if there are any valid relations
-                    if layer_relations:
-                        for relation in layer_relations:
-                            if relation.isValid():
-                                has_relations = True
-                                break  # Found at least one valid relation
-                else:
-                    QgsMessageLog.logMessage(f"Layer {layer.name()} is invalid or has no ID, cannot check relations.", "qgis2web", level=Qgis.Warning)
-            except Exception as e:
-                QgsMessageLog.logMessage(f"Error checking relations for layer {layer.name()}: {e}", "qgis2web", level=Qgis.Warning)
-
-            if has_relations:
-                self.relatedDataCheck.setEnabled(True)
-                # Read initial state from custom property
-                export_related_prop = layer.customProperty("qgis2web/ExportRelated", "false")
-                initial_state = str(export_related_prop).lower() == 'true'
-                self.relatedDataCheck.setChecked(initial_state)
-                # Connect signal
-                self.relatedDataCheck.stateChanged.connect(self.changeExportRelated)
+            if self.hasRelations():
+                self.relatedDataItem, self.relatedDataCheck = self.addCheck(
+                    "Export Related Data", "exportRelated",
+                    self.changeExportRelated)
             else:
+                self.options["exportRelated"] = False
+                self.relatedDataItem, self.relatedDataCheck = self.addCheck(
+                    "Export Related Data", "exportRelated")
                 self.relatedDataCheck.setEnabled(False)
-                self.relatedDataCheck.setChecked(False) # Ensure it's unchecked if disabled
-                # Optionally set tooltip
                 self.relatedDataCheck.setToolTip("Enable relations for this layer in QGIS Project Properties to activate.")
-            self.relatedDataItem.setText(0, "Export Related Data")
-            self.addChild(self.relatedDataItem)  # Uncommenting to add the related data item
-            tree.setItemWidget(self.relatedDataItem, 1, self.relatedDataCheck)  # Uncommenting to set the widget
 
-        else:
-            # Ensure relatedDataCheck is None for non-vector layers
-            self.relatedDataCheck = None
-            
-        if layer.type() == layer.VectorLayer:
             if layer.providerType() == 'WFS':
-                self.jsonItem = QTreeWidgetItem(self)
-                self.jsonCheck = QCheckBox()
-                if layer.customProperty("qgis2web/Encode to JSON") == 2:
-                    self.jsonCheck.setChecked(True)
-                # set all
-                if dlg.setAllLayersEncodeValue == "checked":
-                    self.jsonCheck.setChecked(True)
-                if dlg.setAllLayersEncodeValue == "unchecked":
-                    self.jsonCheck.setChecked(False)
-
-                self.jsonItem.setText(0, "Encode to JSON")
-                self.jsonCheck.stateChanged.connect(self.changeJSON)
-                self.addChild(self.jsonItem)
-                tree.setItemWidget(self.jsonItem, 1, self.jsonCheck)
+                self.jsonItem, self.jsonCheck = self.addCheck(
+                    "Encode to JSON", "json", self.changeJSON)
             if layer.geometryType() == QgsWkbTypes.PointGeometry:
-                self.clusterItem = QTreeWidgetItem(self)
-                self.clusterCheck = QCheckBox()
-                if layer.customProperty("qgis2web/Cluster") == 2:
-                    self.clusterCheck.setChecked(True)
-                # set all
-                if dlg.setAllLayersClusterValue == "checked":
-                    self.clusterCheck.setChecked(True)
-                if dlg.setAllLayersClusterValue == "unchecked":
-                    self.clusterCheck.setChecked(False)
-
-                self.clusterItem.setText(0, "Cluster")
-                self.clusterCheck.stateChanged.connect(self.changeCluster)
-                self.addChild(self.clusterItem)
-                tree.setItemWidget(self.clusterItem, 1, self.clusterCheck)
+                self.clusterItem, self.clusterCheck = self.addCheck(
+                    "Cluster", "cluster", self.changeCluster)
         else:
             if layer.providerType() == 'wms':
-                self.getFeatureInfoItem = QTreeWidgetItem(self)
-                self.getFeatureInfoCheck = QCheckBox()
-                if layer.customProperty("qgis2web/GetFeatureInfo") == 2:
-                    self.getFeatureInfoCheck.setChecked(True)
-                # set all
-                if dlg.setAllLayersGetFeatureInfo == "checked":
-                    self.getFeatureInfoCheck.setChecked(True)
-                if dlg.setAllLayersGetFeatureInfo == "unchecked":
-                    self.getFeatureInfoCheck.setChecked(False)
-
-                self.getFeatureInfoItem.setText(0, "GetFeatureInfo")
-                self.getFeatureInfoCheck.stateChanged.connect(self.changeGetFeatureInfo)
-                self.addChild(self.getFeatureInfoItem)
-                tree.setItemWidget(self.getFeatureInfoItem, 1,
-                                   self.getFeatureInfoCheck)
-
-                self.baseMapItem = QTreeWidgetItem(self)
-                self.baseMapCheck = QCheckBox()
-                if layer.customProperty("qgis2web/BaseMap") == 2:
-                    self.baseMapCheck.setChecked(True)
-                # set all
-                if dlg.setAllLayersBaseMap == "checked":
-                    self.baseMapCheck.setChecked(True)
-                if dlg.setAllLayersBaseMap == "unchecked":
-                    self.baseMapCheck.setChecked(False)
-
-                self.baseMapItem.setText(0, "BaseMap")
-                self.baseMapCheck.stateChanged.connect(self.changeBaseMap)
-                self.addChild(self.baseMapItem)
-                tree.setItemWidget(self.baseMapItem, 1, self.baseMapCheck)
-
-                                       
-        self.interactiveItem  = QTreeWidgetItem(self)
-        self.interactiveCheck = QCheckBox()
-        if layer.type() == layer.VectorLayer:
-            int = True
-            if int == 0 or str(int).lower() == "false":
-                self.interactiveCheck.setChecked(False)
-            else:
-                self.interactiveCheck.setChecked(True)
-
-            if layer.customProperty("qgis2web/Popups") == 0:
-                self.interactiveCheck.setChecked(False)
-
-            # set all
-            if dlg.setAllLayersPopupsValue == "checked":
-                self.interactiveCheck.setChecked(True)
-            if dlg.setAllLayersPopupsValue == "unchecked":
-                self.interactiveCheck.setChecked(False)
-                
-            self.interactiveItem.setText(0, "Popups")
-            tree.setItemWidget(self.interactiveItem, 1, self.interactiveCheck)
-            self.interactiveCheck.stateChanged.connect(self.togglePopups)  
-        
-            self.popupItem = QTreeWidgetItem(self.interactiveItem)
-            self.popupItem.setText(0, "Popup fields:")
-            options = []
-            fields = self.layer.fields()
-            for f in fields:
-                fieldIndex = fields.indexFromName(f.name())
-                editorWidget = layer.editorWidgetSetup(fieldIndex).type()
-                if editorWidget == 'Hidden':
-                    continue
-                options.append(f.name())
-            if options:
-                for option in options:
-                    self.attr = QTreeWidgetItem(self.popupItem)
-                    self.attrWidget = QComboBox()
-                    self.attrWidget.addItem("no label")
-                    self.attrWidget.addItem("inline label - always visible")
-                    self.attrWidget.addItem("inline label - visible with data")
-                    self.attrWidget.addItem("hidden field")
-                    self.attrWidget.addItem("header label - always visible")
-                    self.attrWidget.addItem("header label - visible with data")
-                    custProp = layer.customProperty("qgis2web/popup/" + option)
-                    if (custProp != "" and custProp is not None):
-                        self.attrWidget.setCurrentIndex(
-                            self.attrWidget.findText(
-                                layer.customProperty("qgis2web/popup/" + option)))
-                    self.attr.setText(0, option)
-                    self.attr.setFont(0, italic_font)
-                    self.popupItem.addChild(self.attr)
-                    tree.setItemWidget(self.attr, 1, self.attrWidget)
-                    # set all
-                    if dlg.setAllPopupFieldsComboValue is not None:
-                        self.attrWidget.setCurrentIndex(
-                            self.attrWidget.findText(dlg.setAllPopupFieldsComboValue))
-                self.addChild(self.popupItem)
+                (self.getFeatureInfoItem,
+                 self.getFeatureInfoCheck) = self.addCheck(
+                    "GetFeatureInfo", "getFeatureInfo",
+                    self.changeGetFeatureInfo)
+                self.baseMapItem, self.baseMapCheck = self.addCheck(
+                    "BaseMap", "baseMap", self.changeBaseMap)
             else:
-                self.popupItem.setText(0, "")
+                self.encodingItem = QTreeWidgetItem(self)
+                self.encodingCombo = QComboBox()
+                self.encodingCombo.addItems(utils.RASTER_ENCODINGS)
+                encoding = utils.getRasterEncoding(layer)
+                self.encodingCombo.setCurrentIndex(
+                    self.encodingCombo.findText(encoding))
+                self.encodingItem.setText(0, "Raster encoding")
+                self.encodingCombo.currentTextChanged.connect(
+                    self.changeEncoding)
+                tree.setItemWidget(self.encodingItem, 1, self.encodingCombo)
+
+        if layer.type() == layer.VectorLayer:
+            self.interactiveItem, self.interactiveCheck = self.addCheck(
+                "Popups", "interactive", self.togglePopups)
+
+            fields = self.popupFields()
+            if fields:
+                # the value of each field is edited through
+                # PopupFieldDelegate rather than a widget of its own
+                self.popupItem = QTreeWidgetItem(self.interactiveItem)
+                self.popupItem.setText(0, "Popup fields:")
+                items = []
+                for field, label in fields.items():
+                    item = QTreeWidgetItem([field, label])
+                    item.setFont(0, italic_font)
+                    item.setData(1, POPUP_FIELD_ROLE, True)
+                    item.setFlags(item.flags() | Qt.ItemIsEditable)
+                    items.append(item)
+                self.popupItem.addChildren(items)
+                self.popupItem.setExpanded(True)
+            self.interactiveItem.setExpanded(self.options["interactive"])
 
         self.emptyRow = QTreeWidgetItem()
         self.addChild(self.emptyRow)
+        tree.resizeColumnToContents(1)
+
+    def popupFields(self):
+        """Returns the popup label of each field, as stored on the layer."""
+        popup = OrderedDict()
+        if self.layer.type() != self.layer.VectorLayer:
+            return popup
+        for field, _ in fieldSchema.visibleFields(self.layer):
+            label = self.popupLabel
+            if label is None:
+                label = self.layer.customProperty("qgis2web/popup/" + field)
+            popup[field] = label if label in POPUP_LABELS else "no label"
+        return popup
 
     def changeExportRelated(self, state):
         """Saves the ExportRelated state to the layer's custom property."""
@@ -1244,66 +1341,45 @@ class TreeLayerItem(QTreeWidgetItem):
 
     @property
     def popup(self):
+        if self.popupItem is None:
+            if self.populated:
+                return OrderedDict()
+            return self.popupFields()
         popup = []
-        self.tree = self.treeWidget()
-        for p in range(self.childCount()):
-            optionItem = self.child(p)
-            if optionItem.text(0) == "Popups":
-                for n in range(optionItem.childCount()):
-                    popupFieldsItem = optionItem.child(n)
-                    for m in range(popupFieldsItem.childCount()):
-                        widgetItem = popupFieldsItem.child(m)
-                        widgetText = widgetItem.text(0)
-                        if widgetText != "":
-                            popupVal = self.tree.itemWidget(widgetItem, 1).currentText()
-                            pair = (widgetText, popupVal)
-                            popup.append(pair)
-        popup = OrderedDict(popup)
-        return popup
+        for n in range(self.popupItem.childCount()):
+            fieldItem = self.popupItem.child(n)
+            popup.append((fieldItem.text(0), fieldItem.text(1)))
+        return OrderedDict(popup)
 
     @property
     def visible(self):
-        return self.visibleCheck.isChecked()
+        return self.options["visible"]
 
     @property
     def exportRelated(self):
         """Returns the state of the related data checkbox."""
-        if self.relatedDataCheck:
-            return self.relatedDataCheck.isChecked()
-        return False # Default to False if checkbox doesn't exist
+        return self.options["exportRelated"] and self.hasRelations()
 
     @property
     def interactive(self):
-        return self.interactiveCheck.isChecked()
+        return self.options["interactive"]
 
     @property
     def json(self):
-        try:
-            return self.jsonCheck.isChecked()
-        except Exception:
-            return False
+        return self.options["json"]
 
     @property
     def cluster(self):
-        try:
-            return self.clusterCheck.isChecked()
-        except Exception:
-            return False
+        return self.options["cluster"]
 
     @property
     def getFeatureInfo(self):
-        try:
-            return self.getFeatureInfoCheck.isChecked()
-        except Exception:
-            return False
-    
+        return self.options["getFeatureInfo"]
+
     @property
     def baseMap(self):
-        try:
-            return self.baseMapCheck.isChecked()
-        except Exception:
-            return False
-    
+        return self.options["baseMap"]
+
     def changeJSON(self, isJSON):
         self.layer.setCustomProperty("qgis2web/Encode to JSON", isJSON)
 
@@ -1316,6 +1392,9 @@ class TreeLayerItem(QTreeWidgetItem):
         
     def changeBaseMap(self, isBaseMap):
         self.layer.setCustomProperty("qgis2web/BaseMap", isBaseMap)
+
+    def changeEncoding(self, encoding):
+        self.layer.setCustomProperty("qgis2web/Raster encoding", encoding)
         
 
     def togglePopups(self, state):
@@ -1324,6 +1403,7 @@ class TreeLayerItem(QTreeWidgetItem):
             self.interactiveItem.setExpanded(False)
         else:
             self.interactiveItem.setExpanded(True)
+
    
 
 class TreeSettingItem(QTreeWidgetItem):
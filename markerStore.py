@@ -0,0 +1,130 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import re
+import hashlib
+from qgis.PyQt.QtCore import Qt, QByteArray, QBuffer, QIODevice
+from qgis.PyQt.QtGui import QImage, QPainter
+from qgis.PyQt.QtSvg import QSvgRenderer
+
+MARKER_FORMATS = ("Minified SVG", "SVG", "PNG")
+# PNG markers are rendered at this multiple of their displayed size, to
+# stay sharp on high density screens
+PNG_MARKER_SCALE = 2
+
+
+def colorizeSvg(svg_path, fill, outline, outlineWidth):
+    """
+    Reads a QGIS SVG marker, replacing its "param(...)" placeholders with
+    the colors of the symbol layer.
+    """
+    with open(svg_path) as f:
+        s = f.read()
+    s = s.replace('param(fill)', fill)
+    s = s.replace('param(fill-opacity)', '1')
+    s = s.replace('param(outline)', outline)
+    s = s.replace('param(outline-width)', str(float(outlineWidth) * 80))
+    s = s.replace('param(outline-opacity)', '1')
+    return s
+
+
+def minifySvg(svg):
+    """
+    Removes comments, editor metadata and whitespace between tags from an
+    SVG document.
+    """
+    svg = re.sub(r"<!--.*?-->", "", svg, flags=re.S)
+    svg = re.sub(r"<metadata\b.*?</metadata>", "", svg, flags=re.S)
+    svg = re.sub(r"<sodipodi:namedview\b.*?(/>|</sodipodi:namedview>)", "",
+                 svg, flags=re.S)
+    svg = re.sub(r">\s+<", "><", svg)
+    return svg.strip()
+
+
+class MarkerStore(object):
+    """
+    Writes marker images to a folder under names derived from their
+    content, so that a marker used by several symbols, categories or
+    layers is only written and downloaded once.
+    """
+
+    def __init__(self, folder, url, markerFormat=MARKER_FORMATS[0]):
+        """
+        :param folder: the folder to write the markers to
+        :param url: the path of the folder relative to the web map
+        :param markerFormat: one of MARKER_FORMATS
+        """
+        self.folder = folder
+        self.url = url
+        self.markerFormat = markerFormat
+        self.assets = {}
+
+    def addSvg(self, svg, size, width, height):
+        """
+        Stores an SVG marker shown size pixels wide.
+        :param width: the width of the SVG document
+        :param height: the height of the SVG document
+        :return: the URL of the marker and the size of its image
+        """
+        key = (hashlib.sha1(svg.encode("utf-8")).hexdigest(),
+               size if self.markerFormat == "PNG" else None)
+        if key not in self.assets:
+            asset = None
+            if self.markerFormat == "PNG":
+                asset = self.rasterize(svg, size)
+            if asset is None:
+                if self.markerFormat != "SVG":
+                    svg = minifySvg(svg)
+                asset = (svg.encode("utf-8"), "svg", width, height)
+            data, extension, width, height = asset
+            name = "%s.%s" % (hashlib.sha1(data).hexdigest()[:16],
+                              extension)
+            self.write(name, data)
+            self.assets[key] = (self.url + name, width, height)
+        return self.assets[key]
+
+    def rasterize(self, svg, size):
+        """
+        Renders an SVG marker to a PNG.
+        :return: the PNG data, extension and size, or None if the SVG cannot
+        be rendered
+        """
+        renderer = QSvgRenderer(QByteArray(svg.encode("utf-8")))
+        defaultSize = renderer.defaultSize()
+        if not renderer.isValid() or defaultSize.width() <= 0:
+            return None
+        width = max(1, int(round(float(size) * PNG_MARKER_SCALE)))
+        height = max(1, int(round(width * defaultSize.height() /
+                                  float(defaultSize.width()))))
+        image = QImage(width, height, QImage.Format_ARGB32)
+        image.fill(Qt.transparent)
+        painter = QPainter(image)
+        renderer.render(painter)
+        painter.end()
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        image.save(buffer, "PNG")
+        buffer.close()
+        return bytes(data), "png", width, height
+
+    def write(self, name, data):
+        path = os.path.join(self.folder, name)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(data)
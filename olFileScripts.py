@@ -4,40 +4,95 @@ import shutil
 from qgis.PyQt.QtCore import QDir
 from qgis.core import QgsDataSourceUri
 from qgis2web.utils import safeName
+from qgis2web.assetBundler import AssetManifest
 
 
 def writeFiles(folder, restrictToExtent, feedback):
-    feedback.showFeedback("Exporting libraries...")
     imagesFolder = os.path.join(folder, "images")
     QDir().mkpath(imagesFolder)
     dst = os.path.join(folder, "resources")
-    # copy icons
-    fontDir = os.path.dirname(__file__) + os.sep + 'webfonts' + os.sep
-    fontStore = os.path.join(folder, 'webfonts')
-    os.makedirs(fontStore)
-    fontStore += os.sep
-    shutil.copyfile(fontDir + 'fa-solid-900.woff2',
-                    fontStore + 'fa-solid-900.woff2')
-    shutil.copyfile(fontDir + 'fa-solid-900.ttf',
-                    fontStore + 'fa-solid-900.ttf')
-    # copy the rest
+    QDir().mkpath(dst)
+    QDir().mkpath(os.path.join(folder, "webfonts"))
+    # rewritten with the functions the export uses, so never linked
     src = os.path.join(os.path.dirname(__file__), "openlayers")
-    if not os.path.exists(dst):
-        shutil.copytree(src,dst)
+    shutil.copyfile(os.path.join(src, "qgis2web_expressions.js"),
+                    os.path.join(dst, "qgis2web_expressions.js"))
+
+
+def coreLibraries():
+    """
+    Returns the manifest of the libraries every OpenLayers map loads.
+    """
+    manifest = AssetManifest("openlayers")
+    for lib in ["functions.js", "ol.js", "ol.css", "ol.css.map",
+                "fontawesome-all.min.css", "ol-layerswitcher.css",
+                "ol-layerswitcher.js", "qgis2web.css", "Autolinker.min.js",
+                "Autolinker.min.js.map"]:
+        manifest.add(lib, os.path.join("resources", lib))
+    for font in ["fa-solid-900.woff2", "fa-solid-900.ttf"]:
+        manifest.add(os.path.join(os.pardir, "webfonts", font),
+                     os.path.join("webfonts", font))
+    return manifest
+
+
+def writeCoreLibraries(folder, feedback):
+    """
+    Writes the libraries every map loads, before the layers are exported,
+    returning their manifest.
+    """
+    feedback.showFeedback("Exporting libraries...")
+    manifest = coreLibraries()
+    manifest.write(folder)
     feedback.completeStep()
+    return manifest
 
 
-def writeHTMLstart(settings, controlCount, osmb, feedback):
+def writeLibraries(folder, feedback, osmb, clusterIndex=False, cog=False,
+                   layerSearch="None", geocode=False, matchCRS=False,
+                   written=None):
+    """
+    Writes the libraries the page loads, and no others, returning their
+    manifest. Those in the manifest written, from writeCoreLibraries(), are
+    not written again.
+    """
+    feedback.showFeedback("Exporting libraries...")
+    manifest = coreLibraries()
+    libraries = [(osmb != "", ["OSMBuildings-OL3.js"]),
+                 (clusterIndex, ["qgis2web_clusters.js"]),
+                 (cog, ["qgis2web_cog.js"]),
+                 (layerSearch != "None" and layerSearch != "",
+                  ["horsey.min.css", "ol3-search-layer.min.css",
+                   "horsey.min.js", "ol3-search-layer.js"]),
+                 (geocode, ["ol-geocoder.min.css", "ol-geocoder.js"]),
+                 (matchCRS, ["proj4.js"])]
+    for used, libs in libraries:
+        if used:
+            for lib in libs:
+                manifest.add(lib, os.path.join("resources", lib))
+    manifest.write(folder, written)
+    feedback.completeStep()
+    return manifest
+
+
+def writeHTMLstart(settings, controlCount, osmb, feedback, clusterIndex=False,
+                   cog=False):
     feedback.showFeedback("Writing HTML...")
     jsAddress = """<script src="./resources/functions.js"></script>"""
     cssAddress = """<link rel="stylesheet" href="./resources/ol.css">"""
     jsAddress += """
         <script src="./resources/ol.js"></script>"""
     cssAddress += """
-        <link rel="stylesheet" href="resources/fontawesome-all.min.css">"""
+        <link rel="stylesheet" href="resources/fontawesome-all.min.css">
+        <link rel="stylesheet" href="styles/legend.css">"""
     if osmb != "":
         jsAddress += """
         <script src="resources/OSMBuildings-OL3.js"></script>"""
+    if clusterIndex:
+        jsAddress += """
+        <script src="resources/qgis2web_clusters.js"></script>"""
+    if cog:
+        jsAddress += """
+        <script src="resources/qgis2web_cog.js"></script>"""
     feedback.completeStep()
     return (jsAddress, cssAddress, controlCount)
 
@@ -13,7 +13,10 @@ from qgis.core import (QgsProject,
                        QgsCoordinateReferenceSystem,
                        QgsCoordinateTransform,
                        QgsWkbTypes)
-from qgis2web.utils import safeName, is25d, BLEND_MODES
+from qgis2web.utils import (safeName, is25d, BLEND_MODES, layerFeatures,
+                            checkCancelled)
+from qgis2web.legendSprite import legendIcon
+from qgis2web.bakedSymbology import BAKED_CLASS, BAKED_ROTATION
 
 try:
     from vector_tiles_reader.plugin.util.tile_json import TileJSON
@@ -38,15 +41,26 @@ class LegendItem:
     
 def writeLayersAndGroups(layers, groups, visible, interactive, folder, popup,
                          settings, json, matchCRS, clustered, getFeatureInfo, baseMap,
-                         iface, restrictToExtent, extent, bounds, authid):
+                         iface, restrictToExtent, extent, bounds, authid,
+                         clusterIndex=None, rasterExports=None,
+                         bakedSymbology=None):
 
     canvas = iface.mapCanvas()
     layerVars = ""
     layer_names_id = {}
     vtLayers = []
+    if clusterIndex is None:
+        clusterIndex = [False] * len(layers)
+    if rasterExports is None:
+        rasterExports = {}
+    if bakedSymbology is None:
+        bakedSymbology = [False] * len(layers)
     for count, (layer, encode2json,
-                cluster, info, baseMap) in enumerate(zip(layers, json, clustered,
-                                                getFeatureInfo, baseMap)):
+                cluster, info, baseMap,
+                precomputed) in enumerate(zip(layers, json, clustered,
+                                              getFeatureInfo, baseMap,
+                                              clusterIndex)):
+        checkCancelled()
         layer_names_id[layer.id()] = str(count)
         if is25d(layer, canvas, restrictToExtent, extent):
             pass
@@ -55,7 +69,7 @@ def writeLayersAndGroups(layers, groups, visible, interactive, folder, popup,
              vtLayers) = layerToJavascript(iface, layer, encode2json, matchCRS,
                                            interactive[count], cluster, info,
                                            restrictToExtent, extent, count,
-                                           vtLayers)
+                                           vtLayers, precomputed, rasterExports)
             layerVars += "\n" + "\n".join([layerVar])
     (groupVars, groupedLayers) = buildGroups(groups, qms, layer_names_id)
     (mapLayers, layerObjs, osmb) = layersAnd25d(layers, canvas,
@@ -76,7 +90,8 @@ def writeLayersAndGroups(layers, groups, visible, interactive, folder, popup,
     fieldImages = ""
     fieldLabels = ""
     blend_mode = ""
-    for count, (layer, labels) in enumerate(zip(layers, popup)):
+    for count, (layer, labels, baked) in enumerate(zip(layers, popup,
+                                                       bakedSymbology)):
         vts = layer.customProperty("VectorTilesReader/vector_tile_url")
         sln = safeName(layer.name()) + "_" + str(count)
         if (layer.type() == layer.VectorLayer and
@@ -86,7 +101,7 @@ def writeLayersAndGroups(layers, groups, visible, interactive, folder, popup,
                 not is25d(layer, canvas, restrictToExtent, extent)):
             (fieldLabels, fieldAliases, fieldImages,
              blend_mode) = getPopups(layer, labels, sln, fieldLabels,
-                                     fieldAliases, fieldImages)
+                                     fieldAliases, fieldImages, baked)
     path = os.path.join(folder, "layers", "layers.js")
     with codecs.open(path, "w", "utf-8") as f:
         if matchCRS:
@@ -107,7 +122,7 @@ def writeLayersAndGroups(layers, groups, visible, interactive, folder, popup,
 
 def layerToJavascript(iface, layer, encode2json, matchCRS, interactive,
                       cluster, info, restrictToExtent, extent, count,
-                      vtLayers):
+                      vtLayers, precomputed=False, rasterExports=None):
     (minResolution, maxResolution) = getScaleRes(layer)
     layerName = safeName(layer.name()) + "_" + str(count)
     rawName = layer.name()
@@ -139,10 +154,15 @@ def layerToJavascript(iface, layer, encode2json, matchCRS, interactive,
             return getWFS(layer, layerName, layerAttr, interactive, cluster,
                           minResolution, maxResolution), vtLayers
         else:
+            if precomputed:
+                projection = getProjection(iface, matchCRS)
+            else:
+                projection = None
             return getJSON(layerName, crsConvert, layerAttr, interactive,
                            cluster, pointLayerType, minResolution,
                            maxResolution, hmRadius, hmRamp, hmWeight,
-                           hmWeightMax, renderer, layer), vtLayers
+                           hmWeightMax, renderer, layer,
+                           projection), vtLayers
     elif layer.type() == layer.RasterLayer:
         if layer.providerType().lower() == "wms":
             source = layer.source()
@@ -159,8 +179,23 @@ def layerToJavascript(iface, layer, encode2json, matchCRS, interactive,
                 return getWMS(source, layer, layerAttr, layerName, opacity,
                               minResolution, maxResolution, info), vtLayers
         elif layer.providerType().lower() == "gdal":
+            raster = (rasterExports or {}).get(layerName, {})
+            if "cog" in raster:
+                return getRasterCOG(layer, layerName, layerAttr,
+                                    minResolution, maxResolution,
+                                    raster), vtLayers
+            if raster and "image" not in raster:
+                return getRasterTiles(layer, layerName, layerAttr,
+                                      minResolution, maxResolution,
+                                      raster), vtLayers
+            if raster and raster["image"] is None:
+                # the image could not be exported, the layer is left empty
+                return '''var lyr_%s = new ol.layer.Image({
+        title: '%s'
+    });''' % (layerName, layer.name().replace("'", "\\'")), vtLayers
             return getRaster(iface, layer, layerName, layerAttr, minResolution,
-                             maxResolution, matchCRS), vtLayers
+                             maxResolution, matchCRS,
+                             raster.get("image")), vtLayers
 
 
 def getScaleRes(layer):
@@ -192,7 +227,7 @@ def build25d(canvas, layer, count):
     renderContext = QgsRenderContext.fromMapSettings(canvas.mapSettings())
     fields = layer.fields()
     renderer.startRender(renderContext, fields)
-    for feat in layer.getFeatures():
+    for feat in layerFeatures(layer):
         if isinstance(renderer, QgsCategorizedSymbolRenderer):
             classAttribute = renderer.classAttribute()
             attrValue = feat.attribute(classAttribute)
@@ -302,11 +337,17 @@ def getGroups(canvas, layers, restrictToExtent, extent, groupedLayers):
     return (group_and_no_group_list, usedGroups)
 
 
-def getPopups(layer, labels, sln, fieldLabels, fieldAliases, fieldImages):
+def getPopups(layer, labels, sln, fieldLabels, fieldAliases, fieldImages,
+              baked=False):
     fieldList = layer.fields()
     aliasFields = ""
     imageFields = ""
     labelFields = ""
+    if baked:
+        # the baked symbology is not shown in popups
+        labels = dict(labels)
+        labels[BAKED_CLASS] = "hidden field"
+        labels[BAKED_ROTATION] = "hidden field"
     for field, label in zip(labels.keys(), labels.values()):
         labelFields += "'%(field)s': '%(label)s', " % (
             {"field": field.replace("'", "\\'"), "label": label})
@@ -376,8 +417,14 @@ function get%(n)sJson(geojson) {
 
 def getJSON(layerName, crsConvert, layerAttr, interactive, cluster,
             pointLayerType, minResolution, maxResolution, hmRadius, hmRamp,
-            hmWeight, hmWeightMax, renderer, layer):
-    layerCode = '''var format_%(n)s = new ol.format.GeoJSON();
+            hmWeight, hmWeightMax, renderer, layer, clusterProjection=None):
+    if clusterProjection is not None:
+        layerCode = getClusterIndexSource(layerName, crsConvert, layerAttr,
+                                          clusterProjection)
+        # clusters are already in the source
+        cluster = False
+    else:
+        layerCode = '''var format_%(n)s = new ol.format.GeoJSON();
 var features_%(n)s = format_%(n)s.readFeatures(json_%(n)s, %(crs)s);
 var jsonSource_%(n)s = new ol.source.Vector({
     attributions: '%(layerAttr)s',
@@ -406,12 +453,14 @@ jsonSource_%(n)s.addFeatures(features_%(n)s);''' % {"n": layerName,
                 interactive: %(int)s,''' % {"n": layerName,
                                             "int": str(interactive).lower(),
                                             "name": layer.name().replace("'", "\\'")}
+    elif clusterProjection is not None:
+        layerCode += writeHeatmapGrid(hmRadius, hmRamp, layerName)
     else:
         layerCode += writeHeatmap(hmRadius, hmRamp, hmWeight, hmWeightMax)
     if isinstance(renderer, QgsSingleSymbolRenderer):
         layerCode += '''
-                title: '<img src="styles/legend/%(icon)s.png" /> %(name)s'
-            });''' % {"icon": layerName,
+                title: '%(icon)s %(name)s'
+            });''' % {"icon": legendIcon(layerName),
                       "name": layer.name().replace("'", "\\'")}              
     elif isinstance(renderer, QgsCategorizedSymbolRenderer):
         layerCode += getLegend(renderer.categories(), layer, layerName)
@@ -426,13 +475,38 @@ jsonSource_%(n)s.addFeatures(features_%(n)s);''' % {"n": layerName,
     return layerCode
 
 
+def getClusterIndexSource(layerName, crsConvert, layerAttr, projection):
+    layerCode = '''var format_%(n)s = new ol.format.GeoJSON();
+var jsonSource_%(n)s = new ol.source.Vector({
+    attributions: '%(layerAttr)s',
+    strategy: function(extent, resolution) {
+        var projection = ol.proj.get('%(proj)s');
+        var bbox = ol.proj.transformExtent(extent, projection, 'EPSG:4326');
+        var zoom = qgis2webClusters.zoomForResolution(
+            resolution * projection.getMetersPerUnit());
+        var changed = qgis2webClusters.load('%(n)s', zoom, bbox,
+                                            function(json) {
+            jsonSource_%(n)s.addFeatures(
+                format_%(n)s.readFeatures(json, %(crs)s));
+        });
+        if (changed) {
+            jsonSource_%(n)s.clear(true);
+        }
+        return [];
+    }
+});''' % {"n": layerName, "crs": crsConvert, "layerAttr": layerAttr,
+          "proj": projection}
+    return layerCode
+
+
 def getLegend(subitems, layer, layerName):
     icons = ""
     for count, subitem in enumerate(subitems):
         text = subitem.label().replace("'", "\\'")
         icons += ("""\\
-    <img src="styles/legend/%(icon)s_%(count)s.png" /> %(text)s<br />""" %
-                  {"icon": layerName, "count": count, "text": text})
+    %(icon)s %(text)s<br />""" %
+                  {"icon": legendIcon("%s_%d" % (layerName, count)),
+                   "text": text})
     legend = '''
     title: '%(name)s<br />%(icons)s' ''' % {"icons": icons, 
                                             "name": layer.name().replace("'", "\\'")}
@@ -492,6 +566,12 @@ def getHeatmap(layer, renderer):
     return (pointLayerType, hmRadius, hmRamp, hmWeight, hmWeightMax)
 
 
+def getProjection(iface, matchCRS):
+    if matchCRS:
+        return iface.mapCanvas().mapSettings().destinationCrs().authid()
+    return "EPSG:3857"
+
+
 def getCRS(iface, matchCRS):
     if matchCRS:
         mapCRS = iface.mapCanvas().mapSettings().destinationCrs().authid()
@@ -522,6 +602,18 @@ def writeHeatmap(hmRadius, hmRamp, hmWeight, hmWeightMax):
     return layerCode
 
 
+def writeHeatmapGrid(hmRadius, hmRamp, layerName):
+    layerCode = '''
+                radius: %(hmRadius)d * 2,
+                gradient: %(hmRamp)s,
+                blur: 15,
+                shadow: 250,
+    weight: function(feature){
+        return feature.get('weight') / qgis2webClusters.maxWeight('%(n)s');
+    },''' % {"hmRadius": hmRadius, "hmRamp": hmRamp, "n": layerName}
+    return layerCode
+
+
 def getXYZ(layerName, rawName, opacity, minResolution, maxResolution,
            layerAttr, url, baseMap):
     layerCode = """
@@ -627,7 +719,9 @@ def getWMS(source, layer, layerAttr, layerName, opacity, minResolution,
 
 
 def getRaster(iface, layer, layerName, layerAttr, minResolution, maxResolution,
-              matchCRS):
+              matchCRS, image=None):
+    if image is None:
+        image = layerName + ".png"
     crsSrc = layer.crs()
     projectCRS = iface.mapCanvas().mapSettings().destinationCrs()
     if not (matchCRS and crsSrc == projectCRS):
@@ -662,13 +756,14 @@ def getRaster(iface, layer, layerName, layerAttr, minResolution, maxResolution,
         %(minRes)s
         %(maxRes)s
         source: new ol.source.ImageStatic({
-            url: "./layers/%(n)s.png",
+            url: "./layers/%(image)s",
             attributions: '%(layerAttr)s',
             projection: '%(mapCRS)s',
             alwaysInRange: true,
             imageExtent: %(extent)s
         })
     });''' % {"n": layerName,
+                "image": image,
                 "extent": sExtent,
                 "name": layer.name().replace("'", "\\'"),
                 "minRes": minResolution,
@@ -676,3 +771,68 @@ def getRaster(iface, layer, layerName, layerAttr, minResolution, maxResolution,
                 "mapCRS": mapCRS,
                 "layerAttr": layerAttr,
                 "title": title}
+
+
+def getRasterTiles(layer, layerName, layerAttr, minResolution, maxResolution,
+                   grid):
+    legendSymbologyItems = layer.legendSymbologyItems()
+    subitems = [LegendItem(item[0], item[1]) for item in legendSymbologyItems]
+    title = getLegend(subitems, layer, layerName)
+    if "resolutions" in grid:
+        tileGrid = """
+            tileGrid: new ol.tilegrid.TileGrid({
+                extent: %s,
+                origin: %s,
+                resolutions: %s
+            }),""" % (grid["extent"], grid["origin"], grid["resolutions"])
+    else:
+        tileGrid = """
+            minZoom: %d,
+            maxZoom: %d,""" % (grid["minZoom"], grid["maxZoom"])
+    return '''var lyr_%(n)s = new ol.layer.Tile({
+        opacity: 1,
+        %(title)s,
+        %(minRes)s
+        %(maxRes)s
+        source: new ol.source.XYZ({
+            url: "./layers/%(n)s/{z}/{x}/{y}.png",
+            attributions: '%(layerAttr)s',
+            projection: '%(mapCRS)s',%(tileGrid)s
+        })
+    });''' % {"n": layerName,
+                "title": title,
+                "minRes": minResolution,
+                "maxRes": maxResolution,
+                "mapCRS": grid["projection"],
+                "layerAttr": layerAttr,
+                "tileGrid": tileGrid}
+
+
+def getRasterCOG(layer, layerName, layerAttr, minResolution, maxResolution,
+                 raster):
+    legendSymbologyItems = layer.legendSymbologyItems()
+    subitems = [LegendItem(item[0], item[1]) for item in legendSymbologyItems]
+    title = getLegend(subitems, layer, layerName)
+    return '''var lyr_%(n)s = new ol.layer.Tile({
+        opacity: 1,
+        %(title)s,
+        %(minRes)s
+        %(maxRes)s
+        source: new ol.source.XYZ({
+            attributions: '%(layerAttr)s',
+            projection: 'EPSG:3857',
+            minZoom: %(minZoom)d,
+            maxZoom: %(maxZoom)d,
+            tileUrlFunction: function(tileCoord) {
+                return tileCoord.join('/');
+            },
+            tileLoadFunction: qgis2webCOG.olTileLoad("./layers/%(cog)s")
+        })
+    });''' % {"n": layerName,
+                "title": title,
+                "minRes": minResolution,
+                "maxRes": maxResolution,
+                "layerAttr": layerAttr,
+                "minZoom": raster["minZoom"],
+                "maxZoom": raster["maxZoom"],
+                "cog": raster["cog"]}
@@ -1,5 +1,3 @@
-from . import xmltodict
-
 from qgis2web.olStyleScripts import getStrokeStyle
 
 
@@ -675,6 +673,7 @@ def getGrid(project):
     grid = ""
     if project.readBoolEntry("Grid", "/Enabled", False)[0]:
         stroke = project.readEntry("Grid", "/LineSymbol", "")[0]
+        from . import xmltodict
         strokeDict = xmltodict.parse(stroke)
         symbol = strokeDict["symbol"]
         layer = symbol["layer"]
@@ -709,7 +708,12 @@ def getM2px(mapUnitsLayers):
     m2px = ""
     if len(mapUnitsLayers) > 0:
         m2px = """
+var m2pxResolution, m2pxValue;
 function m2px(m) {
+    var resolution = map.getView().getResolution();
+    if (resolution === m2pxResolution) {
+        return m2pxValue;
+    }
     var centerLatLng = map.getView().getCenter();
     var pointC = map.getPixelFromCoordinate(centerLatLng);
     var pointX = [pointC[0] + 100, pointC[1]];
@@ -719,6 +723,8 @@ function m2px(m) {
     var distanceX = lineX.getLength() / 100;
     reciprocal = 1 / distanceX;
     px = Math.ceil(reciprocal);
+    m2pxResolution = resolution;
+    m2pxValue = px;
     return px;
 }"""
     return m2px
@@ -16,32 +16,39 @@ from qgis.core import (QgsSingleSymbolRenderer,
                        QgsSimpleLineSymbolLayer,
                        QgsSimpleFillSymbolLayer,
                        QgsLinePatternFillSymbolLayer,
-                       QgsSymbolLayerUtils,
                        QgsMapLayer)
-from qgis.PyQt.QtGui import QPixmap, QImage
-from qgis2web.exp2js import compile_to_file
-from qgis2web.utils import safeName, getRGBAColor, handleHiddenField, TYPE_MAP
-
-
-def exportStyles(layers, folder, clustered, feedback):
+from qgis.PyQt.QtGui import QImage
+from qgis2web.exp2js import compile_to_file, write_expressions
+from qgis2web.legendSprite import LegendSprite
+from qgis2web.markerStore import MarkerStore, MARKER_FORMATS, colorizeSvg
+from qgis2web.bakedSymbology import BAKED_CLASS, bakedRotation
+from qgis2web.utils import (safeName, getRGBAColor, handleHiddenField,
+                            getCategoryLookup, getRangeLookup, TYPE_MAP,
+                            symbolPreviewImage, checkCancelled, reportStage)
+
+
+def exportStyles(layers, folder, clustered, feedback,
+                 markerFormat=MARKER_FORMATS[0], bakedSymbology=None):
     stylesFolder = os.path.join(folder, "styles")
     QDir().mkpath(stylesFolder)
-    legendFolder = os.path.join(stylesFolder, "legend")
-    QDir().mkpath(legendFolder)
+    legendSprite = LegendSprite()
+    markerStore = MarkerStore(stylesFolder, "styles/", markerFormat)
     vtStyles = {}
     mapUnitLayers = []
-    for count, (layer, cluster) in enumerate(zip(layers, clustered)):
+    if bakedSymbology is None:
+        bakedSymbology = [False] * len(layers)
+    for count, (layer, cluster, baked) in enumerate(zip(layers, clustered,
+                                                        bakedSymbology)):
+        checkCancelled()
         sln = safeName(layer.name()) + "_" + str(count)
 
         # if raster layer
         if layer.type() == QgsMapLayer.RasterLayer and layer.dataProvider().name() == "gdal":
             legendSymbologyItems = layer.legendSymbologyItems() # simbology items list
             for count, (name, color) in enumerate(legendSymbologyItems):
-                pixmap = QPixmap(16, 16)
-                pixmap.fill(color)  # fill with the legend color
-                icon_name = sln + "_" + str(count) + ".png"
-                print(icon_name)
-                pixmap.save(os.path.join(legendFolder, icon_name))
+                image = QImage(16, 16, QImage.Format_ARGB32)
+                image.fill(color)  # fill with the legend color
+                legendSprite.add(sln + "_" + str(count), image)
         
         # if not vector layer      
         if layer.type() != layer.VectorLayer:
@@ -50,7 +57,9 @@ def exportStyles(layers, folder, clustered, feedback):
         setPattern = ""
         vts = layer.customProperty("VectorTilesReader/vector_tile_url")
         labelText = getLabels(layer, folder, sln)
+        labels = vts is None
         defs = "var size = 0;\nvar placement = 'point';"
+        defs += "\nvar styleCache_%s = {};" % sln
 
         renderer = layer.renderer()
         layer_alpha = layer.opacity()
@@ -58,29 +67,29 @@ def exportStyles(layers, folder, clustered, feedback):
         try:
             if isinstance(renderer, QgsSingleSymbolRenderer):
                 (style, pattern, setPattern, value,
-                 useMapUnits) = singleSymbol(renderer, stylesFolder,
-                                             layer_alpha, sln, legendFolder,
-                                             layer, feedback)
+                 useMapUnits) = singleSymbol(renderer, markerStore,
+                                             layer_alpha, sln, legendSprite,
+                                             layer, feedback, baked)
             elif isinstance(renderer, QgsCategorizedSymbolRenderer):
                 (style, pattern, setPattern, value, defs,
                  useMapUnits) = categorized(defs, sln, layer, renderer,
-                                            legendFolder, stylesFolder,
-                                            layer_alpha, feedback)
+                                            legendSprite, markerStore,
+                                            layer_alpha, feedback, baked)
             elif isinstance(renderer, QgsGraduatedSymbolRenderer):
-                (style, pattern, setPattern, value,
-                 useMapUnits) = graduated(layer, renderer, legendFolder, sln,
-                                          stylesFolder, layer_alpha, feedback)
+                (style, pattern, setPattern, value, defs,
+                 useMapUnits) = graduated(defs, layer, renderer, legendSprite,
+                                          sln, markerStore, layer_alpha,
+                                          feedback, baked)
             elif isinstance(renderer, QgsRuleBasedRenderer):
                 (style, pattern, setPattern, value,
-                 useMapUnits) = ruleBased(renderer, folder, stylesFolder, legendFolder,
-                                          layer_alpha, sln, layer, feedback)
+                 useMapUnits) = ruleBased(renderer, folder, markerStore, legendSprite,
+                                          layer_alpha, sln, layer, feedback,
+                                          baked)
             else:
                 value = "''"
                 style = """
-    var style = [ new ol.style.Style({
-        text: createTextStyle(feature, resolution, labelText, labelFont,
-                              labelFill, placement, bufferColor, bufferWidth)
-    })];"""
+    var style = [];"""
+                labels = True
                 useMapUnits = False
 
             if useMapUnits:
@@ -94,7 +103,7 @@ def exportStyles(layers, folder, clustered, feedback):
                 geom = TYPE_MAP[layer.wkbType()].replace("Multi", "")
                 style = getStyle(style, cluster, labelRes, labelText,
                                  sln, size, face, color, bufferColor,
-                                 bufferWidth, value, geom)
+                                 bufferWidth, value, geom, labels)
             else:
                 style = "''"
         except Exception:
@@ -140,6 +149,10 @@ var style_%(name)s = function(feature, resolution) {
     %(style)s;
 }''' % {"defs": defs, "pattern": pattern, "name": styleName,
                     "style": styleString, "setPattern": setPattern})
+    with reportStage("legends"):
+        legendSprite.save(stylesFolder)
+    write_expressions(os.path.join(folder, "resources",
+                                   "qgis2web_expressions.js"))
     return mapUnitLayers
 
 
@@ -220,7 +233,7 @@ def getLabelFormat(layer):
     return (labelRes, size, face, color, bufferColor, bufferWidth)
 
 
-def getLegendIconAndAnchors(symbol, sln, legendFolder):
+def getLegendIconAndAnchors(symbol, sln, legendSprite):
     left_icon_space = []
     right_icon_space = []
     top_icon_space = []
@@ -278,55 +291,51 @@ def getLegendIconAndAnchors(symbol, sln, legendFolder):
 
     symbol_size = QSize(icon_width, icon_height)
 
-    legendIcon = QgsSymbolLayerUtils.symbolPreviewPixmap(symbol, symbol_size)
-    icon_name = sln + ".png"
-    icon_path = os.path.join(legendFolder, icon_name)
-    legendIcon.save(icon_path)
+    image = symbolPreviewImage(symbol, symbol_size)
 
-    if legendIcon:
+    if not image.isNull():
         left_trim = int(icon_width / 2 - max_left_icon)
         right_trim = int(icon_width / 2 - max_right_icon)
         top_trim = int(icon_height / 2 - max_top_icon)
         bottom_trim = int(icon_height / 2 - max_bottom_icon)
 
-        image = QImage(icon_path)
-
         cropped_width = image.width() - left_trim - right_trim
         cropped_height = image.height() - top_trim - bottom_trim
 
         cropped_image = image.copy(left_trim, top_trim, cropped_width, cropped_height)
-        cropped_image.save(icon_path)
+        legendSprite.add(sln, cropped_image)
 
 
-def singleSymbol(renderer, stylesFolder, layer_alpha, sln, legendFolder,
-                 layer, feedback):
+def singleSymbol(renderer, markerStore, layer_alpha, sln, legendSprite,
+                 layer, feedback, baked=False):
     symbol = renderer.symbol()
     (style, pattern, setPattern,
-     useMapUnits) = getSymbolAsStyle(symbol, stylesFolder,
+     useMapUnits) = getSymbolAsStyle(symbol, markerStore,
                                      layer_alpha, renderer, sln, layer,
-                                     feedback)
-    style = "var style = " + style
+                                     feedback, baked)
+    style = "var style = " + cacheStyle(style, sln, 0)
 
-    getLegendIconAndAnchors(symbol, sln, legendFolder)
+    getLegendIconAndAnchors(symbol, sln, legendSprite)
     
     value = ''
     return (style, pattern, setPattern, value, useMapUnits)
 
 
-def categorized(defs, sln, layer, renderer, legendFolder, stylesFolder,
-                layer_alpha, feedback):
-    defs += """
+def categorized(defs, sln, layer, renderer, legendSprite, markerStore,
+                layer_alpha, feedback, baked=False):
+    categoryFunction = """
 function categories_%s(feature, value, size, resolution, labelText,
                        labelFont, labelFill, bufferColor, bufferWidth,
                        placement) {
                 var valueStr = (value !== null && value !== undefined) ? value.toString() : 'default';
-                switch(valueStr) {""" % sln
+                switch(category_%s(valueStr)) {""" % (sln, sln)
     cats = []
+    values = []
     useAnyMapUnits = False
     for cnt, cat in enumerate(renderer.categories()):
         symbol = cat.symbol()
         
-        getLegendIconAndAnchors(symbol, sln + "_" + str(cnt), legendFolder)
+        getLegendIconAndAnchors(symbol, sln + "_" + str(cnt), legendSprite)
         
         if cat.value() is not None and cat.value() != "":
             value = cat.value()
@@ -335,20 +344,22 @@ function categories_%s(feature, value, size, resolution, labelText,
                 value_str = str(int(value))
             else:
                 value_str = str(value)
-            categoryStr = "case '%s':" % value_str.replace("'", "\\'")
+            values.append(value_str)
         else:
-            categoryStr = "default:"
+            values.append(None)
+        categoryStr = "case %d:" % cnt
         (style, pattern, setPattern,
-         useMapUnits) = (getSymbolAsStyle(symbol, stylesFolder,
+         useMapUnits) = (getSymbolAsStyle(symbol, markerStore,
                                           layer_alpha, renderer, sln, layer,
-                                          feedback))
+                                          feedback, baked))
         if useMapUnits:
             useAnyMapUnits = True
         categoryStr += '''
                     return %s;
-                    break;''' % style
+                    break;''' % cacheStyle(style, sln, cnt)
         cats.append(categoryStr)
-    defs += "\n".join(cats) + "}};"
+    defs += getCategoryLookup("category_" + sln, values)
+    defs += categoryFunction + "\n".join(cats) + "}};"
     style = """
     var style = categories_%s(feature, value, size, resolution, labelText,
                             labelFont, labelFill, bufferColor,
@@ -357,38 +368,42 @@ function categories_%s(feature, value, size, resolution, labelText,
     return (style, pattern, setPattern, value, defs, useAnyMapUnits)
 
 
-def graduated(layer, renderer, legendFolder, sln, stylesFolder, layer_alpha,
-              feedback):
+def graduated(defs, layer, renderer, legendSprite, sln, markerStore,
+              layer_alpha, feedback, baked=False):
     # cluster = False
     ranges = []
-    elseif = ""
     useAnyMapUnits = False
     for cnt, ran in enumerate(renderer.ranges()):
         symbol = ran.symbol()
         
-        getLegendIconAndAnchors(symbol, sln + "_" + str(cnt), legendFolder)
+        getLegendIconAndAnchors(symbol, sln + "_" + str(cnt), legendSprite)
 
         (symbolstyle, pattern, setPattern,
-         useMapUnits) = getSymbolAsStyle(symbol, stylesFolder,
+         useMapUnits) = getSymbolAsStyle(symbol, markerStore,
                                          layer_alpha, renderer, sln, layer,
-                                         feedback)
-        ranges.append("""%sif (value >= %f && value <= %f) {
-            style = %s
-                    }""" % (elseif, ran.lowerValue(), ran.upperValue(),
-                            symbolstyle))
-        elseif = " else "
+                                         feedback, baked)
+        ranges.append("""
+                case %d:
+                    style = %s;
+                    break;""" % (cnt, cacheStyle(symbolstyle, sln, cnt)))
         if useMapUnits:
             useAnyMapUnits = True
-    style = "".join(ranges)
+    defs += getRangeLookup("range_" + sln,
+                           [(ran.lowerValue(), ran.upperValue())
+                            for ran in renderer.ranges()])
+    style = """
+    var style;
+    switch(range_%s(value)) {%s
+    }""" % (sln, "".join(ranges))
     value = getValue(layer, renderer)
-    return (style, pattern, setPattern, value, useAnyMapUnits)
+    return (style, pattern, setPattern, value, defs, useAnyMapUnits)
 
 
-def ruleBased(renderer, folder, stylesFolder, legendFolder, layer_alpha, sln, layer,
-              feedback):
+def ruleBased(renderer, folder, markerStore, legendSprite, layer_alpha, sln, layer,
+              feedback, baked=False):
     # cluster = False
     template = """
-        function rules_%s(feature, value) {
+        function rules_%s(feature, value, resolution) {
             var context = {
                 feature: feature,
                 variables: {}
@@ -399,8 +414,19 @@ def ruleBased(renderer, folder, stylesFolder, legendFolder, layer_alpha, sln, la
                 return %s;
             }
         }
-        var style = rules_%s(feature, value);
+        var style = rules_%s(feature, value, resolution);
         """
+    if baked:
+        # the rule of each feature was found by QGIS at export
+        template = """
+        function rules_%%s(feature, value, resolution) {
+            switch(feature.get('%s')) {%%s
+                default:
+                    return %%s;
+            }
+        }
+        var style = rules_%%s(feature, value, resolution);
+        """ % BAKED_CLASS
     elsejs = "[]"
     js = ""
     root_rule = renderer.rootRule()
@@ -411,24 +437,31 @@ def ruleBased(renderer, folder, stylesFolder, legendFolder, layer_alpha, sln, la
     for cnt, rule in enumerate(rules):
         symbol = rule.symbol()
 
-        getLegendIconAndAnchors(symbol, sln + "_" + str(cnt), legendFolder)
+        getLegendIconAndAnchors(symbol, sln + "_" + str(cnt), legendSprite)
 
         (styleCode, pattern, setPattern,
-         useMapUnits) = getSymbolAsStyle(symbol, stylesFolder, layer_alpha,
-                                         renderer, sln, layer, feedback)
+         useMapUnits) = getSymbolAsStyle(symbol, markerStore, layer_alpha,
+                                         renderer, sln, layer, feedback,
+                                         baked)
+        styleCode = cacheStyle(styleCode, sln, cnt)
         name = "".join((sln, "rule", str(cnt)))
         exp = rule.filterExpression()
-        if rule.isElse():
+        if baked:
+            js += """
+                case %d:
+                    return %s;""" % (cnt, styleCode)
+        elif rule.isElse():
             elsejs = styleCode
             continue
-        name = compile_to_file(exp, name, "OpenLayers3", expFile)
-        js += """
+        else:
+            name = compile_to_file(exp, name, "OpenLayers3", expFile)
+            js += """
                     %s (%s(context)) {
                       return %s;
                     }
                     """ % (ifelse, name, styleCode)
-        js = js.strip()
-        ifelse = "else if"
+            js = js.strip()
+            ifelse = "else if"
         if useMapUnits:
             useAnyMapUnits = True
     value = ("var value = '';")
@@ -442,8 +475,25 @@ def getValue(layer, renderer):
     return value
 
 
+def cacheStyle(style, sln, key):
+    """
+    Makes the style array of a class be created on first use and then
+    reused, for as long as the cluster size and map resolution it depends
+    on stay the same. Styles reading feature attributes are left as they are.
+    """
+    if re.search(r"\bfeature\b", style):
+        return style
+    key = "'%s'" % key
+    if re.search(r"\bsize\b", style):
+        key += " + '|' + size"
+    if "m2px(" in style:
+        key += " + '|' + resolution"
+    return "(styleCache_%s[%s] || (styleCache_%s[%s] = %s))" % (sln, key, sln,
+                                                               key, style)
+
+
 def getStyle(style, cluster, labelRes, labelText, sln, size,
-             face, color, bufferColor, bufferWidth, value, geom):
+             face, color, bufferColor, bufferWidth, value, geom, labels=True):
     placement = "point"
     if geom == "LineString":
         placement = "line"
@@ -465,8 +515,8 @@ def getStyle(style, cluster, labelRes, labelText, sln, size,
     var offsetY = 10;
     var feature
 	var value
-    var clusteredFeatures = feature.get("features");
-    size = clusteredFeatures.length;
+    var clusteredFeatures = feature.get("features") || [feature];
+    size = feature.get("cluster") ? feature.get("point_count") : clusteredFeatures.length;
     if (size == 1) { // If cluster has one feature
         var feature = clusteredFeatures[0];
         value = clusteredFeatures[0].get("%(value)s");
@@ -487,7 +537,7 @@ def getStyle(style, cluster, labelRes, labelText, sln, size,
 			greenComponent = Math.floor(210 * (1 - (relativeSize - 0.5) / 0.5));
 		}
 		var color = `rgba(${redComponent}, ${greenComponent}, ${blueComponent}, 0.75)`;
-		return [
+		return %(cache)s['cluster|' + size] || (%(cache)s['cluster|' + size] = [
 			new ol.style.Style({
 				image: new ol.style.Circle({
 					radius: radius + 4,
@@ -512,9 +562,9 @@ def getStyle(style, cluster, labelRes, labelText, sln, size,
 					placement: placement
 				})
 			})
-		];
+		]);
 	}
-    %(style)s;\n''' % {"style": style, "labelRes": labelRes, "label": labelText, "size": size, "face": face,
+    %(style)s;\n''' % {"style": style, "cache": "styleCache_" + sln, "labelRes": labelRes, "label": labelText, "size": size, "face": face,
             "labelFill": color, "bufferColor": bufferColor,
             "bufferWidth": bufferWidth, "value": value}
     else:
@@ -535,15 +585,24 @@ def getStyle(style, cluster, labelRes, labelText, sln, size,
                     "face": face, "labelFill": color, "value": value,
                     "bufferColor": bufferColor, "bufferWidth": bufferWidth}
 
+    if labels:
+        this_style += '''
+    if (style) {
+        var labelStyle = getLabelStyle(feature, resolution, labelText,
+                                       labelFont, labelFill, placement,
+                                       bufferColor, bufferWidth);
+        if (labelStyle) {
+            style = style.concat(labelStyle);
+        }
+    }'''
     this_style += '''
     return style;
-}''' % {"cache": "styleCache_" + sln, "size": size, "face": face,
-        "color": color}
+}'''
     return this_style
 
 
-def getSymbolAsStyle(symbol, stylesFolder, layer_transparency, renderer, sln,
-                     layer, feedback):
+def getSymbolAsStyle(symbol, markerStore, layer_transparency, renderer, sln,
+                     layer, feedback, baked=False):
     styles = {}
     useMapUnits = False
     if layer_transparency == 0:
@@ -634,14 +693,6 @@ def getSymbolAsStyle(symbol, stylesFolder, layer_transparency, renderer, sln,
                 style = "image: %s" % style
         elif isinstance(sl, QgsSvgMarkerSymbolLayer):
             svg_path = sl.path()
-            base_filename = os.path.basename(svg_path)
-            filename, file_extension = os.path.splitext(base_filename)
-            # Check if the file already exists, if yes, append a progressive number
-            count = 0
-            while os.path.exists(os.path.join(stylesFolder, base_filename)):
-                count += 1
-                base_filename = f"{filename}_{count}{file_extension}"
-            path = os.path.join(stylesFolder, base_filename)
             svg = xml.etree.ElementTree.parse(svg_path).getroot()
             try:
                 svgWidth = svg.attrib["width"]
@@ -659,7 +710,7 @@ def getSymbolAsStyle(symbol, stylesFolder, layer_transparency, renderer, sln,
 
             if symbol.dataDefinedAngle().isActive():
                 if symbol.dataDefinedAngle().useExpression():
-                    rot = "0"
+                    rot = bakedRotation(symbol, baked) or "0"
                 else:
                     rot = "feature.get("
                     rot += symbol.dataDefinedAngle().expressionOrField()
@@ -667,23 +718,17 @@ def getSymbolAsStyle(symbol, stylesFolder, layer_transparency, renderer, sln,
             else:
                 rot = str(sl.angle() * 0.0174533)
                 
-            # save a colorized svg in the markers folder
+            # store a colorized svg, once per distinct content,
             # replacing "param(...)" with actual values from QGIS
             pColor = getRGBAColor(props["color"], alpha).strip("'")
             pOutline = getRGBAColor(props["outline_color"], alpha).strip("'")
-            with open(svg_path) as f:
-                s = f.read()
-                s = s.replace('param(fill)', pColor)
-                s = s.replace('param(fill-opacity)', '1')
-                s = s.replace('param(outline)', pOutline)
-                s = s.replace('param(outline-width)', str(float(props["outline_width"]) * 80))
-                s = s.replace('param(outline-opacity)', '1')
-            with open(path, 'w') as f:
-                f.write(s)
-        
+            s = colorizeSvg(svg_path, pColor, pOutline, props["outline_width"])
+            (path, svgWidth,
+             svgHeight) = markerStore.addSvg(s, math.floor(sl.size() * 3.8),
+                                             svgWidth, svgHeight)
+
             style = ("image: %s" %
-                     getIcon("styles/" + base_filename,
-                             sl.size(), svgWidth, svgHeight,
+                     getIcon(path, sl.size(), svgWidth, svgHeight,
                              rot, ax, ay))
         elif isinstance(sl, QgsFontMarkerSymbolLayer):
             char = sl.character()
@@ -761,18 +806,9 @@ def getSymbolAsStyle(symbol, stylesFolder, layer_transparency, renderer, sln,
             k = sl.renderingPass()
         else:
             k = i
-        if style != "":
-            style += ","
-        ts = ""
-        vts = layer.customProperty("VectorTilesReader/vector_tile_url")
-        if vts is None:
-            ts = """
-        text: createTextStyle(feature, resolution, labelText, labelFont,
-                              labelFill, placement, bufferColor,
-                              bufferWidth)"""
         styles[k] = '''new ol.style.Style({
-        %s%s
-    })''' % (style, ts)
+        %s
+    })''' % style
     return ("[ %s]" % ",".join(styles[s] for s in sorted(styles.keys())),
             pattern, setPattern, useMapUnits)
 
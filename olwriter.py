@@ -23,12 +23,17 @@ from qgis.core import (QgsProject,
                        QgsCoordinateTransform,
                        QgsRectangle,
                        QgsCsException)
-from qgis.PyQt.QtCore import Qt, QObject
-from qgis.PyQt.QtGui import QCursor
-from qgis.PyQt.QtWidgets import QApplication
-from qgis2web.utils import exportLayers, replaceInTemplate
+from qgis.PyQt.QtCore import QObject
+from qgis2web.utils import (exportLayers, replaceInTemplate,
+                            filesWritten, exportState, reportStage)
+from qgis2web.exportReport import ExportReport
+from qgis2web.exp2js import discard_expressions
+from qgis2web.pageTemplate import loadTemplate
+from qgis2web.assetBundler import bundlePage
 from qgis2web.olFileScripts import (writeFiles,
                                     writeHTMLstart,
+                                    writeLibraries,
+                                    writeCoreLibraries,
                                     writeLayerSearch,
                                     writeScriptIncludes)
 from qgis2web.olLayerScripts import writeLayersAndGroups
@@ -52,6 +57,10 @@ from qgis2web.olScriptStrings import (measureScript,
                                       #abstractControlScript
                                       )
 from qgis2web.olStyleScripts import exportStyles
+from qgis2web.bakedSymbology import hasBakedSymbology
+from qgis2web.pointClusters import (hasClusterIndex,
+                                    hasHeatmapGrid,
+                                    clusterZoomRange)
 from qgis2web.writer import (Writer,
                              WriterResult,
                              translator)
@@ -83,22 +92,33 @@ class OpenLayersWriter(Writer):
 
         feedback.showFeedback('Creating OpenLayers map...')
 
-        self.preview_file = self.writeOL(iface, feedback,
-                                         layers=self.layers,
-                                         groups=self.groups,
-                                         popup=self.popup,
-                                         visible=self.visible,
-                                         interactive=self.interactive,
-                                         json=self.json,
-                                         clustered=self.cluster,
-                                         getFeatureInfo=self.getFeatureInfo,
-                                         baseMap=self.baseMap,
-                                         settings=self.params,
-                                         folder=dest_folder,
-                                         exportRelatedList=self.exportRelated) # Pass exportRelated list
+        report = exportState.report = ExportReport(self.params)
+        try:
+            # what no other stage times: the page, its scripts and setup
+            with report.stage("html"):
+                self.preview_file = self.writeOL(
+                    iface, feedback,
+                    layers=self.layers,
+                    groups=self.groups,
+                    popup=self.popup,
+                    visible=self.visible,
+                    interactive=self.interactive,
+                    json=self.json,
+                    clustered=self.cluster,
+                    getFeatureInfo=self.getFeatureInfo,
+                    baseMap=self.baseMap,
+                    settings=self.params,
+                    folder=dest_folder,
+                    exportRelatedList=self.exportRelated)
+        finally:
+            exportState.report = None
+            discard_expressions()
         result = WriterResult()
         result.index_file = self.preview_file
         result.folder = os.path.dirname(self.preview_file)
+        report.finish(result.folder)
+        result.report = report
+        feedback.showFeedback(report.summaryHtml())
         for dirpath, dirnames, filenames in os.walk(result.folder):
             result.files.extend([os.path.join(dirpath, f) for f in filenames])
         return result
@@ -107,7 +127,6 @@ class OpenLayersWriter(Writer):
     def writeOL(cls, iface, feedback, layers, groups, popup, visible,
                 interactive, json, clustered, getFeatureInfo, baseMap, settings,
                 folder, exportRelatedList): # Changed layersData to exportRelatedList
-        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
         mapSettings = iface.mapCanvas().mapSettings()
         controlCount = 0
         stamp = datetime.now().strftime("%Y_%m_%d-%H_%M_%S_%f")
@@ -135,19 +154,62 @@ class OpenLayersWriter(Writer):
         titleOption = settings["Appearance"]["Title"]
         abstractOption = settings["Appearance"]["Abstract"]
 
+        clusterIndex = [hasClusterIndex(layer, cluster, encode2json, settings)
+                        for layer, cluster, encode2json in zip(layers,
+                                                               clustered,
+                                                               json)]
+        heatmapGrid = [hasHeatmapGrid(layer, encode2json, settings)
+                       for layer, encode2json in zip(layers, json)]
+        bakedSymbology = [hasBakedSymbology(layer, encode2json, settings)
+                          for layer, encode2json in zip(layers, json)]
+        if settings["Data export"]["Raster export"] == "XYZ tiles":
+            rasterZooms = (minZoom, maxZoom)
+        else:
+            rasterZooms = None
+
         writeFiles(folder, restrictToExtent, feedback)
-        exportLayers(iface, layers, folder, precision, optimize,
-                     popup, json, restrictToExtent, extent, feedback, matchCRS, exportRelatedList) # Pass exportRelatedList
-        mapUnitsLayers = exportStyles(layers, folder, clustered, feedback)
+        with reportStage("libraries"):
+            coreManifest = writeCoreLibraries(folder, feedback)
+        filesWritten(folder)
+        rasterExports = exportLayers(iface, layers, folder, precision, optimize,
+                     popup, json, restrictToExtent, extent, feedback, matchCRS, exportRelatedList, # Pass exportRelatedList
+                     clusterIndex, clusterZoomRange(settings), heatmapGrid,
+                     rasterZooms, maxZoom,
+                     int(settings["Data export"]["Raster quality"]),
+                     settings["Data export"]["Raster export"] ==
+                     "Cloud-Optimized GeoTIFF", bakedSymbology)
+        # both are loaded through the same tiled source
+        clusterIndex = [precomputed or aggregated
+                        for precomputed, aggregated in zip(clusterIndex,
+                                                           heatmapGrid)]
+        with reportStage("styles"):
+            mapUnitsLayers = exportStyles(
+                layers, folder, clustered, feedback,
+                settings["Data export"]["SVG markers"], bakedSymbology)
+        filesWritten(folder)
         mapUnitLayers = getMapUnitLayers(mapUnitsLayers)
         osmb = writeLayersAndGroups(layers, groups, visible, interactive,
                                     folder, popup, settings, json, matchCRS,
                                     clustered, getFeatureInfo, baseMap, iface,
                                     restrictToExtent, extent, mapbounds,
-                                    mapSettings.destinationCrs().authid())
+                                    mapSettings.destinationCrs().authid(),
+                                    clusterIndex, rasterExports,
+                                    bakedSymbology)
         (jsAddress,
          cssAddress, controlCount) = writeHTMLstart(settings, controlCount,
-                                                    osmb, feedback)
+                                                    osmb, feedback,
+                                                    any(clusterIndex),
+                                                    any("cog" in raster for
+                                                        raster in
+                                                        rasterExports.values()))
+        with reportStage("libraries"):
+            manifest = writeLibraries(folder, feedback, osmb,
+                                      any(clusterIndex),
+                                      any("cog" in raster for raster in
+                                          rasterExports.values()),
+                                      layerSearch, geocode, matchCRS,
+                                      coreManifest)
+        filesWritten(folder)
         (geojsonVars, wfsVars, styleVars) = writeScriptIncludes(layers,
                                                                 json, matchCRS)
         popupLayers = "popupLayers = [%s];" % ",".join(
@@ -262,18 +324,16 @@ class OpenLayersWriter(Writer):
                   "w") as f:
             out = replaceInScript("qgis2web.js", values)
             f.write(out)
-        QApplication.restoreOverrideCursor()
+        if settings["Data export"].get("Bundle scripts and styles", False):
+            bundlePage(folder, os.path.join(folder, "index.html"),
+                       "resources", vendored=manifest.assets,
+                       layerData="layers")
         return os.path.join(folder, "index.html")
 
 
 def replaceInScript(template, values):
     path = os.path.join(os.path.dirname(__file__), "openlayers", template)
-    with open(path) as f:
-        lines = f.readlines()
-    s = "".join(lines)
-    for name, value in values.items():
-        s = s.replace(name, value)
-    return s
+    return loadTemplate(path).render(values)
 
 
 def bounds(iface, useCanvas, layers, matchCRS):
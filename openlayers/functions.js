@@ -33,6 +33,40 @@ var createTextStyle = function(feature, resolution, labelText, labelFont,
     return textStyle;
 };
 
+// Label styles shared by every feature with the same label text and
+// format, emptied when it grows past labelStyleCacheLimit entries
+var labelStyleCache = {};
+var labelStyleCacheSize = 0;
+var labelStyleCacheLimit = 5000;
+
+var getLabelStyle = function(feature, resolution, labelText, labelFont,
+                             labelFill, placement, bufferColor,
+                             bufferWidth) {
+
+    if (feature.hide || !labelText) {
+        return;
+    }
+
+    var key = labelText + '\u0000' + labelFont + '\u0000' + labelFill +
+              '\u0000' + placement + '\u0000' + bufferColor + '\u0000' +
+              bufferWidth;
+    var labelStyle = labelStyleCache[key];
+    if (!labelStyle) {
+        if (labelStyleCacheSize >= labelStyleCacheLimit) {
+            labelStyleCache = {};
+            labelStyleCacheSize = 0;
+        }
+        labelStyle = new ol.style.Style({
+            text: createTextStyle(feature, resolution, labelText, labelFont,
+                                  labelFill, placement, bufferColor,
+                                  bufferWidth)
+        });
+        labelStyleCache[key] = labelStyle;
+        labelStyleCacheSize++;
+    }
+    return labelStyle;
+};
+
 function stripe(stripeWidth, gapWidth, angle, color) {
     var canvas = document.createElement('canvas');
     var context = canvas.getContext('2d');
@@ -0,0 +1,202 @@
+var qgis2webCOG = (function() {
+    var EARTH = 20037508.342789244;
+    var EMPTY = 'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7';
+    // Byte size of the TIFF field types
+    var SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 6: 1, 7: 1, 8: 2, 9: 4, 11: 4, 12: 8, 16: 8, 17: 8};
+    var files = {};
+
+    function fetchRange(url, start, end) {
+        return fetch(url, {headers: {Range: 'bytes=' + start + '-' + end}})
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error(url + ': ' + response.status);
+                }
+                return response.arrayBuffer().then(function(data) {
+                    // a server ignoring the range sends the whole file
+                    return {data: data, complete: response.status === 200};
+                });
+            });
+    }
+
+    // Reads the image file directories of a TIFF, throwing {needed: n}
+    // when the header does not fit in the first bytes read
+    function parse(data) {
+        var view = new DataView(data);
+        var little = view.getUint16(0) === 0x4949;
+        var big = view.getUint16(2, little) === 43;
+        function uint(offset, size) {
+            if (offset + size > data.byteLength) {
+                throw {needed: offset + size};
+            }
+            if (size === 1) {
+                return view.getUint8(offset);
+            }
+            if (size === 2) {
+                return view.getUint16(offset, little);
+            }
+            if (size === 4) {
+                return view.getUint32(offset, little);
+            }
+            var low = view.getUint32(offset + (little ? 0 : 4), little);
+            var high = view.getUint32(offset + (little ? 4 : 0), little);
+            return high * 4294967296 + low;
+        }
+        function read(tags, tag) {
+            var field = tags[tag];
+            var values = [];
+            if (!field) {
+                return values;
+            }
+            for (var i = 0; i < field.count; i++) {
+                var offset = field.offset + i * field.size;
+                if (field.type === 12) {
+                    uint(offset, 8);
+                    values.push(view.getFloat64(offset, little));
+                } else {
+                    values.push(uint(offset, field.size));
+                }
+            }
+            return values;
+        }
+        var levels = [];
+        var offset = big ? uint(8, 8) : uint(4, 4);
+        while (offset) {
+            var count = big ? uint(offset, 8) : uint(offset, 2);
+            var entrySize = big ? 20 : 12;
+            var start = offset + (big ? 8 : 2);
+            var tags = {};
+            for (var i = 0; i < count; i++) {
+                var entry = start + i * entrySize;
+                var type = uint(entry + 2, 2);
+                var field = {
+                    type: type,
+                    count: big ? uint(entry + 4, 8) : uint(entry + 4, 4),
+                    size: SIZES[type] || 1,
+                    offset: entry + (big ? 12 : 8)
+                };
+                if (field.size * field.count > (big ? 8 : 4)) {
+                    field.offset = big ? uint(field.offset, 8) : uint(field.offset, 4);
+                }
+                tags[uint(entry, 2)] = field;
+            }
+            // transparency masks have bit 4 of NewSubfileType set
+            if (!((read(tags, 254)[0] || 0) & 4)) {
+                var level = {
+                    width: read(tags, 256)[0],
+                    tileSize: read(tags, 322)[0],
+                    offsets: read(tags, 324),
+                    counts: read(tags, 325)
+                };
+                if (!levels.length) {
+                    var scale = read(tags, 33550);
+                    var tiepoint = read(tags, 33922);
+                    level.resolution = scale[0];
+                    level.origin = [tiepoint[3] - tiepoint[0] * scale[0],
+                                    tiepoint[4] + tiepoint[1] * scale[1]];
+                }
+                level.height = read(tags, 257)[0];
+                levels.push(level);
+            }
+            offset = big ? uint(start + count * entrySize, 8) : uint(start + count * entrySize, 4);
+        }
+        // the full resolution image and its overviews, one per zoom level
+        // of the Web Mercator tile grid
+        var zooms = {};
+        for (var l = 0; l < levels.length; l++) {
+            var lvl = levels[l];
+            var tileSpan = lvl.tileSize * levels[0].resolution * levels[0].width / lvl.width;
+            zooms[Math.round(Math.log(2 * EARTH / tileSpan) / Math.LN2)] = {
+                x0: Math.round((levels[0].origin[0] + EARTH) / tileSpan),
+                y0: Math.round((EARTH - levels[0].origin[1]) / tileSpan),
+                across: Math.ceil(lvl.width / lvl.tileSize),
+                down: Math.ceil(lvl.height / lvl.tileSize),
+                offsets: lvl.offsets,
+                counts: lvl.counts
+            };
+        }
+        return zooms;
+    }
+
+    function open(url, length) {
+        return fetchRange(url, 0, length - 1).then(function(result) {
+            try {
+                return {zooms: parse(result.data),
+                        data: result.complete ? result.data : null};
+            } catch (e) {
+                if (e.needed && !result.complete) {
+                    return open(url, Math.max(e.needed, length * 2));
+                }
+                throw e;
+            }
+        });
+    }
+
+    // Calls onLoad with an object URL of the z/x/y tile of a COG, or null
+    // when the file has no data for it
+    function tile(url, z, x, y, onLoad) {
+        if (!files[url]) {
+            files[url] = open(url, 65536);
+        }
+        files[url].then(function(cog) {
+            var level = cog.zooms[z];
+            if (!level) {
+                return null;
+            }
+            var col = x - level.x0;
+            var row = y - level.y0;
+            if (col < 0 || row < 0 || col >= level.across || row >= level.down) {
+                return null;
+            }
+            var start = level.offsets[row * level.across + col];
+            var length = level.counts[row * level.across + col];
+            if (!length) {
+                return null;
+            }
+            if (cog.data) {
+                return cog.data.slice(start, start + length);
+            }
+            return fetchRange(url, start, start + length - 1).then(function(result) {
+                return result.complete ? result.data.slice(start, start + length) : result.data;
+            });
+        }).then(function(data) {
+            onLoad(data ? URL.createObjectURL(new Blob([data], {type: 'image/webp'})) : null);
+        }, function() {
+            onLoad(null);
+        });
+    }
+
+    function show(img, src) {
+        img.onload = img.onerror = function() {
+            if (src) {
+                URL.revokeObjectURL(src);
+            }
+        };
+        img.src = src || EMPTY;
+    }
+
+    return {
+        tile: tile,
+        olTileLoad: function(url) {
+            return function(imageTile, src) {
+                var coord = src.split('/');
+                tile(url, +coord[0], +coord[1], +coord[2], function(data) {
+                    show(imageTile.getImage(), data);
+                });
+            };
+        },
+        leafletLayer: function(url, options) {
+            var Layer = L.GridLayer.extend({
+                createTile: function(coords, done) {
+                    var img = document.createElement('img');
+                    img.alt = '';
+                    tile(url, coords.z, coords.x, coords.y, function(data) {
+                        show(img, data);
+                        done(null, img);
+                    });
+                    return img;
+                }
+            });
+            return new Layer(options);
+        }
+    };
+})();
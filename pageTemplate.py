@@ -0,0 +1,59 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import re
+
+
+class Template(object):
+    """
+    A template parsed once into its text and @PLACEHOLDER@ segments, and
+    rendered in a single pass.
+    """
+
+    PLACEHOLDER = re.compile(r"(@[A-Z][A-Z0-9_]*@)")
+
+    def __init__(self, text):
+        # literal text at even indexes, placeholders at odd ones
+        self.segments = self.PLACEHOLDER.split(text)
+
+    def render(self, values):
+        """
+        Returns the template with its placeholders replaced by their values.
+        Placeholders without a value, and placeholders within values, are
+        left as they are.
+        """
+        out = list(self.segments)
+        for i in range(1, len(out), 2):
+            out[i] = values.get(out[i], out[i])
+        return "".join(out)
+
+
+# parsed templates by path, with the mtime and size they were parsed at
+templateCache = {}
+
+
+def loadTemplate(path):
+    stat = os.stat(path)
+    version = (stat.st_mtime, stat.st_size)
+    cached = templateCache.get(path)
+    if cached is None or cached[0] != version:
+        with open(path) as f:
+            cached = (version, Template(f.read()))
+        templateCache[path] = cached
+    return cached[1]
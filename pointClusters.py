@@ -0,0 +1,331 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import math
+import json
+from qgis.core import QgsHeatmapRenderer, QgsWkbTypes
+
+# cluster radius in pixels, relative to a CLUSTER_EXTENT pixel tile
+CLUSTER_RADIUS = 40
+CLUSTER_EXTENT = 512
+# zoom above which points are always shown unclustered
+CLUSTER_MAX_ZOOM = 16
+# each tile file covers at least 2 ** TILE_ZOOM_OFFSET screen tiles per
+# side, and more where needed to hold TILE_FEATURES features on average
+TILE_ZOOM_OFFSET = 2
+TILE_FEATURES = 64
+# size in pixels of the cells heatmap points are aggregated into
+HEATMAP_CELL = 8
+MAX_LATITUDE = 85.0511287798
+
+
+def hasClusterIndex(layer, cluster, encode2json, params):
+    """
+    Returns True if the clusters of a layer are precomputed at export
+    rather than built in the browser.
+    """
+    if not cluster:
+        return False
+    if not params["Data export"].get("Precompute point clusters", False):
+        return False
+    if layer.type() != layer.VectorLayer:
+        return False
+    if layer.providerType() == "WFS" and not encode2json:
+        return False
+    if layer.geometryType() != QgsWkbTypes.PointGeometry:
+        return False
+    if isinstance(layer.renderer(), QgsHeatmapRenderer):
+        return False
+    return True
+
+
+def hasHeatmapGrid(layer, encode2json, params):
+    """
+    Returns True if a heatmap layer is exported as per-zoom grid cells
+    rather than as its individual points.
+    """
+    if not params["Data export"].get("Pre-aggregate heatmaps", False):
+        return False
+    if layer.type() != layer.VectorLayer:
+        return False
+    if layer.providerType() == "WFS" and not encode2json:
+        return False
+    if layer.geometryType() != QgsWkbTypes.PointGeometry:
+        return False
+    return isinstance(layer.renderer(), QgsHeatmapRenderer)
+
+
+def clusterZoomRange(params):
+    """
+    Returns the (first, last) zoom levels written to the cluster index.
+    Points are unclustered at the last zoom level.
+    """
+    minZoom = int(params["Scale/Zoom"]["Min zoom level"])
+    maxZoom = int(params["Scale/Zoom"]["Max zoom level"])
+    leafZoom = min(maxZoom, CLUSTER_MAX_ZOOM + 1)
+    return (min(minZoom, leafZoom), leafZoom)
+
+
+def lngLatToMercator(lng, lat):
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    sin = math.sin(lat * math.pi / 180)
+    x = lng / 360 + 0.5
+    y = 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi
+    return (min(1, max(0, x)), min(1, max(0, y)))
+
+
+def mercatorToLngLat(x, y):
+    y2 = (180 - y * 360) * math.pi / 180
+    return ((x - 0.5) * 360, 360 * math.atan(math.exp(y2)) / math.pi - 90)
+
+
+def getPointCoordinates(geometry):
+    if geometry is None:
+        return None
+    coords = geometry.get("coordinates")
+    if geometry.get("type") == "MultiPoint":
+        coords = coords[0] if coords else None
+    if not coords:
+        return None
+    return coords
+
+
+def clusterNodes(nodes, zoom, nextId):
+    """
+    Greedily merges the nodes of the zoom level above into the clusters
+    shown at zoom, using a grid index of cell size equal to the radius.
+
+    Nodes are (x, y, count, representative, clusterId, expansionZoom)
+    tuples in normalized mercator coordinates.
+    """
+    r = CLUSTER_RADIUS / (CLUSTER_EXTENT * 2 ** zoom)
+    r2 = r * r
+    grid = {}
+    for i, node in enumerate(nodes):
+        grid.setdefault((int(node[0] / r), int(node[1] / r)), []).append(i)
+    visited = [False] * len(nodes)
+    clusters = []
+    for i, node in enumerate(nodes):
+        if visited[i]:
+            continue
+        visited[i] = True
+        x, y, count = node[0], node[1], node[2]
+        wx = x * count
+        wy = y * count
+        total = count
+        cx = int(x / r)
+        cy = int(y / r)
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for j in grid.get((gx, gy), ()):
+                    if visited[j]:
+                        continue
+                    other = nodes[j]
+                    dx = other[0] - x
+                    dy = other[1] - y
+                    if dx * dx + dy * dy <= r2:
+                        visited[j] = True
+                        wx += other[0] * other[2]
+                        wy += other[1] * other[2]
+                        total += other[2]
+        if total == count:
+            clusters.append(node)
+        else:
+            clusters.append((wx / total, wy / total, total, node[3], nextId,
+                             zoom + 1))
+            nextId += 1
+    return clusters, nextId
+
+
+def nodeToFeature(node, features, decimals):
+    if node[4] is None:
+        return features[node[3]]
+    properties = dict(features[node[3]].get("properties") or {})
+    properties.update({"cluster": True,
+                       "cluster_id": node[4],
+                       "point_count": node[2],
+                       "expansion_zoom": node[5]})
+    lng, lat = mercatorToLngLat(node[0], node[1])
+    return {"type": "Feature",
+            "properties": properties,
+            "geometry": {"type": "Point",
+                         "coordinates": [round(lng, decimals),
+                                         round(lat, decimals)]}}
+
+
+def groupByTile(nodes, tileZoom):
+    n = 2 ** tileZoom
+    tiles = {}
+    for node in nodes:
+        tx = min(n - 1, int(node[0] * n))
+        ty = min(n - 1, int(node[1] * n))
+        tiles.setdefault((tx, ty), []).append(node)
+    return tiles
+
+
+def writeClusterTiles(nodes, zoom, toFeature, sln, clusterFolder,
+                      separators):
+    tileZoom = max(0, zoom - TILE_ZOOM_OFFSET)
+    maxTiles = max(1, len(nodes) // TILE_FEATURES)
+    tiles = groupByTile(nodes, tileZoom)
+    while tileZoom > 0 and len(tiles) > maxTiles:
+        tileZoom -= 1
+        tiles = groupByTile(nodes, tileZoom)
+    zoomFolder = os.path.join(clusterFolder, str(zoom))
+    os.makedirs(zoomFolder, exist_ok=True)
+    for (tx, ty), tileNodes in tiles.items():
+        collection = {"type": "FeatureCollection",
+                      "features": [toFeature(node) for node in tileNodes]}
+        path = os.path.join(zoomFolder, "%d_%d.js" % (tx, ty))
+        with open(path, mode="w", encoding="utf8") as f:
+            f.write("qgis2webClusters.tile('%s', %d, %d, %d, %s);" % (
+                sln, zoom, tx, ty,
+                json.dumps(collection, separators=separators)))
+    return {"tileZoom": tileZoom,
+            "tiles": ["%d_%d" % tile for tile in sorted(tiles)]}
+
+
+def exportClusters(jsonPath, sln, layersFolder, zoomRange, precision, minify):
+    """
+    Writes a per-zoom cluster hierarchy of the points in jsonPath as
+    tiles under layers/clusters/sln, loaded by the browser on demand,
+    and replaces the layer script with an empty collection which
+    registers the cluster index.
+    :param jsonPath: path to the exported GeoJSON (EPSG:4326)
+    :param zoomRange: (first, last) zoom levels to write
+    """
+    with open(jsonPath, encoding="utf8") as f:
+        collection = json.load(f)
+    features = collection.get("features", [])
+    decimals = 7 if precision == "maintain" else int(precision)
+    separators = (",", ":") if minify else None
+    minZoom, leafZoom = zoomRange
+    clusterFolder = os.path.join(layersFolder, "clusters", sln)
+
+    nodes = []
+    for count, feature in enumerate(features):
+        coords = getPointCoordinates(feature.get("geometry"))
+        if coords is None:
+            continue
+        x, y = lngLatToMercator(coords[0], coords[1])
+        nodes.append((x, y, 1, count, None, None))
+
+    def toFeature(node):
+        return nodeToFeature(node, features, decimals)
+
+    tiles = {}
+    tiles[str(leafZoom)] = writeClusterTiles(nodes, leafZoom, toFeature, sln,
+                                             clusterFolder, separators)
+    nextId = 0
+    for zoom in range(leafZoom - 1, minZoom - 1, -1):
+        nodes, nextId = clusterNodes(nodes, zoom, nextId)
+        tiles[str(zoom)] = writeClusterTiles(nodes, zoom, toFeature, sln,
+                                             clusterFolder, separators)
+    writeIndex(collection, sln, layersFolder, zoomRange, tiles, separators)
+
+
+def writeIndex(collection, sln, layersFolder, zoomRange, tiles, separators):
+    folderName = os.path.basename(os.path.normpath(layersFolder))
+    index = {"path": "%s/clusters/%s/" % (folderName, sln),
+             "minZoom": zoomRange[0],
+             "maxZoom": zoomRange[1],
+             "tiles": tiles}
+    empty = {"type": "FeatureCollection",
+             "name": collection.get("name", sln),
+             "features": []}
+    path = os.path.join(layersFolder, sln + ".js")
+    with open(path, mode="w", encoding="utf8") as f:
+        f.write("var json_%s = %s;\n" % (sln, json.dumps(empty)))
+        f.write("qgis2webClusters.register('%s', " % sln)
+        json.dump(index, f, separators=separators)
+        f.write(");")
+
+
+def getWeight(feature, weightField):
+    if not weightField:
+        return 1.0
+    try:
+        return float((feature.get("properties") or {}).get(weightField) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def aggregateCells(nodes, zoom):
+    """
+    Sums the weights of the nodes falling in each HEATMAP_CELL pixel cell
+    at zoom. Nodes are (x, y, weight) tuples and each cell is placed at the
+    weighted centroid of its nodes.
+    """
+    size = HEATMAP_CELL / (CLUSTER_EXTENT * 2 ** zoom)
+    cells = {}
+    for x, y, weight in nodes:
+        key = (int(x / size), int(y / size))
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = [x * weight, y * weight, weight, x, y]
+        else:
+            cell[0] += x * weight
+            cell[1] += y * weight
+            cell[2] += weight
+    aggregated = []
+    for wx, wy, weight, x, y in cells.values():
+        if weight > 0:
+            aggregated.append((wx / weight, wy / weight, weight))
+        elif weight == 0:
+            aggregated.append((x, y, weight))
+    return aggregated
+
+
+def exportHeatmapGrid(jsonPath, sln, layersFolder, zoomRange, weightField,
+                      precision, minify):
+    """
+    Writes the points in jsonPath pre-aggregated into weighted grid cells
+    for every zoom level, as tiles loaded like a cluster index.
+    :param weightField: name of the weight field, or "" for unit weights
+    """
+    with open(jsonPath, encoding="utf8") as f:
+        collection = json.load(f)
+    decimals = 7 if precision == "maintain" else int(precision)
+    separators = (",", ":") if minify else None
+    minZoom, leafZoom = zoomRange
+    clusterFolder = os.path.join(layersFolder, "clusters", sln)
+
+    nodes = []
+    for feature in collection.get("features", []):
+        coords = getPointCoordinates(feature.get("geometry"))
+        if coords is None:
+            continue
+        x, y = lngLatToMercator(coords[0], coords[1])
+        nodes.append((x, y, getWeight(feature, weightField)))
+
+    def toFeature(node):
+        lng, lat = mercatorToLngLat(node[0], node[1])
+        return {"type": "Feature",
+                "properties": {"weight": node[2]},
+                "geometry": {"type": "Point",
+                             "coordinates": [round(lng, decimals),
+                                             round(lat, decimals)]}}
+
+    tiles = {}
+    for zoom in range(leafZoom, minZoom - 1, -1):
+        nodes = aggregateCells(nodes, zoom)
+        level = writeClusterTiles(nodes, zoom, toFeature, sln,
+                                  clusterFolder, separators)
+        level["maxWeight"] = max([node[2] for node in nodes] or [1]) or 1
+        tiles[str(zoom)] = level
+    writeIndex(collection, sln, layersFolder, zoomRange, tiles, separators)
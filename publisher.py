@@ -0,0 +1,222 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import json
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+# file on the server recording what the last publish uploaded
+MANIFEST_NAME = ".qgis2web-manifest.json"
+MANIFEST_VERSION = 1
+# pages uploaded last, switching the site to the new version
+INDEX_FILES = ("index.html",)
+HASH_BLOCK = 1 << 20
+
+
+def fileSizes(folder):
+    """
+    Returns the size of every file under folder, keyed by its path
+    relative to folder with forward slashes.
+    """
+    sizes = {}
+    for dirpath, dirnames, filenames in os.walk(folder):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            key = os.path.relpath(path, folder).replace(os.sep, "/")
+            sizes[key] = os.path.getsize(path)
+    return sizes
+
+
+class Publisher(object):
+    """
+    Publishes the files of an export to a server, uploading those which
+    changed since the last publish concurrently, and the index pages last
+    so that the site switches to the new version at once. Subclasses
+    provide the storage: how a local file is versioned, compared with
+    what is published, uploaded and recorded.
+
+    With a pipeline, the files are uploaded as the writer offers them.
+    Once the writer has finished, its output is compared with what was
+    uploaded, so that files rewritten in the meantime are uploaded again.
+    """
+
+    def __init__(self, connections):
+        self.connections = max(1, connections)
+
+    def begin(self, feedback):
+        """Reads what is published."""
+
+    def fileVersion(self, folder, path):
+        """
+        Returns what identifies the content of a local file, given by its
+        path relative to folder with forward slashes.
+        """
+        raise NotImplementedError
+
+    def isPublished(self, path, version):
+        """Tells if a file is published with the given version."""
+        raise NotImplementedError
+
+    def upload(self, folder, path, version):
+        """
+        Uploads a file, on a thread of the pool. The result is handed to
+        uploaded().
+        """
+        raise NotImplementedError
+
+    def uploaded(self, path, version, result):
+        """Records a completed upload."""
+        raise NotImplementedError
+
+    def complete(self, folder, local, feedback):
+        """
+        Uploads the index pages of folder, whose files have the versions in
+        local, and removes the files the export no longer has.
+        """
+        raise NotImplementedError
+
+    def interrupt(self):
+        """Saves what was uploaded by a publish cancelled or failing."""
+
+    def end(self):
+        """Releases what the publish used."""
+
+    def publish(self, folder, feedback=None, pipeline=None):
+        """
+        Publishes folder, or the output of the writer feeding pipeline.
+        Returns False if cancelled through feedback; the errors of the
+        server are raised.
+        """
+        if not feedback:
+            from qgis2web.feedbackDialog import Feedback
+            feedback = Feedback()
+        self.begin(feedback)
+        try:
+            try:
+                folder, local = self.uploadFiles(folder, feedback, pipeline)
+            except Exception:
+                self.interrupt()
+                raise
+            if local is None:
+                self.interrupt()
+                if feedback.cancelled():
+                    feedback.acceptCancel()
+                return False
+            self.complete(folder, local, feedback)
+            return True
+        finally:
+            self.end()
+
+    def uploadFiles(self, folder, feedback, pipeline=None):
+        """
+        Uploads the files which are not published yet, except the index
+        pages.
+        :return: the folder published and the version of each of its files,
+        with None as versions if cancelled or the writer failed
+        """
+        uploads = {}
+        # the path and version of each upload under way, and the uploads
+        # which have completed but are not recorded yet
+        pending = set()
+        done = queue.Queue()
+        counts = {"submitted": 0, "done": 0}
+        local = None
+
+        def submit(source, path, version):
+            key = (path, json.dumps(version, sort_keys=True))
+            if (path in INDEX_FILES or key in pending or
+                    self.isPublished(path, version)):
+                return
+            future = pool.submit(self.upload, source, path, version)
+            uploads[future] = (path, version, key)
+            pending.add(key)
+            counts["submitted"] += 1
+            future.add_done_callback(done.put)
+
+        def completed():
+            futures = []
+            while True:
+                try:
+                    futures.append(done.get_nowait())
+                except queue.Empty:
+                    return futures
+
+        def record(futures):
+            """Records the completed uploads, returning the first error."""
+            error = None
+            for future in futures:
+                path, version, key = uploads.pop(future)
+                pending.discard(key)
+                if future.cancelled():
+                    continue
+                if future.exception() is not None:
+                    # a file the writer removed again is not published
+                    if not (path not in (local or ()) and isinstance(
+                            future.exception(), FileNotFoundError)):
+                        error = error or future.exception()
+                    continue
+                self.uploaded(path, version, future.result())
+                counts["done"] += 1
+            return error
+
+        error = None
+        pool = ThreadPoolExecutor(self.connections)
+        try:
+            if pipeline is not None:
+                feedback.showFeedback('Uploading files as they are written...')
+                for path in pipeline.files():
+                    error = record(completed())
+                    if error is not None or feedback.cancelled():
+                        break
+                    try:
+                        version = self.fileVersion(pipeline.folder, path)
+                    except FileNotFoundError:
+                        continue
+                    submit(pipeline.folder, path, version)
+                else:
+                    results = pipeline.results()
+                    folder = results.folder if results else None
+            if error is None and not feedback.cancelled() and folder:
+                local = {path: self.fileVersion(folder, path)
+                         for path in fileSizes(folder)}
+                # until no file was rewritten while uploading
+                while error is None and not feedback.cancelled():
+                    for path in sorted(local):
+                        submit(folder, path, local[path])
+                    if not uploads:
+                        break
+                    feedback.showFeedback('Publishing {} of {} files...'.format(
+                        len(uploads), len(local)))
+                    while uploads:
+                        error = record([done.get()])
+                        feedback.setProgress(100 * counts["done"] /
+                                             max(counts["submitted"], 1))
+                        if error is not None or feedback.cancelled():
+                            break
+        finally:
+            for future in uploads:
+                future.cancel()
+            pool.shutdown(wait=True)
+            # uploads already running when stopping have completed by now
+            error = record(completed()) or error
+        if error is not None:
+            raise error
+        if feedback.cancelled():
+            return folder, None
+        return folder, local
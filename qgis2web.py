@@ -26,7 +26,6 @@ from qgis.core import QgsApplication
 import sip
 import os
 # from . import resources_rc
-from qgis2web.maindialog import MainDialog
 from qgis2web.qgis2webProvider import qgis2webProvider
 
 
@@ -56,6 +55,9 @@ class Qgis2Web(object):
 
     def run(self):
         if not self.dlg or sip.isdeleted(self.dlg):
+            # the dialog pulls in the writers and the web view, so it is
+            # only imported once the user opens it
+            from qgis2web.maindialog import MainDialog
             self.dlg = MainDialog(self.iface)
         self.dlg.setAttribute(Qt.WA_DeleteOnClose)
         self.dlg.show()
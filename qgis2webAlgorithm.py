@@ -38,13 +38,9 @@ from qgis.utils import iface
 
 from qgis.core import QgsProcessingAlgorithm
 # from processing.tools import dataobjects
-from .writerRegistry import (WRITER_REGISTRY)
-from .exporter import (EXPORTER_REGISTRY)
-from .olwriter import (OpenLayersWriter)
-from .leafletWriter import (LeafletWriter)
-from .configparams import getDefaultParams
 
-defaultParams = getDefaultParams()
+# The writers, exporters and settings are imported when an algorithm runs,
+# so that registering the provider at QGIS startup stays cheap.
 
 
 class qgis2webAlgorithm(QgsProcessingAlgorithm):
@@ -96,6 +92,8 @@ class exportProject(qgis2webAlgorithm):
     def processAlgorithm(self, parameters, context, progress):
         """Here is where the processing itself takes place."""
 
+        from .writerRegistry import WRITER_REGISTRY
+        from .exporter import EXPORTER_REGISTRY
         writer = WRITER_REGISTRY.createWriterFromProject()
         (writer.layers, writer.groups, writer.popup,
          writer.visible, writer.json,
@@ -247,6 +245,8 @@ class exportLayer(qgis2webAlgorithm):
                 inputTemplate)
 
     def getWriter(self, inputMapFormat):
+        from .olwriter import OpenLayersWriter
+        from .leafletWriter import LeafletWriter
         if inputMapFormat.lower() == "leaflet":
             writer = LeafletWriter()
         else:
@@ -397,7 +397,8 @@ class exportVector(exportLayer):
         # QgsVectorLayer in this case) using the
         # processing.getObjectFromUri() method.
 
-        writer.params = defaultParams
+        from .configparams import getDefaultParams
+        writer.params = getDefaultParams()
         self.writerParams(writer, inputParams)
         writer.layers = [inputLayer]
         writer.groups = {}
@@ -407,6 +408,7 @@ class exportVector(exportLayer):
         writer.cluster = [inputCluster]
         writer.json = [True]
         writer.getFeatureInfo = [False]
+        from .exporter import EXPORTER_REGISTRY
         exporter = EXPORTER_REGISTRY.createFromProject()
         write_folder = exporter.exportDirectory()
         writer.write(iface, write_folder)
@@ -511,7 +513,8 @@ class exportRaster(exportLayer):
                                                 context)
         writer = self.getWriter(inputMapFormat)
 
-        writer.params = defaultParams
+        from .configparams import getDefaultParams
+        writer.params = getDefaultParams()
         self.writerParams(writer, inputParams)
         writer.layers = [inputLayer]
         writer.groups = {}
@@ -520,6 +523,7 @@ class exportRaster(exportLayer):
         writer.json = [False]
         writer.getFeatureInfo = [inputGetFeatureInfo]
         writer.cluster = [False]
+        from .exporter import EXPORTER_REGISTRY
         exporter = EXPORTER_REGISTRY.createFromProject()
         write_folder = exporter.exportDirectory()
         writer.write(iface, write_folder)
@@ -0,0 +1,282 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import threading
+
+from qgis2web.publisher import (Publisher, MANIFEST_NAME, MANIFEST_VERSION,
+                                INDEX_FILES, HASH_BLOCK)
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
+    from botocore.exceptions import BotoCoreError, ClientError
+    boto3_available = True
+    S3_ERRORS = (BotoCoreError, ClientError)
+except ImportError:
+    boto3_available = False
+    S3_ERRORS = ()
+
+# files at least this large are uploaded in parts of this size
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+S3_CONNECTIONS = 8
+# cache lifetime of files which keep their name when their content changes
+CACHE_MAX_AGE = 3600
+# names carrying a content hash, such as bundle_0123456789.js, never change
+HASHED_NAME = re.compile(r"[._-][0-9a-f]{10,}\.\w+$", re.I)
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+COMPRESSED_TYPES = ("text/", "application/javascript", "application/json",
+                    "application/geo+json", "image/svg+xml",
+                    "application/xml")
+# smallest file worth compressing
+COMPRESS_MIN_SIZE = 1024
+
+for extension, mimeType in ((".js", "application/javascript"),
+                            (".mjs", "application/javascript"),
+                            (".json", "application/json"),
+                            (".geojson", "application/geo+json"),
+                            (".pbf", "application/x-protobuf"),
+                            (".svg", "image/svg+xml"),
+                            (".webp", "image/webp"),
+                            (".woff", "font/woff"),
+                            (".woff2", "font/woff2"),
+                            (".tif", "image/tiff"),
+                            (".tiff", "image/tiff")):
+    mimetypes.add_type(mimeType, extension)
+
+
+def contentType(path):
+    mimeType, encoding = mimetypes.guess_type(path)
+    return mimeType or "application/octet-stream"
+
+
+def cacheControl(path, maxAge=CACHE_MAX_AGE):
+    """
+    Returns the Cache-Control header of a published file: pages are always
+    revalidated, files named after their content are cached for good and
+    the rest for maxAge seconds.
+    """
+    if path.endswith(".html"):
+        return "no-cache"
+    if HASHED_NAME.search(posixpath.basename(path)):
+        return IMMUTABLE_CACHE
+    return "public, max-age=%d" % maxAge
+
+
+def objectETag(path):
+    """
+    Returns the ETag S3 gives a file uploaded with the multipart settings
+    above: the MD5 of the file, or the MD5 of the MD5 of its parts.
+    """
+    if os.path.getsize(path) < MULTIPART_THRESHOLD:
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    parts = []
+    with open(path, "rb") as f:
+        for part in iter(lambda: f.read(MULTIPART_CHUNKSIZE), b""):
+            parts.append(hashlib.md5(part).digest())
+    return "%s-%d" % (hashlib.md5(b"".join(parts)).hexdigest(), len(parts))
+
+
+def fileVersion(folder, path):
+    """
+    Returns the size and modification time of a file, which change when
+    the writer rewrites it.
+    """
+    stat = os.stat(os.path.join(folder, *path.split("/")))
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class S3Publisher(Publisher):
+    """
+    Publishes a folder to a bucket of an S3 compatible object store.
+
+    Text files are gzip compressed, and every object gets its Content-Type,
+    Content-Encoding and Cache-Control. Objects whose ETag matches the file
+    about to be uploaded, or the upload recorded in the manifest of the
+    last publish, are skipped when their headers are unchanged too. Large
+    files are uploaded in parallel parts, and objects left over from the
+    last publish are deleted once the index pages are uploaded.
+    """
+
+    def __init__(self, bucket, prefix="", endpoint=None, region=None,
+                 accessKey=None, secretKey=None, connections=S3_CONNECTIONS,
+                 compress=True, maxAge=CACHE_MAX_AGE):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        Publisher.__init__(self, connections)
+        self.compress = compress
+        self.maxAge = maxAge
+        self.client = boto3.client(
+            "s3", endpoint_url=endpoint or None, region_name=region or None,
+            aws_access_key_id=accessKey or None,
+            aws_secret_access_key=secretKey or None,
+            config=Config(max_pool_connections=self.connections * 4))
+        self.transfer = TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_CHUNKSIZE,
+            max_concurrency=self.connections)
+        self.lock = threading.Lock()
+
+    def key(self, path):
+        return posixpath.join(self.prefix, path) if self.prefix else path
+
+    def remoteETags(self):
+        """Returns the ETag of every object under the prefix."""
+        etags = {}
+        paginator = self.client.get_paginator("list_objects_v2")
+        prefix = self.prefix + "/" if self.prefix else ""
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                etags[item["Key"]] = item["ETag"].strip('"')
+        return etags
+
+    def readManifest(self):
+        try:
+            body = self.client.get_object(
+                Bucket=self.bucket, Key=self.key(MANIFEST_NAME))["Body"]
+            manifest = json.loads(body.read().decode("utf-8"))
+        except (ClientError, ValueError):
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        return manifest.get("objects", {})
+
+    def writeManifest(self, manifest):
+        data = json.dumps({"version": MANIFEST_VERSION, "objects": manifest},
+                          sort_keys=True).encode("utf-8")
+        self.client.put_object(Bucket=self.bucket, Key=self.key(MANIFEST_NAME),
+                               Body=data, ContentType="application/json",
+                               CacheControl="no-cache")
+
+    def prepare(self, folder, path, staging):
+        """
+        Returns the file to upload for path, compressed into staging where
+        worthwhile, and the headers of its object.
+        """
+        source = os.path.join(folder, *path.split("/"))
+        mimeType = contentType(path)
+        headers = {"ContentType": mimeType,
+                   "CacheControl": cacheControl(path, self.maxAge)}
+        if (self.compress and mimeType.startswith(COMPRESSED_TYPES) and
+                os.path.getsize(source) >= COMPRESS_MIN_SIZE):
+            handle, target = tempfile.mkstemp(suffix=".gz", dir=staging)
+            os.close(handle)
+            # no name or time in the header, so the same file always
+            # compresses to the same bytes and ETag
+            with open(source, "rb") as fin, open(target, "wb") as raw:
+                with gzip.GzipFile(filename="", mode="wb", fileobj=raw,
+                                   mtime=0) as fout:
+                    shutil.copyfileobj(fin, fout, HASH_BLOCK)
+            headers["ContentEncoding"] = "gzip"
+            source = target
+        return source, headers
+
+    def fileVersion(self, folder, path):
+        return fileVersion(folder, path)
+
+    def isPublished(self, path, version):
+        return self.manifest.get(self.key(path), {}).get("version") == version
+
+    def upload(self, folder, path, version=None):
+        """
+        Uploads one file unless its object is unchanged. Returns the
+        manifest entry of the object, and whether it was uploaded.
+        """
+        key = self.key(path)
+        source, headers = self.prepare(folder, path, self.staging)
+        try:
+            etag = objectETag(source)
+            with self.lock:
+                current = self.remote.get(key)
+                recorded = self.previous.get(key, {})
+            # headers such as Cache-Control are only set by an upload
+            if (current is not None and recorded.get("headers") == headers
+                    and (current == etag or
+                         (recorded.get("hash") == etag and
+                          recorded.get("etag") == current))):
+                return {"hash": etag, "etag": current,
+                        "headers": headers}, False
+            self.client.upload_file(source, self.bucket, key,
+                                    ExtraArgs=headers, Config=self.transfer)
+            # the ETag is not the MD5 of the object with some encryption
+            # settings, so the one S3 gave is kept to recognise it next time
+            uploaded = self.client.head_object(Bucket=self.bucket, Key=key)
+            entry = {"hash": etag, "etag": uploaded["ETag"].strip('"'),
+                     "headers": headers}
+            with self.lock:
+                # a file rewritten during the export may be uploaded again
+                self.remote[key] = entry["etag"]
+                self.previous[key] = dict(entry)
+            return dict(entry), True
+        finally:
+            if source.startswith(self.staging):
+                os.remove(source)
+
+    def begin(self, feedback):
+        feedback.showFeedback('Comparing with the published objects...')
+        self.remote = self.remoteETags()
+        self.previous = self.readManifest()
+        self.manifest = {}
+        self.counts = {"uploaded": 0, "unchanged": 0}
+        self.staging = tempfile.mkdtemp(prefix="qgis2web_s3_")
+
+    def uploaded(self, path, version, result):
+        entry, changed = result
+        entry["version"] = version
+        self.manifest[self.key(path)] = entry
+        self.counts["uploaded" if changed else "unchanged"] += 1
+
+    def complete(self, folder, local, feedback):
+        for path in sorted(local):
+            if path in INDEX_FILES:
+                entry, changed = self.upload(folder, path)
+                self.manifest[self.key(path)] = entry
+                self.counts["uploaded" if changed else "unchanged"] += 1
+        feedback.setProgress(100)
+        # including files uploaded while writing but since removed
+        published = set(self.key(path) for path in local)
+        stale = [key for key in set(self.previous) | set(self.manifest)
+                 if key not in published]
+        for key in stale:
+            self.manifest.pop(key, None)
+        for start in range(0, len(stale), 1000):
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key}
+                                    for key in stale[start:start + 1000]],
+                        "Quiet": True})
+        self.writeManifest(self.manifest)
+        feedback.showFeedback('Uploaded {} files, {} unchanged'.format(
+            self.counts["uploaded"], self.counts["unchanged"]))
+
+    def end(self):
+        shutil.rmtree(self.staging, ignore_errors=True)
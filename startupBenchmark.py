@@ -0,0 +1,102 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Measures the cost of loading the plugin as QGIS does at startup: importing
+the package and the plugin class, and building the Processing provider and
+its algorithms. Each run uses a fresh interpreter, timing only what the
+plugin adds on top of qgis.core and Qt.
+
+    python startupBenchmark.py [runs] [budget in ms]
+
+Exits with an error if the median load time exceeds the budget, or if the
+dialog stack, writers or web view are imported before they are needed.
+"""
+
+import os
+import subprocess
+import sys
+import json
+
+# import time allowed for loading the plugin, in milliseconds
+IMPORT_BUDGET_MS = 150
+# modules only needed once the dialog opens or an export runs
+DEFERRED_MODULES = ["qgis2web.maindialog",
+                    "qgis2web.ui_maindialog",
+                    "qgis2web.resources_rc",
+                    "qgis2web.writerRegistry",
+                    "qgis2web.olwriter",
+                    "qgis2web.leafletWriter",
+                    "qgis2web.exporter",
+                    "qgis2web.exportTask",
+                    "qgis2web.exportReport",
+                    "qgis2web.s3Publisher",
+                    "boto3",
+                    "qgis2web.configparams",
+                    "qgis2web.utils",
+                    "qgis2web.xmltodict",
+                    "PyQt5.QtWebEngineWidgets",
+                    "PyQt5.QtWebKitWidgets"]
+
+PROBE = """
+import json
+import sys
+import time
+sys.path.insert(0, %(parent)r)
+from qgis.core import QgsApplication, QgsProcessingProvider
+from qgis.PyQt import QtCore, QtGui, QtWidgets
+start = time.perf_counter()
+import %(package)s
+from %(package)s.qgis2web import Qgis2Web
+from %(package)s.qgis2webProvider import qgis2webProvider
+from %(package)s.qgis2webAlgorithm import (exportProject, exportVector,
+                                          exportRaster)
+provider = qgis2webProvider()
+algorithms = [exportProject(), exportVector(), exportRaster()]
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({"ms": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def probe():
+    pluginDir = os.path.dirname(os.path.abspath(__file__))
+    code = PROBE % {"parent": os.path.dirname(pluginDir),
+                    "package": os.path.basename(pluginDir)}
+    out = subprocess.check_output([sys.executable, "-c", code])
+    return json.loads(out.decode("utf-8").strip().splitlines()[-1])
+
+
+def main(runs=5, budget=IMPORT_BUDGET_MS):
+    package = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+    results = [probe() for _ in range(runs)]
+    times = sorted(result["ms"] for result in results)
+    median = times[len(times) // 2]
+    print("plugin load: median %.1f ms, min %.1f ms, max %.1f ms (%d runs)" %
+          (median, times[0], times[-1], runs))
+    loaded = set(results[0]["modules"])
+    eager = [name for name in DEFERRED_MODULES
+             if name.replace("qgis2web.", package + ".", 1) in loaded]
+    for name in eager:
+        print("imported at startup: %s" % name)
+    if median > budget:
+        print("over the %d ms budget" % budget)
+    return 1 if eager or median > budget else 0
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    sys.exit(main(*args))
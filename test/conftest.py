@@ -0,0 +1,42 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+from utilities import Feedback
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the plugin folder is imported as the qgis2web package, whatever the
+# checkout is called
+if "qgis2web" not in sys.modules:
+    spec = importlib.util.spec_from_file_location(
+        "qgis2web", os.path.join(ROOT, "__init__.py"),
+        submodule_search_locations=[ROOT])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules["qgis2web"] = package
+    spec.loader.exec_module(package)
+
+
+@pytest.fixture
+def feedback():
+    return Feedback()
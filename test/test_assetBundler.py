@@ -0,0 +1,83 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import glob
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from qgis2web.assetBundler import minifyCode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = sorted(glob.glob(os.path.join(ROOT, "leaflet", "js", "*.js")) +
+                 glob.glob(os.path.join(ROOT, "openlayers", "*.js")))
+STYLES = sorted(glob.glob(os.path.join(ROOT, "leaflet", "css", "*.css")) +
+                glob.glob(os.path.join(ROOT, "openlayers", "*.css")))
+NODE = shutil.which("node")
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def nodeCheck(tmp_path, path, code):
+    """
+    Tells if node parses code, written under the name of path.
+    """
+    script = tmp_path / os.path.basename(path)
+    if ".esm." in script.name:
+        script = script.with_suffix(".mjs")
+    script.write_text(code, encoding="utf-8")
+    return subprocess.run([NODE, "--check", str(script)],
+                          capture_output=True).returncode == 0
+
+
+@pytest.mark.parametrize("path", SCRIPTS, ids=os.path.basename)
+def test_minify_scripts(path, tmp_path):
+    code = read(path)
+    minified = minifyCode(code)
+    assert len(minified) <= len(code)
+    assert minifyCode(minified) == minified
+    if NODE is not None and not nodeCheck(tmp_path, path, minified):
+        # templates with @PLACEHOLDERS@ are not scripts yet
+        assert not nodeCheck(tmp_path, path, code)
+
+
+@pytest.mark.parametrize("path", STYLES, ids=os.path.basename)
+def test_minify_styles(path):
+    code = read(path)
+    minified = minifyCode(code, css=True)
+    assert len(minified) <= len(code)
+    assert minifyCode(minified, css=True) == minified
+
+
+@pytest.mark.parametrize("code, minified", [
+    ("var a = 1;  // one\n\n\n  var b = 2;", "var a = 1;\nvar b = 2;"),
+    ("var s = '// not a comment';", "var s = '// not a comment';"),
+    ("var t = `a\n\n  b`;", "var t = `a\n\n  b`;"),
+    ("x = a / b / c; /* two\nlines */ y = 1", "x = a / b / c;\ny = 1"),
+    ("if (/ +\\/\\*/.test(s))  return / a/g;",
+     "if (/ +\\/\\*/.test(s)) return / a/g;"),
+    ("a = b\n++c", "a = b\n++c"),
+])
+def test_minify_tokens(code, minified):
+    assert minifyCode(code) == minified
+
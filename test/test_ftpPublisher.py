@@ -0,0 +1,114 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import logging
+import os
+import threading
+
+import pytest
+
+pyftpdlib = pytest.importorskip("pyftpdlib")
+from pyftpdlib.authorizers import DummyAuthorizer  # noqa: E402
+from pyftpdlib.handlers import FTPHandler  # noqa: E402
+from pyftpdlib.servers import ThreadedFTPServer  # noqa: E402
+
+from qgis2web.ftpPublisher import FtpPublisher  # noqa: E402
+from utilities import Pipeline, writeFiles, readFiles  # noqa: E402
+
+SITE = {"index.html": "<html>1</html>",
+        "js/map.js": "var map;",
+        "css/map.css": "body {}",
+        "layers/big.js": "x" * 300000}
+
+
+@pytest.fixture
+def server(tmp_path):
+    """
+    An FTP server on localhost, serving the folder it returns.
+    """
+    root = tmp_path / "server"
+    root.mkdir()
+    authorizer = DummyAuthorizer()
+    authorizer.add_user("user", "secret", str(root), perm="elradfmwMT")
+    handler = type("Handler", (FTPHandler,), {"authorizer": authorizer})
+    logging.getLogger("pyftpdlib").setLevel(logging.CRITICAL)
+    ftpd = ThreadedFTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=ftpd.serve_forever,
+                              kwargs={"timeout": 0.1})
+    thread.start()
+    yield str(root), ftpd.address[1]
+    ftpd.close_all()
+    thread.join()
+
+
+def publish(port, folder, feedback, pipeline=None):
+    publisher = FtpPublisher("127.0.0.1", port, "user", "secret",
+                             "/site/map")
+    try:
+        return publisher.publish(folder, feedback, pipeline)
+    finally:
+        publisher.close()
+
+
+def published(root):
+    files = readFiles(os.path.join(root, "site", "map"))
+    files.pop(".qgis2web-manifest.json")
+    return files
+
+
+def test_publish(server, tmp_path, feedback):
+    root, port = server
+    writeFiles(str(tmp_path / "export"), SITE)
+    assert publish(port, str(tmp_path / "export"), feedback)
+    assert published(root) == SITE
+
+
+def test_publish_changes(server, tmp_path, feedback):
+    root, port = server
+    folder = str(tmp_path / "export")
+    writeFiles(folder, SITE)
+    publish(port, folder, feedback)
+    big = os.path.join(root, "site", "map", "layers", "big.js")
+    mtime = os.stat(big).st_mtime_ns
+    os.remove(os.path.join(folder, "css", "map.css"))
+    writeFiles(folder, {"js/map.js": "var map = 1;"})
+    assert publish(port, folder, feedback)
+    expected = dict(SITE, **{"js/map.js": "var map = 1;"})
+    del expected["css/map.css"]
+    assert published(root) == expected
+    # unchanged files are not uploaded again
+    assert os.stat(big).st_mtime_ns == mtime
+
+
+def test_publish_pipeline(server, tmp_path, feedback):
+    root, port = server
+    folder = str(tmp_path / "export")
+    final = dict(SITE, **{"js/map.js": "var map = 2;"})
+
+    def write(path):
+        writeFiles(folder, {path: SITE[path]})
+
+    def finish():
+        # the writer rewrites a file it has offered, and removes another
+        writeFiles(folder, {"js/map.js": final["js/map.js"]})
+        os.remove(os.path.join(folder, "css", "map.css"))
+
+    del final["css/map.css"]
+    pipeline = Pipeline(folder, sorted(SITE), write, finish)
+    assert publish(port, None, feedback, pipeline)
+    assert published(root) == final
@@ -0,0 +1,72 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+
+from qgis2web.pageTemplate import Template, loadTemplate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_render():
+    template = Template("<title>@TITLE@</title>@HEAD@\n@TITLE@")
+    assert (template.render({"@TITLE@": "Map", "@HEAD@": "<meta>"}) ==
+            "<title>Map</title><meta>\nMap")
+
+
+def test_render_missing():
+    template = Template("@A@ and @B@")
+    assert template.render({"@A@": "a"}) == "a and @B@"
+
+
+def test_render_once():
+    # placeholders within values are not substituted
+    template = Template("@A@@B@")
+    assert template.render({"@A@": "@B@", "@B@": "b"}) == "@B@b"
+
+
+def test_render_literals():
+    # only upper case names between at signs are placeholders
+    text = "mail@example.com @lower@ @ A@ @@ @1A@"
+    assert Template(text).render({"@lower@": "x", "@1A@": "x"}) == text
+
+
+def test_render_templates():
+    for name in os.listdir(os.path.join(ROOT, "templates")):
+        if name.endswith(".html"):
+            path = os.path.join(ROOT, "templates", name)
+            with open(path) as f:
+                text = f.read()
+            template = loadTemplate(path)
+            assert template.render({}) == text
+            values = dict((placeholder, placeholder.lower())
+                          for placeholder in template.segments[1::2])
+            assert values
+            for placeholder, value in values.items():
+                text = text.replace(placeholder, value)
+            assert template.render(values) == text
+
+
+def test_load_template(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_text("<p>@TEXT@</p>")
+    template = loadTemplate(str(path))
+    assert loadTemplate(str(path)) is template
+    # a changed template is parsed again
+    path.write_text("<div>@TEXT@</div>")
+    assert loadTemplate(str(path)).render({"@TEXT@": "x"}) == "<div>x</div>"
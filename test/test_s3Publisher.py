@@ -0,0 +1,125 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import gzip
+import os
+
+import pytest
+
+pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from qgis2web.s3Publisher import S3Publisher  # noqa: E402
+from utilities import Pipeline, writeFiles  # noqa: E402
+
+BUCKET = "qgis2web-test"
+SITE = {"index.html": "<html>1</html>",
+        "js/map.js": "var map;",
+        "css/map.css": "body {}",
+        "layers/big.js": "x" * 300000}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """
+    A client of an S3 mock holding an empty bucket.
+    """
+    for name, value in (("AWS_ACCESS_KEY_ID", "testing"),
+                        ("AWS_SECRET_ACCESS_KEY", "testing"),
+                        ("AWS_DEFAULT_REGION", "us-east-1")):
+        monkeypatch.setenv(name, value)
+    import boto3
+    with moto.mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def published(client):
+    """
+    Returns the content of the objects of the site, and their headers.
+    """
+    files = {}
+    headers = {}
+    listing = client.list_objects_v2(Bucket=BUCKET, Prefix="site/")
+    for item in listing.get("Contents", []):
+        path = item["Key"][len("site/"):]
+        if path.startswith(".qgis2web-manifest"):
+            continue
+        response = client.get_object(Bucket=BUCKET, Key=item["Key"])
+        content = response["Body"].read()
+        if response.get("ContentEncoding") == "gzip":
+            content = gzip.decompress(content)
+        files[path] = content.decode("utf-8")
+        headers[path] = response
+    return files, headers
+
+
+def test_publish(s3, tmp_path, feedback):
+    folder = str(tmp_path / "export")
+    writeFiles(folder, SITE)
+    assert S3Publisher(BUCKET, "site").publish(folder, feedback)
+    files, headers = published(s3)
+    assert files == SITE
+    assert headers["layers/big.js"]["ContentEncoding"] == "gzip"
+    assert headers["js/map.js"]["ContentType"] == "application/javascript"
+    assert feedback.messages[-1] == "Uploaded 4 files, 0 unchanged"
+
+
+def test_publish_changes(s3, tmp_path, feedback):
+    folder = str(tmp_path / "export")
+    writeFiles(folder, SITE)
+    S3Publisher(BUCKET, "site").publish(folder, feedback)
+    os.remove(os.path.join(folder, "css", "map.css"))
+    writeFiles(folder, {"js/map.js": "var map = 1;"})
+    assert S3Publisher(BUCKET, "site").publish(folder, feedback)
+    expected = dict(SITE, **{"js/map.js": "var map = 1;"})
+    del expected["css/map.css"]
+    assert published(s3)[0] == expected
+    assert feedback.messages[-1] == "Uploaded 1 files, 2 unchanged"
+
+
+def test_publish_headers(s3, tmp_path, feedback):
+    folder = str(tmp_path / "export")
+    writeFiles(folder, SITE)
+    S3Publisher(BUCKET, "site").publish(folder, feedback)
+    # the same files with other headers are uploaded again, while pages
+    # are never cached
+    assert S3Publisher(BUCKET, "site", maxAge=60).publish(folder, feedback)
+    assert feedback.messages[-1] == "Uploaded 3 files, 1 unchanged"
+    headers = published(s3)[1]
+    assert headers["js/map.js"]["CacheControl"] == "public, max-age=60"
+    assert headers["index.html"]["CacheControl"] == "no-cache"
+
+
+def test_publish_pipeline(s3, tmp_path, feedback):
+    folder = str(tmp_path / "export")
+    final = dict(SITE, **{"js/map.js": "var map = 2;"})
+
+    def write(path):
+        writeFiles(folder, {path: SITE[path]})
+
+    def finish():
+        # the writer rewrites a file it has offered, and removes another
+        writeFiles(folder, {"js/map.js": final["js/map.js"]})
+        os.remove(os.path.join(folder, "css", "map.css"))
+
+    del final["css/map.css"]
+    pipeline = Pipeline(folder, sorted(SITE), write, finish)
+    assert S3Publisher(BUCKET, "site").publish(None, feedback, pipeline)
+    assert published(s3)[0] == final
@@ -0,0 +1,93 @@
+# qgis-ol3 Creates OpenLayers map from QGIS layers
+# Copyright (C) 2014 Victor Olaya (volayaf@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+
+
+class Feedback(object):
+    """
+    Records the messages of an export instead of showing them.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def showFeedback(self, text):
+        self.messages.append(text)
+
+    def setProgress(self, value):
+        pass
+
+    def cancelled(self):
+        return False
+
+    def acceptCancel(self):
+        pass
+
+
+class Pipeline(object):
+    """
+    Hands files to a publisher the way PublishPipeline does, calling
+    write(path) before offering each of them and finish() before the
+    writer's result is given.
+    """
+
+    def __init__(self, folder, paths, write, finish=None):
+        self.folder = folder
+        self.paths = paths
+        self.write = write
+        self.finish = finish
+
+    def files(self):
+        for path in self.paths:
+            self.write(path)
+            yield path
+
+    def results(self):
+        if self.finish is not None:
+            self.finish()
+        result = type("WriterResult", (object,), {})()
+        result.folder = self.folder
+        return result
+
+
+def writeFiles(folder, files):
+    """
+    Writes files, a dict of contents by path relative to folder with
+    forward slashes.
+    """
+    for path, content in files.items():
+        path = os.path.join(folder, *path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+
+def readFiles(folder):
+    """
+    Returns the content of every file under folder, by its path relative
+    to folder with forward slashes.
+    """
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(folder):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path) as f:
+                files[os.path.relpath(path, folder).replace(
+                    os.sep, "/")] = f.read()
+    return files
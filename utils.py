@@ -21,8 +21,11 @@ import re
 import shutil
 import sys
 import json
-from io import StringIO
-from qgis.PyQt.QtCore import QDir, QVariant, Qt # Added Qt for ISODate
+import threading
+from contextlib import nullcontext
+from qgis.PyQt.QtCore import (QDir, QVariant, Qt, # Added Qt for ISODate
+                              QObject, QThread, QCoreApplication,
+                              pyqtSignal)
 from qgis.PyQt.QtGui import QPainter
 from qgis.core import (QgsApplication,
                        QgsProject, 
@@ -30,6 +33,8 @@ from qgis.core import (QgsApplication,
                        QgsCoordinateReferenceSystem,
                        QgsCoordinateTransform,
                        QgsVectorLayer,
+                       QgsVectorLayerFeatureSource,
+                       QgsSymbolLayerUtils,
                        QgsField,
                        QgsFeature,
                        QgsFeatureRequest,
@@ -49,12 +54,34 @@ from qgis.core import (QgsApplication,
                        Qgs25DRenderer,
                        QgsGeometryGeneratorSymbolLayer)
 from qgis.utils import Qgis
-import processing
 import tempfile
+import math
+import traceback
+import multiprocessing
+import subprocess
+from osgeo import gdal
+try:
+    from osgeo_utils import gdal2tiles
+    gdal2tiles_available = True
+except ImportError:
+    gdal2tiles_available = False
+from qgis2web.pointClusters import exportClusters, exportHeatmapGrid
+from qgis2web.bakedSymbology import SymbologyBaker
+from qgis2web.pageTemplate import loadTemplate
+from qgis2web.feedbackDialog import ExportCancelled
 
 NO_POPUP = 0
 ALL_ATTRIBUTES = 1
 
+RASTER_ENCODINGS = ("Auto", "PNG", "Paletted PNG", "JPEG", "WebP")
+RASTER_EXTENSIONS = {"PNG": "png", "Paletted PNG": "png", "JPEG": "jpg",
+                     "WebP": "webp"}
+RASTER_QUALITY = 75
+# renderers drawing a limited set of colours
+PALETTED_RENDERERS = ("paletted", "singlebandpseudocolor")
+# largest side of an exported image, beyond which browsers struggle
+MAX_RASTER_SIZE = 16384
+
 TYPE_MAP = {
     QgsWkbTypes.Point: 'Point',
     QgsWkbTypes.Point25D: 'Point',
@@ -129,6 +156,136 @@ BLEND_MODES = {
 
 PLACEMENT = ['bottomleft', 'topleft', 'topright', 'bottomleft', 'bottomright']
 
+# the feedback and feature sources of the export running in this thread
+exportState = threading.local()
+
+
+class MainThreadRunner(QObject):
+    """
+    Runs calls on the main thread for an export running in a background
+    task, for the steps Qt only allows there, such as rendering pixmaps.
+    """
+    request = pyqtSignal(object)
+
+    def __init__(self):
+        QObject.__init__(self)
+        self.request.connect(self.run, Qt.BlockingQueuedConnection)
+
+    def run(self, call):
+        call()
+
+
+mainThreadRunner = None
+mainThreadRunnerLock = threading.Lock()
+
+
+def runOnMainThread(function, *args, **kwargs):
+    """
+    Calls function on the main thread and returns its result, waiting for
+    it when called from a background task.
+    """
+    global mainThreadRunner
+    app = QCoreApplication.instance()
+    if app is None or QThread.currentThread() == app.thread():
+        return function(*args, **kwargs)
+    with mainThreadRunnerLock:
+        if mainThreadRunner is None:
+            mainThreadRunner = MainThreadRunner()
+            mainThreadRunner.moveToThread(app.thread())
+    result = {}
+
+    def call():
+        try:
+            result["value"] = function(*args, **kwargs)
+        except Exception as e:
+            result["error"] = e
+    mainThreadRunner.request.emit(call)
+    if "error" in result:
+        raise result["error"]
+    return result.get("value")
+
+
+def checkCancelled():
+    """
+    Raises ExportCancelled if the background export running in this thread
+    has been cancelled.
+    """
+    feedback = getattr(exportState, "feedback", None)
+    if feedback is not None and feedback.cancelled():
+        raise ExportCancelled()
+
+
+def filesWritten(folder):
+    """
+    Checkpoint of an export: the files written so far under folder, its
+    output folder, are complete and handed to the exporter publishing the
+    export as it runs, if any.
+    """
+    pipeline = getattr(exportState, "pipeline", None)
+    if pipeline is not None:
+        pipeline.offer(folder)
+
+
+def reportStage(name, layer=None, folder=None):
+    """
+    Returns a context timing a stage of the export running in this thread
+    in its ExportReport, if any.
+    """
+    report = getattr(exportState, "report", None)
+    if report is None:
+        return nullcontext()
+    return report.stage(name, layer, folder)
+
+
+def reportFeatures(features, vertices):
+    """
+    Counts features written for the layer whose stage is running.
+    """
+    report = getattr(exportState, "report", None)
+    if report is not None:
+        report.addFeatures(features, vertices)
+
+
+def snapshotFeatureSources(layers):
+    """
+    Returns a snapshot of the feature source of each vector layer, and of
+    the layers related to them, to be read by a background export. Must be
+    called on the main thread.
+    """
+    layers = [layer for layer in layers
+              if layer.type() == layer.VectorLayer]
+    layerIds = set(layer.id() for layer in layers)
+    relations = QgsProject.instance().relationManager().relations()
+    for relation in relations.values():
+        related = [relation.referencingLayer(), relation.referencedLayer()]
+        if any(layer is not None and layer.id() in layerIds
+               for layer in related):
+            layers.extend(layer for layer in related if layer is not None)
+    return {layer.id(): QgsVectorLayerFeatureSource(layer)
+            for layer in layers}
+
+
+def layerFeatures(layer, request=None):
+    """
+    Returns the features of a layer, read from the snapshot of its source
+    when a background export is running in this thread.
+    """
+    sources = getattr(exportState, "sources", None) or {}
+    source = sources.get(layer.id(), layer)
+    if request is None:
+        request = QgsFeatureRequest()
+    return source.getFeatures(request)
+
+
+def symbolPreviewImage(symbol, size):
+    """
+    Returns the legend icon of a symbol as a QImage, rendering its pixmap
+    on the main thread.
+    """
+    return runOnMainThread(
+        lambda: QgsSymbolLayerUtils.symbolPreviewPixmap(symbol,
+                                                        size).toImage())
+
 
 def tempFolder():
     tempDir = os.path.join(QDir.tempPath(), 'qgis2web')
@@ -205,7 +362,8 @@ def get_related_data(layer, feature):
 
                 related_layer_fields = related_layer.fields() # Get fields once
                 field_names = [field.name() for field in related_layer_fields]
-                for related_feature in related_layer.getFeatures(request):
+                for related_feature in layerFeatures(related_layer,
+                                                     request):
                     attributes = related_feature.attributes()
                     # Ensure attributes list length matches field names length
                     if len(attributes) != len(field_names):
@@ -246,7 +404,8 @@ def get_related_data(layer, feature):
     return all_relations_data
 
 
-def writeTmpLayer(layer, restrictToExtent, iface, extent, exportRelated=False): # Added exportRelated flag
+def writeTmpLayer(layer, restrictToExtent, iface, extent, exportRelated=False,
+                  bake=False): # Added exportRelated flag
     if layer.wkbType() == QgsWkbTypes.NoGeometry:
         return
 
@@ -285,6 +444,11 @@ def writeTmpLayer(layer, restrictToExtent, iface, extent, exportRelated=False):
         else:
             fieldType = "string"
         uri += '&field=' + fieldName + ":" + fieldType + "(%d)" % fieldLength
+    baker = None
+    if bake:
+        baker = SymbologyBaker(layer)
+        for fieldName, fieldType in baker.fields():
+            uri += '&field=' + fieldName + ":" + fieldType
     # Add related data field to URI if export is enabled
     if exportRelated:
         # Increase size significantly to accommodate potentially large JSON strings
@@ -311,76 +475,133 @@ def writeTmpLayer(layer, restrictToExtent, iface, extent, exportRelated=False):
         projectedExtent = transform.transformBoundingBox(extent)
         request = QgsFeatureRequest(projectedExtent)
         request.setFlags(QgsFeatureRequest.ExactIntersect)
-        features = layer.getFeatures(request)
+        features = layerFeatures(layer, request)
     else:
-        features = layer.getFeatures()
-    for feature in features:
-        outFeat = QgsFeature()
-        if feature.geometry() is not None:
-            outFeat.setGeometry(feature.geometry())
-        attrs = [feature[f] for f in usedFields]
-        # Fetch and add related data if enabled
-        QgsMessageLog.logMessage(f"a1 - {layer.name()} feature ID: {feature.id()} - {exportRelated}", "qgis2web", level=Qgis.Warning)
-        if exportRelated and related_data_field_index != -1:
-            try:
-                related_data = get_related_data(layer, feature)
-                # Only add if related_data is not empty
-                if related_data:
-                    # Ensure complex objects are handled (like datetime) if not handled in get_related_data
-                    related_json = json.dumps(related_data, default=str)
-                    attrs.append(related_json)
-                else:
-                    attrs.append(None) # Append None or empty string if no related data
-            except Exception as e:
-                QgsMessageLog.logMessage(f"Error getting or serializing related data for feature {feature.id()} in layer {layer.name()}: {e}", "qgis2web", level=Qgis.Warning)
-                attrs.append(None) # Append None in case of error
-        elif exportRelated:
-             # Append None if exportRelated is true but index is bad (shouldn't happen often)
-             attrs.append(None)
-
-        if attrs:
-             # Ensure the number of attributes matches the number of fields in newlayer
-             if len(attrs) == len(newlayer.fields()):
-                 outFeat.setAttributes(attrs)
-             else:
-                  QgsMessageLog.logMessage(f"Attribute count mismatch when setting attributes for feature in {newlayer.name()}. Expected {len(newlayer.fields())}, got {len(attrs)}. Skipping feature.", "qgis2web", level=Qgis.Warning)
-                  continue # Skip adding this feature if attribute count is wrong
-
-        # Add feature to the temporary layer
-        success, added_features = writer.addFeatures([outFeat])
-        if not success:
-             QgsMessageLog.logMessage(f"Failed to add feature to temporary layer for {layer.name()}", "qgis2web", level=Qgis.Warning)
+        features = layerFeatures(layer)
+    featureCount = 0
+    vertexCount = 0
+    if baker is not None:
+        baker.start()
+    try:
+        for feature in features:
+            checkCancelled()
+            outFeat = QgsFeature()
+            if feature.geometry() is not None:
+                outFeat.setGeometry(feature.geometry())
+                if not feature.geometry().isNull():
+                    vertexCount += \
+                        feature.geometry().constGet().nCoordinates()
+            featureCount += 1
+            attrs = [feature[f] for f in usedFields]
+            if baker is not None:
+                attrs += baker.values(feature)
+            # Fetch and add related data if enabled
+            QgsMessageLog.logMessage(f"a1 - {layer.name()} feature ID: {feature.id()} - {exportRelated}", "qgis2web", level=Qgis.Warning)
+            if exportRelated and related_data_field_index != -1:
+                try:
+                    related_data = get_related_data(layer, feature)
+                    # Only add if related_data is not empty
+                    if related_data:
+                        # Ensure complex objects are handled (like datetime) if not handled in get_related_data
+                        related_json = json.dumps(related_data, default=str)
+                        attrs.append(related_json)
+                    else:
+                        attrs.append(None) # Append None or empty string if no related data
+                except Exception as e:
+                    QgsMessageLog.logMessage(f"Error getting or serializing related data for feature {feature.id()} in layer {layer.name()}: {e}", "qgis2web", level=Qgis.Warning)
+                    attrs.append(None) # Append None in case of error
+            elif exportRelated:
+                 # Append None if exportRelated is true but index is bad (shouldn't happen often)
+                 attrs.append(None)
+
+            if attrs:
+                 # Ensure the number of attributes matches the number of fields in newlayer
+                 if len(attrs) == len(newlayer.fields()):
+                     outFeat.setAttributes(attrs)
+                 else:
+                      QgsMessageLog.logMessage(f"Attribute count mismatch when setting attributes for feature in {newlayer.name()}. Expected {len(newlayer.fields())}, got {len(attrs)}. Skipping feature.", "qgis2web", level=Qgis.Warning)
+                      continue # Skip adding this feature if attribute count is wrong
+
+            # Add feature to the temporary layer
+            success, added_features = writer.addFeatures([outFeat])
+            if not success:
+                 QgsMessageLog.logMessage(f"Failed to add feature to temporary layer for {layer.name()}", "qgis2web", level=Qgis.Warning)
+    finally:
+        if baker is not None:
+            baker.stop()
+    reportFeatures(featureCount, vertexCount)
     return newlayer
 
 
 def exportLayers(iface, layers, folder, precision, optimize, popupField, json,
-                 restrictToExtent, extent, feedback, matchCRS, exportRelatedList): # Changed layersData to exportRelatedList
+                 restrictToExtent, extent, feedback, matchCRS, exportRelatedList,
+                 clusterIndex=None, clusterZooms=None, heatmapGrid=None,
+                 rasterZooms=None, rasterMaxZoom=None,
+                 rasterQuality=RASTER_QUALITY, rasterCOG=False,
+                 bakedSymbology=None): # Changed layersData to exportRelatedList
     feedback.showFeedback('Exporting layers...')
+    rasterExports = {}
     layersFolder = os.path.join(folder, "layers")
     QDir().mkpath(layersFolder)
-    for count, (layer, encode2json, popup, exportRelated) in enumerate(zip(layers, json, popupField, exportRelatedList)):
+    if clusterIndex is None:
+        clusterIndex = [False] * len(layers)
+    if heatmapGrid is None:
+        heatmapGrid = [False] * len(layers)
+    if bakedSymbology is None:
+        bakedSymbology = [False] * len(layers)
+    for count, (layer, encode2json, popup, exportRelated,
+                precomputed, aggregated, baked) in enumerate(
+                    zip(layers, json, popupField, exportRelatedList,
+                        clusterIndex, heatmapGrid, bakedSymbology)):
+        checkCancelled()
+        feedback.setProgress(int(100 * count / len(layers)))
         sln = safeName(layer.name()) + "_" + str(count)
         vts = layer.customProperty("VectorTilesReader/vector_tile_source")
-        if (layer.type() == layer.VectorLayer and vts is None and
-                (layer.providerType() != "WFS" or encode2json)):
-            feedback.showFeedback('Exporting %s to JSON...' % layer.name())
-            crs = QgsCoordinateReferenceSystem("EPSG:4326")
-            # Pass exportRelated flag to exportVector
-            exportVector(layer, sln, layersFolder, restrictToExtent,
-                         iface, extent, precision, crs, optimize, exportRelated)
-            feedback.completeStep()
-        elif (layer.type() == layer.RasterLayer and
-                layer.providerType() != "wms"):
-            feedback.showFeedback('Exporting %s as raster...' % layer.name())
-            exportRaster(layer, count, layersFolder, feedback, iface, matchCRS)
-            feedback.completeStep()
+        with reportStage("data", sln, layersFolder):
+            if (layer.type() == layer.VectorLayer and vts is None and
+                    (layer.providerType() != "WFS" or encode2json)):
+                feedback.showFeedback('Exporting %s to JSON...' %
+                                      layer.name())
+                crs = QgsCoordinateReferenceSystem("EPSG:4326")
+                # Pass exportRelated flag to exportVector
+                exportVector(layer, sln, layersFolder, restrictToExtent,
+                             iface, extent, precision, crs, optimize,
+                             exportRelated,
+                             clusterZooms if precomputed else None,
+                             clusterZooms if aggregated else None, baked)
+                feedback.completeStep()
+            elif (layer.type() == layer.RasterLayer and
+                    layer.providerType() != "wms"):
+                feedback.showFeedback('Exporting %s as raster...' %
+                                      layer.name())
+                grid = None
+                if rasterZooms:
+                    grid = exportRasterTiles(layer, count, layersFolder,
+                                             feedback, iface, matchCRS,
+                                             *rasterZooms)
+                elif rasterCOG:
+                    grid = exportRasterCOG(layer, count, layersFolder,
+                                           feedback, rasterMaxZoom,
+                                           rasterQuality)
+                if grid is None:
+                    image = exportRaster(layer, count, layersFolder, feedback,
+                                         iface, matchCRS, rasterMaxZoom,
+                                         rasterQuality)
+                    rasterExports[sln] = {"image": image}
+                else:
+                    rasterExports[sln] = grid
+                feedback.completeStep()
+        filesWritten(folder)
     feedback.completeStep()
+    return rasterExports
 
 
 def exportVector(layer, sln, layersFolder, restrictToExtent, iface,
-                  extent, precision, crs, minify, exportRelated=False): # Added exportRelated flag
+                  extent, precision, crs, minify, exportRelated=False,
+                  clusterZooms=None, heatmapZooms=None, bake=False): # Added exportRelated flag
     canvas = iface.mapCanvas()
-    cleanLayer = writeTmpLayer(layer, restrictToExtent, iface, extent, exportRelated)
+    cleanLayer = writeTmpLayer(layer, restrictToExtent, iface, extent,
+                               exportRelated, bake)
     # Check if cleanLayer was created successfully
     if cleanLayer is None:
         QgsMessageLog.logMessage(f"Skipping export for layer {layer.name()} due to temporary layer creation failure.", "qgis2web", level=Qgis.Warning)
@@ -411,14 +632,22 @@ def exportVector(layer, sln, layersFolder, restrictToExtent, iface,
         # Use writeAsVectorFormat for QGIS versions < 3.10.3 for backwards compatibility
         result = QgsVectorFileWriter.writeAsVectorFormat(cleanLayer, tmpPath, "utf-8", crs, 'GeoJson', 0, layerOptions=options)   
     if result:
-        with open(path, mode="w", encoding="utf8") as f:
-            f.write("var %s = " % ("json_" + sln))
-            with open(tmpPath, encoding="utf8") as tmpFile:
-                for line in tmpFile:
-                    if minify:
-                        line = line.strip("\n\t ")
-                        line = removeSpaces(line)
-                    f.write(line)
+        if clusterZooms:
+            exportClusters(tmpPath, sln, layersFolder, clusterZooms,
+                           precision, minify)
+        elif heatmapZooms:
+            exportHeatmapGrid(tmpPath, sln, layersFolder, heatmapZooms,
+                              layer.renderer().weightExpression(),
+                              precision, minify)
+        else:
+            with open(path, mode="w", encoding="utf8") as f:
+                f.write("var %s = " % ("json_" + sln))
+                with open(tmpPath, encoding="utf8") as tmpFile:
+                    for line in tmpFile:
+                        if minify:
+                            line = line.strip("\n\t ")
+                            line = removeSpaces(line)
+                        f.write(line)
         os.remove(tmpPath)
     else:
         QgsMessageLog.logMessage(
@@ -442,7 +671,7 @@ def add25dAttributes(cleanLayer, layer, canvas):
     fields = cleanLayer.fields()
     renderer = layer.renderer()
     renderContext = QgsRenderContext.fromMapSettings(canvas.mapSettings())
-    feats = layer.getFeatures()
+    feats = layerFeatures(layer)
     context = QgsExpressionContext()
     context.appendScope(QgsExpressionContextUtils.layerScope(layer))
     expression = QgsExpression('eval(@qgis_25d_height)')
@@ -481,16 +710,203 @@ def add25dAttributes(cleanLayer, layer, canvas):
     renderer.stopRender(renderContext)
 
 
-def exportRaster(layer, count, layersFolder, feedback, iface, matchCRS):
-    feedback.showFeedback("Exporting %s to PNG..." % layer.name())
+def exportRaster(layer, count, layersFolder, feedback, iface, matchCRS,
+                 maxZoom=None, quality=RASTER_QUALITY):
+    """
+    Exports a raster layer as a single image, in EPSG:3857 unless it
+    already matches the project CRS. The encoding is taken from the
+    "qgis2web/Raster encoding" layer property, and the image is no larger
+    than needed to show all its detail up to maxZoom.
+    :return: the file name of the image in layersFolder, or None if the
+    layer could not be read and is left out
+    """
+    feedback.showFeedback("Exporting %s as image..." % layer.name())
     name_ts = safeName(layer.name()) + str(count) + str(int(time.time()))
+    encoding = getRasterEncoding(layer)
+
+    projectCRS = iface.mapCanvas().mapSettings().destinationCrs()
+    crsSrc = layer.crs()
+    extentRep = getMercatorExtent(layer)
+
+    # Render the layer style into an in-memory raster, warp it through a
+    # virtual dataset and encode the image from memory
+    piped_file = renderRaster(layer, name_ts,
+                              getRasterBudget(layer, extentRep, maxZoom))
+    warped = None
+    image = None
+    try:
+        source = piped_file
+        if not (matchCRS and crsSrc == projectCRS):
+            try:
+                warped = gdal.Warp("", piped_file, format="VRT",
+                                   srcSRS=crsSrc.toWkt(),
+                                   dstSRS="EPSG:3857",
+                                   outputBounds=(extentRep.xMinimum(),
+                                                 extentRep.yMinimum(),
+                                                 extentRep.xMaximum(),
+                                                 extentRep.yMaximum()),
+                                   resampleAlg="cubic",
+                                   multithread=True,
+                                   warpOptions=["NUM_THREADS=ALL_CPUS"])
+            except RuntimeError:
+                warped = None
+            if warped is not None:
+                source = warped
+            else:
+                QgsMessageLog.logMessage(
+                    "Could not reproject %s, exporting it unprojected" %
+                    layer.name(), "qgis2web", level=Qgis.Warning)
+        # Warp once, the pixels are read again by the encoders
+        try:
+            image = gdal.Translate("", source, format="MEM")
+        except RuntimeError:
+            image = None
+        if image is None:
+            feedback.showFeedback("Could not read %s, skipping it" %
+                                  layer.name())
+            QgsMessageLog.logMessage(
+                "Could not read %s: %s" % (layer.name(),
+                                           gdal.GetLastErrorMsg()),
+                "qgis2web", level=Qgis.Warning)
+            return None
+        alpha = hasTransparency(image)
+        if encoding == "Auto":
+            encoding = getAutoEncoding(layer, alpha)
+        if encoding == "WebP" and gdal.GetDriverByName("WEBP") is None:
+            QgsMessageLog.logMessage(
+                "GDAL cannot write WebP, exporting %s as PNG" % layer.name(),
+                "qgis2web", level=Qgis.Warning)
+            encoding = "PNG"
+        fileName = "%s_%d.%s" % (safeName(layer.name()), count,
+                                 RASTER_EXTENSIONS[encoding])
+        writeRasterImage(image, os.path.join(layersFolder, fileName),
+                         encoding, alpha, quality)
+    finally:
+        image = None
+        warped = None
+        removeRaster(piped_file)
+    return fileName
+
+
+def getMercatorExtent(layer):
+    """
+    Returns the extent of a layer in EPSG:3857.
+    """
+    crsSrc = layer.crs()
+    crsDest = QgsCoordinateReferenceSystem(3857)
+    try:
+        xform = QgsCoordinateTransform(crsSrc, crsDest,
+                                       QgsProject.instance())
+    except Exception:
+        xform = QgsCoordinateTransform(crsSrc, crsDest)
+    return xform.transformBoundingBox(layer.extent())
+
+
+def getRasterEncoding(layer):
+    """
+    Returns the image encoding chosen for a raster layer.
+    """
+    encoding = layer.customProperty("qgis2web/Raster encoding", "Auto")
+    if encoding not in RASTER_ENCODINGS:
+        return "Auto"
+    return encoding
+
+
+def getAutoEncoding(layer, alpha):
+    """
+    Picks an encoding from the renderer of a layer: a palette for
+    classified rasters, and a lossy format for continuous ones.
+    """
+    if layer.renderer().type() in PALETTED_RENDERERS:
+        return "Paletted PNG"
+    if not alpha:
+        return "JPEG"
+    if gdal.GetDriverByName("WEBP") is not None:
+        return "WebP"
+    return "PNG"
 
-    # We need to create a new file to export style
-    piped_file = os.path.join(tempfile.gettempdir(), name_ts + '_piped.tif')
 
+def getRasterBudget(layer, extent, maxZoom):
+    """
+    Returns the width in pixels to render a raster layer at, so that it
+    holds all its detail up to maxZoom but no more.
+    :param extent: the extent of the layer in EPSG:3857
+    """
+    width = max(1, layer.width())
+    if maxZoom is not None:
+        resolution = 156543.03392804097 / 2 ** int(maxZoom)
+        width = min(width, int(math.ceil(extent.width() / resolution)))
+    longest = max(width, width * layer.height() / float(max(1,
+                                                             layer.width())))
+    if longest > MAX_RASTER_SIZE:
+        width = int(width * MAX_RASTER_SIZE / longest)
+    return max(1, width)
+
+
+def hasTransparency(dataset):
+    """
+    Returns True if any pixel of an RGBA dataset is not fully opaque.
+    """
+    if dataset.RasterCount < 4:
+        return False
+    return dataset.GetRasterBand(4).ComputeRasterMinMax(False)[0] < 255
+
+
+def writeRasterImage(image, out_raster, encoding, alpha, quality):
+    """
+    Encodes an RGBA dataset to out_raster, dropping its alpha band when
+    every pixel is opaque.
+    """
+    bands = [1, 2, 3, 4] if alpha else [1, 2, 3]
+    if encoding == "Paletted PNG":
+        gdal.Translate(out_raster, palettizeRaster(image, alpha),
+                       format="PNG", creationOptions=["ZLEVEL=9"])
+    elif encoding == "JPEG":
+        gdal.Translate(out_raster, image, format="JPEG", bandList=[1, 2, 3],
+                       creationOptions=["QUALITY=%d" % quality])
+    elif encoding == "WebP":
+        gdal.Translate(out_raster, image, format="WEBP", bandList=bands,
+                       creationOptions=["QUALITY=%d" % quality])
+    else:
+        gdal.Translate(out_raster, image, format="PNG", bandList=bands,
+                       creationOptions=["ZLEVEL=9"])
+    # georeferencing is written by the map scripts, not needed beside it
+    if os.path.exists(out_raster + ".aux.xml"):
+        os.remove(out_raster + ".aux.xml")
+
+
+def palettizeRaster(image, alpha):
+    """
+    Reduces an RGBA dataset to an 8-bit paletted one. When the image has
+    transparent pixels, the last palette entry is kept for them.
+    """
+    red, green, blue = (image.GetRasterBand(b) for b in (1, 2, 3))
+    colorTable = gdal.ColorTable()
+    gdal.ComputeMedianCutPCT(red, green, blue, 255 if alpha else 256,
+                             colorTable)
+    paletted = gdal.GetDriverByName("MEM").Create("", image.RasterXSize,
+                                                  image.RasterYSize, 1,
+                                                  gdal.GDT_Byte)
+    band = paletted.GetRasterBand(1)
+    gdal.DitherRGB2PCT(red, green, blue, band, colorTable)
+    if alpha:
+        colorTable.SetColorEntry(255, (0, 0, 0, 0))
+        indexes = band.ReadAsArray()
+        indexes[image.GetRasterBand(4).ReadAsArray() < 128] = 255
+        band.WriteArray(indexes)
+    band.SetRasterColorTable(colorTable)
+    return paletted
+
+
+def writePipedRaster(layer, piped_file, width=None):
+    """
+    Renders a raster layer through its renderer pipe to a GeoTIFF, at its
+    native resolution unless a width in pixels is given.
+    :return: True if the raster has been written
+    """
     piped_extent = layer.extent()
     # piped_width = layer.height()
-    piped_height = layer.width()
+    piped_height = width or layer.width()
     piped_crs = layer.crs()
     piped_renderer = layer.renderer()
     piped_provider = layer.dataProvider()
@@ -501,129 +917,223 @@ def exportRaster(layer, count, layersFolder, feedback, iface, matchCRS):
 
     file_writer = QgsRasterFileWriter(piped_file)
 
-    file_writer.writeRaster(pipe, piped_height, -1, piped_extent, piped_crs)
-
-    # Export layer as PNG
-    out_raster = os.path.join(layersFolder,
-                              safeName(layer.name()) + "_" +
-                              str(count) + ".png")
+    error = file_writer.writeRaster(pipe, piped_height, -1, piped_extent,
+                                    piped_crs)
+    return error == QgsRasterFileWriter.NoError
 
-    projectCRS = iface.mapCanvas().mapSettings().destinationCrs()
-    if not (matchCRS and layer.crs() == projectCRS):
-        # Extent of the layer in EPSG:3857
-        crsSrc = layer.crs()
-        crsDest = QgsCoordinateReferenceSystem(3857)
-        try:
-            xform = QgsCoordinateTransform(crsSrc, crsDest,
-                                           QgsProject.instance())
-        except Exception:
-            xform = QgsCoordinateTransform(crsSrc, crsDest)
-        extentRep = xform.transformBoundingBox(layer.extent())
 
-        extentRepNew = ','.join([str(extentRep.xMinimum()),
-                                 str(extentRep.xMaximum()),
-                                 str(extentRep.yMinimum()),
-                                 str(extentRep.yMaximum())])
+def renderRaster(layer, name, width=None):
+    """
+    Renders a raster layer to an in-memory GeoTIFF, or to a temporary
+    file when it cannot be written to /vsimem/.
+    :return: the path of the rendered raster, to be freed with removeRaster
+    """
+    piped_file = "/vsimem/qgis2web/%s_piped.tif" % name
+    if (writePipedRaster(layer, piped_file, width) and
+            gdal.VSIStatL(piped_file) is not None):
+        return piped_file
+    removeRaster(piped_file)
+    piped_file = os.path.join(tempfile.gettempdir(), name + '_piped.tif')
+    writePipedRaster(layer, piped_file, width)
+    return piped_file
 
-        # Reproject in 3857
-        piped_3857 = os.path.join(tempfile.gettempdir(),
-                                  name_ts + '_piped_3857.tif')
-        # qgis_version = Qgis.QGIS_VERSION
 
-        old_stdout = sys.stdout
-        sys.stdout = mystdout = StringIO()
-        try:
-            processing.algorithmHelp("gdal:warpreproject")
-        except Exception:
-            pass
-        sys.stdout = old_stdout
-
-        params = {
-            "INPUT": piped_file,
-            "SOURCE_CRS": layer.crs().authid(),
-            "TARGET_CRS": "EPSG:3857",
-            "NODATA": 0,
-            "TARGET_RESOLUTION": 0,
-            "RESAMPLING": 2,
-            "TARGET_EXTENT": extentRepNew,
-            "EXT_CRS": "EPSG:3857",
-            "TARGET_EXTENT_CRS": "EPSG:3857",
-            "DATA_TYPE": 0,
-            "COMPRESS": 4,
-            "JPEGCOMPRESSION": 75,
-            "ZLEVEL": 6,
-            "PREDICTOR": 1,
-            "TILED": False,
-            "BIGTIFF": 0,
-            "TFW": False,
-            "MULTITHREADING": False,
-            "COPY_SUBDATASETS": False,
-            "EXTRA": "",
-            "OUTPUT": piped_3857
-        }
+def removeRaster(path):
+    """
+    Deletes a raster written by renderRaster, together with its sidecar
+    files.
+    """
+    for sidecar in (path, path + ".aux.xml"):
+        if sidecar.startswith("/vsimem/"):
+            if gdal.VSIStatL(sidecar) is not None:
+                gdal.Unlink(sidecar)
+        elif os.path.exists(sidecar):
+            os.remove(sidecar)
 
-        warpArgs = {}
 
-        lines = mystdout.getvalue()
-        for count, line in enumerate(lines.split("\n")):
-            if count != 0 and ":" in line:
-                try:
-                    k = line.split(":")[0]
-                    warpArgs[k] = params[k]
-                except Exception:
-                    pass
+def getPythonInterpreter():
+    """
+    Returns the path of the Python interpreter QGIS runs on, or None if it
+    cannot be found. sys.executable is the QGIS binary itself on Windows
+    and macOS, so the interpreter is looked up next to it.
+    """
+    if os.path.basename(sys.executable).lower().startswith("python"):
+        return sys.executable
+    if os.name == "nt":
+        candidates = ["python.exe", "python3.exe"]
+    else:
+        candidates = [os.path.join("bin", "python3"),
+                      os.path.join("bin", "python")]
+    for candidate in candidates:
+        python = os.path.join(sys.exec_prefix, candidate)
+        if os.path.isfile(python) and os.access(python, os.X_OK):
+            return python
+    return None
 
-        try:
-            processing.run("gdal:warpreproject", warpArgs)
-        except Exception:
-            shutil.copyfile(piped_file, piped_3857)
 
-        try:
-            processing.run("gdal:translate", {"INPUT": piped_3857,
-                                              "OUTSIZE": 100,
-                                              "OUTSIZE_PERC": True,
-                                              "NODATA": 0,
-                                              "EXPAND": 0,
-                                              "TARGET_CRS": "",
-                                              "PROJWIN": extentRepNew,
-                                              "SDS": False,
-                                              "DATA_TYPE": 0,
-                                              "COMPRESS": 4,
-                                              "JPEGCOMPRESSION": 75,
-                                              "ZLEVEL": 6,
-                                              "PREDICTOR": 1,
-                                              "TILED": False,
-                                              "BIGTIFF": 0,
-                                              "TFW": False,
-                                              "COPY_SUBDATASETS": False,
-                                              "OPTIONS": "",
-                                              "OUTPUT": out_raster})
-        except Exception:
-            shutil.copyfile(piped_3857, out_raster)
-    else:
-        srcExtent = ','.join([str(piped_extent.xMinimum()),
-                              str(piped_extent.xMaximum()),
-                              str(piped_extent.yMinimum()),
-                              str(piped_extent.yMaximum())])
-        processing.run("gdal:translate", {"INPUT": piped_file,
-                                          "OUTSIZE": 100,
-                                          "OUTSIZE_PERC": True,
-                                          "NODATA": 0,
-                                          "EXPAND": 0,
-                                          "TARGET_CRS": "",
-                                          "PROJWIN": srcExtent,
-                                          "SDS": False,
-                                          "DATA_TYPE": 0,
-                                          "COMPRESS": 4,
-                                          "JPEGCOMPRESSION": 75,
-                                          "ZLEVEL": 6,
-                                          "PREDICTOR": 1,
-                                          "TILED": False,
-                                          "BIGTIFF": 0,
-                                          "TFW": False,
-                                          "COPY_SUBDATASETS": False,
-                                          "OPTIONS": "",
-                                          "OUTPUT": out_raster})
+def runTiler(args):
+    """
+    Runs gdal2tiles with the given arguments. With a Python interpreter
+    available it runs in a child process using one worker per CPU, which
+    can be killed when the export is cancelled. Otherwise it runs in this
+    process with a single worker, as forking or spawning the QGIS process
+    from an export thread is not safe.
+    """
+    python = getPythonInterpreter()
+    if python is None:
+        gdal2tiles.main(["gdal2tiles.py", "--processes=1"] + args)
+        return
+    command = [python, "-m", "osgeo_utils.gdal2tiles",
+               "--processes=%d" % max(1, multiprocessing.cpu_count())]
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(path for path in sys.path if path)
+    process = subprocess.Popen(
+        command + args, env=env, stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+    try:
+        while True:
+            try:
+                stderr = process.communicate(timeout=0.5)[1]
+                break
+            except subprocess.TimeoutExpired:
+                checkCancelled()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError("gdal2tiles failed: %s" %
+                           stderr.decode("utf-8", "replace"))
+
+
+def exportRasterTiles(layer, count, layersFolder, feedback, iface, matchCRS,
+                      minZoom, maxZoom):
+    """
+    Exports a raster layer as a z/x/y tile pyramid, rendered through the
+    layer pipe and cut with gdal2tiles, see runTiler.
+    Transparent tiles are not written.
+    :return: a dict describing the tile grid, or None if the layer
+    could not be tiled and has to be exported as a single image
+    """
+    if not gdal2tiles_available:
+        QgsMessageLog.logMessage(
+            "gdal2tiles is not available, exporting %s as an image" %
+            layer.name(), "qgis2web", level=Qgis.Warning)
+        return None
+    feedback.showFeedback("Exporting %s to tiles..." % layer.name())
+    sln = safeName(layer.name()) + "_" + str(count)
+    name_ts = safeName(layer.name()) + str(count) + str(int(time.time()))
+    piped_file = os.path.join(tempfile.gettempdir(), name_ts + '_piped.tif')
+    writePipedRaster(layer, piped_file)
+    tilesFolder = os.path.join(layersFolder, sln)
+    projectCRS = iface.mapCanvas().mapSettings().destinationCrs()
+    args = ["--xyz", "--exclude", "-w", "none"]
+    temp_files = [piped_file]
+    try:
+        if matchCRS and projectCRS.authid() != "EPSG:3857":
+            # tile the raster in the project CRS, on its own grid
+            # a virtual warped dataset, so the reprojection runs in the
+            # tiling workers instead of writing another full copy
+            projected = os.path.join(tempfile.gettempdir(),
+                                     name_ts + '_piped_project.vrt')
+            temp_files.append(projected)
+            gdal.Warp(projected, piped_file, format="VRT",
+                      dstSRS=projectCRS.toWkt(), dstAlpha=True,
+                      multithread=True, warpOptions=["NUM_THREADS=ALL_CPUS"])
+            source = gdal.Open(projected)
+            (x0, xRes, _, y0, _, yRes) = source.GetGeoTransform()
+            width = source.RasterXSize
+            height = source.RasterYSize
+            source = None
+            nativeZoom = max(0, int(math.ceil(
+                math.log(max(width, height) / 256.0, 2))))
+            runTiler(args + ["-p", "raster", projected, tilesFolder])
+            grid = {"projection": projectCRS.authid(),
+                    "origin": [x0, y0],
+                    "extent": [x0, y0 + height * yRes,
+                               x0 + width * xRes, y0],
+                    "resolutions": [xRes * 2 ** (nativeZoom - z)
+                                    for z in range(nativeZoom + 1)],
+                    "minZoom": 0,
+                    "maxZoom": nativeZoom}
+        else:
+            crsDest = QgsCoordinateReferenceSystem(3857)
+            xform = QgsCoordinateTransform(layer.crs(), crsDest,
+                                           QgsProject.instance())
+            extent = xform.transformBoundingBox(layer.extent())
+            pixelSize = extent.width() / max(1, layer.width())
+            # deepest zoom at which tiles still add detail
+            nativeZoom = int(math.ceil(
+                math.log(156543.03392804097 / pixelSize, 2)))
+            maxZoom = max(minZoom, min(maxZoom, nativeZoom))
+            runTiler(args + ["-p", "mercator",
+                             "-z", "%d-%d" % (minZoom, maxZoom),
+                             piped_file, tilesFolder])
+            grid = {"projection": "EPSG:3857",
+                    "minZoom": minZoom,
+                    "maxZoom": maxZoom}
+    except ExportCancelled:
+        raise
+    except (Exception, SystemExit):
+        QgsMessageLog.logMessage(traceback.format_exc(), "qgis2web",
+                                 level=Qgis.Critical)
+        return None
+    finally:
+        for temp_file in temp_files:
+            removeRaster(temp_file)
+    return grid
+
+
+def exportRasterCOG(layer, count, layersFolder, feedback, maxZoom=None,
+                    quality=RASTER_QUALITY):
+    """
+    Exports a raster layer as a Cloud-Optimized GeoTIFF aligned on the
+    Web Mercator tile grid, with WebP tiles and one overview per zoom
+    level, so that web maps only read the tiles of the current view with
+    HTTP range requests.
+    :return: a dict describing the file, or None if GDAL cannot write it
+    and the layer has to be exported as a single image
+    """
+    if (gdal.GetDriverByName("COG") is None or
+            gdal.GetDriverByName("WEBP") is None):
+        QgsMessageLog.logMessage(
+            "GDAL cannot write WebP Cloud-Optimized GeoTIFFs, exporting %s "
+            "as an image" % layer.name(), "qgis2web", level=Qgis.Warning)
+        return None
+    feedback.showFeedback("Exporting %s to Cloud-Optimized GeoTIFF..." %
+                          layer.name())
+    name_ts = safeName(layer.name()) + str(count) + str(int(time.time()))
+    fileName = "%s_%d.tif" % (safeName(layer.name()), count)
+    out_raster = os.path.join(layersFolder, fileName)
+    piped_file = renderRaster(layer, name_ts,
+                              getRasterBudget(layer, getMercatorExtent(layer),
+                                              maxZoom))
+    try:
+        # the COG driver reprojects to the tile grid itself
+        gdal.Translate(out_raster, piped_file, format="COG",
+                       creationOptions=["TILING_SCHEME=GoogleMapsCompatible",
+                                        "COMPRESS=WEBP",
+                                        "QUALITY=%d" % quality,
+                                        "RESAMPLING=CUBIC",
+                                        "SPARSE_OK=TRUE",
+                                        "BIGTIFF=IF_SAFER",
+                                        "NUM_THREADS=ALL_CPUS"])
+        cog = gdal.Open(out_raster)
+        resolution = cog.GetGeoTransform()[1]
+        overviews = cog.GetRasterBand(1).GetOverviewCount()
+        cog = None
+    except Exception:
+        QgsMessageLog.logMessage(traceback.format_exc(), "qgis2web",
+                                 level=Qgis.Critical)
+        removeRaster(out_raster)
+        return None
+    finally:
+        removeRaster(piped_file)
+    nativeZoom = int(round(math.log(156543.03392804097 / resolution, 2)))
+    return {"cog": fileName,
+            "minZoom": max(0, nativeZoom - overviews),
+            "maxZoom": nativeZoom}
 
 
 def is25d(layer, canvas, restrictToExtent, extent):
@@ -658,9 +1168,9 @@ def is25d(layer, canvas, restrictToExtent, extent):
         if restrictToExtent and extent == "Canvas extent":
             request = QgsFeatureRequest(canvas.extent())
             request.setFlags(QgsFeatureRequest.ExactIntersect)
-            features = layer.getFeatures(request)
+            features = layerFeatures(layer, request)
         else:
-            features = layer.getFeatures()
+            features = layerFeatures(layer)
         renderer.startRender(renderContext, fields)
         for feature in features:
             symbol = renderer.symbolForFeature(feature, renderContext)
@@ -738,12 +1248,7 @@ def replaceInTemplate(template, values):
                         "qgis2web",
                         "templates",
                         template)
-    with open(path) as f:
-        lines = f.readlines()
-    s = "".join(lines)
-    for name, value in values.items():
-        s = s.replace(name, value)
-    return s
+    return loadTemplate(path).render(values)
 
 
 def exportImages(layer, field, layerFileName):
@@ -756,7 +1261,8 @@ def exportImages(layer, field, layerFileName):
     fr = QgsFeatureRequest()
     fr.setSubsetOfAttributes([field_index])
 
-    for feature in layer.getFeatures(fr):
+    for feature in layerFeatures(layer, fr):
+        checkCancelled()
         photo_file_name = feature.attribute(field)
         if type(photo_file_name) is not str:
             continue
@@ -786,6 +1292,81 @@ def handleHiddenField(layer, field):
         fieldName = field
     return fieldName
 
+
+def getCategoryLookup(name, categories):
+    """
+    Returns the JavaScript of a function name(value) giving the index of the
+    category of a string value, or -1, looked up in a Map instead of
+    compared against every category.
+    :param categories: the category values as strings, None for the default
+    category
+    """
+    table = {}
+    default = -1
+    for index, value in enumerate(categories):
+        if value is None:
+            if default < 0:
+                default = index
+        elif value not in table:
+            table[value] = index
+    entries = ",\n".join("    [%s, %d]" % (json.dumps(value), index)
+                         for value, index in table.items())
+    return """
+var %(name)s_table = new Map([
+%(entries)s
+]);
+function %(name)s(value) {
+    var index = %(name)s_table.get(value);
+    return index === undefined ? %(default)d : index;
+}""" % {"name": name, "entries": entries, "default": default}
+
+
+def getRangeLookup(name, ranges):
+    """
+    Returns the JavaScript of a function name(value) giving the index of the
+    first range holding a value, or -1. Ranges in ascending order are
+    binary searched, others are scanned in order.
+    :param ranges: the (lower, upper) bounds of the ranges
+    """
+    lowers = ["%f" % lower for lower, upper in ranges]
+    uppers = ["%f" % upper for lower, upper in ranges]
+    bounds = [(float(lower), float(upper))
+              for lower, upper in zip(lowers, uppers)]
+    ascending = all(lower <= upper for lower, upper in bounds) and all(
+        bounds[i][1] <= bounds[i + 1][0] for i in range(len(bounds) - 1))
+    if ascending:
+        # ranges only share their bounds, where the first one wins
+        search = """
+    var lo = 0;
+    var hi = %(name)s_lowers.length - 1;
+    while (lo <= hi) {
+        var mid = (lo + hi) >> 1;
+        if (value >= %(name)s_lowers[mid]) {
+            lo = mid + 1;
+        } else {
+            hi = mid - 1;
+        }
+    }
+    while (hi > 0 && value <= %(name)s_uppers[hi - 1]) {
+        hi--;
+    }
+    return hi >= 0 && value <= %(name)s_uppers[hi] ? hi : -1;"""
+    else:
+        search = """
+    for (var i = 0; i < %(name)s_lowers.length; i++) {
+        if (value >= %(name)s_lowers[i] && value <= %(name)s_uppers[i]) {
+            return i;
+        }
+    }
+    return -1;"""
+    return ("""
+var %(name)s_lowers = [%(lowers)s];
+var %(name)s_uppers = [%(uppers)s];
+function %(name)s(value) {""" + search + """
+}""") % {"name": name, "lowers": ", ".join(lowers),
+         "uppers": ", ".join(uppers)}
+
+
 def getRGBAColor(color, alpha):
     r, g, b, a = color.split(",")[:4]
     a = (float(a) / 255) * alpha
@@ -824,8 +1405,9 @@ def returnFilterValues(layer_list, fieldName, fieldType):
             for f in fields:
                 if boilType(f.typeName()) == fieldType:
                     if f.name() == fieldName:
-                        iterator = layer.getFeatures()
+                        iterator = layerFeatures(layer)
                         for feature in iterator:
+                            checkCancelled()
                             if feature[fieldName] is not None:
                                 filterValues.append(feature[fieldName])
     if filterValues == []:
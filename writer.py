@@ -30,6 +30,8 @@ class WriterResult(object):
         self.index_file = None
         self.folder = None
         self.files = []
+        # ExportReport of the stages, layers and files of the export
+        self.report = None
 
 
 class Writer(object):